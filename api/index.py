@@ -1,23 +1,18 @@
 import logging
 import asyncio
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, Request, BackgroundTasks, Response
 from telegram import Update
-from telegram.ext import (
-    Application, 
-    CommandHandler, 
-    MessageHandler, 
-    CallbackQueryHandler, 
-    filters
-)
+from telegram.ext import Application
 
 # AERP Core Imports
 from core.config import Config
-from core.database.supabase_client import db
-from core.handlers import (
-    start_handler, 
-    shipment_handler, 
-    admin_handler
-)
+from core.database import db
+from core.utils.bot import build_bot
+from core.utils.scheduler import build_update_processor
+from core.services.broadcast import resume_broadcasts
+from core.services.outbox import drain_outbox
+from core.handlers.router import register_handlers
+from core.utils import metrics
 
 # Enable logging
 logging.basicConfig(
@@ -25,131 +20,25 @@ logging.basicConfig(
     level=logging.INFO
 )
 
-# Initialize FastAPI app
-app = FastAPI()
-
-# Initialize the Bot Application (Global instance for Vercel reuse)
-ptb_application = Application.builder().token(Config.TELEGRAM_TOKEN).build()
-
-# --- THE CENTRAL BRAIN: MASTER MESSAGE ROUTER ---
-
-async def master_message_router(update: Update, context):
-    """
-    Routes all text/media inputs.
-    Vercel processes this on every single webhook hit.
-    """
-    if not update.message:
-        return
-    
-    user_id = update.effective_user.id
-    text = update.message.text if update.message.text else ""
-    user = db.get_user(user_id)
-
-    # 1. HANDLE UNREGISTERED USERS
-    if not user:
-        if text == "/start":
-            await start_handler.start(update, context)
-        else:
-            # Catch registration flow inputs (Name/Company)
-            await start_handler.handle_registration_name(update, context)
-        return
-
-    # 2. GLOBAL DASHBOARD OVERRIDES (Priority Logic)
-    if text == "📦 New Shipment":
-        await shipment_handler.start_new_shipment(update, context)
-        return
-    elif text == "🔍 Track My Shipments":
-        await shipment_handler.track_shipments(update, context)
-        return
-    elif text == "👤 My Profile":
-        await shipment_handler.view_profile(update, context)
-        return
-    elif text == "🛠 Staff Panel":
-        await admin_handler.open_staff_panel(update, context)
-        return
-    elif text == "👑 Admin Settings":
-        await admin_handler.open_admin_settings(update, context)
-        return
-    elif text == "🏠 Back to Menu":
-        db.update_user_state(user_id, None)
-        await start_handler.start(update, context)
-        return
+# Initialize FastAPI app (interactive docs are off: nothing browses a webhook endpoint)
+app = FastAPI(docs_url=None, redoc_url=None, openapi_url=None)
 
-    # 3. STATE-BASED ROUTING (Reads current step from Supabase)
-    state = user.get('state')
-    if not state:
-        return
+# Initialize the Bot Application (Global instance for Vercel reuse).
+# CachedBot answers the getMe in initialize() from cache, so a cold start makes no extra Telegram call.
+ptb_application = Application.builder().bot(build_bot()).concurrent_updates(build_update_processor()).build()
 
-    # User Registration Flow
-    if state == "REG_NAME":
-        await start_handler.handle_registration_name(update, context)
-    elif state == "REG_COMPANY":
-        await start_handler.handle_registration_company(update, context)
-    
-    # Phase 1 & Edit Engine: Creation Wizard & Modifications
-    elif state.startswith("SHIP_") or state.startswith("EDIT_INPUT_"):
-        await shipment_handler.handle_shipment_text_input(update, context, user, text)
-    
-    # Phase 2: Payment Receipt Upload (Handles Photos and Documents)
-    elif state.startswith("UPLOAD_"):
-        await shipment_handler.handle_phase2_upload(update, context, user)
-    
-    # Admin System Management (Exchange Rate, Broadcasts, Rejection Comments)
-    elif state == "SET_EXCHANGE" or state == "ADM_BROADCAST" or state.startswith("REJECT_"):
-        await admin_handler.handle_admin_msg(update, context)
+# Register the shared routers (core/handlers/router.py) into the PTB instance
+register_handlers(ptb_application)
 
-# --- THE CENTRAL CALLBACK BRAIN: MASTER CALLBACK ROUTER ---
-
-async def master_callback_router(update: Update, context):
-    """
-    Routes all Inline Button clicks for the entire organization.
-    """
-    query = update.callback_query
-    data = query.data
-
-    # --- Shipment Wizard & Editing Buttons ---
-    if (data == "confirm_shipment" or 
-        data == "open_edit_menu" or 
-        data.startswith("edit_field_") or 
-        data == "back_to_summary" or
-        data.startswith("edit_hist_") or
-        data == "back_step" or
-        data == "cancel_wizard"):
-        await shipment_handler.handle_shipment_callbacks(update, context)
-    
-    # --- Admin Decision & Management Buttons ---
-    elif (data.startswith("rate_") or 
-          data.startswith("pay_") or 
-          data.startswith("usr_") or
-          data.startswith("st_upd_") or
-          data.startswith("adm_") or
-          data == "set_ex_rate" or 
-          data == "admin_settings"):
-        await admin_handler.handle_admin_callbacks(update, context)
-    
-    # --- Phase 2 Initiation ---
-    elif data.startswith("start_upload_"):
-        await shipment_handler.start_proof_upload(update, context)
-    
-    # --- Universal Navigation ---
-    elif data == "track_shipment":
-        await shipment_handler.track_shipments(update, context)
-    elif data == "view_profile":
-        await shipment_handler.view_profile(update, context)
-    elif data == "back_to_main":
-        user_id = update.effective_user.id
-        db.update_user_state(user_id, None)
-        await start_handler.start(update, context)
-
-# --- VERCEL INFRASTRUCTURE ---
-
-# Register the logic into the PTB instance
-ptb_application.add_handler(CommandHandler("start", start_handler.start))
-ptb_application.add_handler(MessageHandler(filters.ALL & ~filters.COMMAND, master_message_router))
-ptb_application.add_handler(CallbackQueryHandler(master_callback_router))
+async def drain_notifications():
+    """Delivers queued outbox notifications after the webhook response has been sent."""
+    try:
+        await drain_outbox(ptb_application.bot, Config.OUTBOX_TIME_BUDGET)
+    except Exception as e:
+        logging.error(f"Outbox Drain Error: {str(e)}")
 
 @app.post("/api/index")
-async def webhook(request: Request):
+async def webhook(request: Request, background_tasks: BackgroundTasks):
     """
     Main Webhook Entry Point.
     Processes the JSON post from Telegram servers.
@@ -162,14 +51,59 @@ async def webhook(request: Request):
         data = await request.json()
         update = Update.de_json(data, ptb_application.bot)
         
-        # Process the update through our routers
-        await ptb_application.process_update(update)
+        # Process the update through our routers. Concurrent requests on this warm instance share
+        # the update processor, so one user's updates still run one at a time and in order
+        await ptb_application.update_processor.process_update(update, ptb_application.process_update(update))
         
+        # Notifications queued by the handlers go out off the request path
+        background_tasks.add_task(drain_notifications)
         return {"status": "success"}
     except Exception as e:
         logging.error(f"Webhook Error: {str(e)}")
         return {"status": "error", "message": str(e)}
 
+@app.get("/api/broadcast")
+async def broadcast_tick():
+    """
+    Cron entry point (see vercel.json): advances unfinished broadcast jobs
+    for one time-boxed slice, so long announcements survive function timeouts.
+    """
+    try:
+        if not ptb_application.running:
+            await ptb_application.initialize()
+        await resume_broadcasts(ptb_application.bot, Config.BROADCAST_TIME_BUDGET)
+        return {"status": "success"}
+    except Exception as e:
+        logging.error(f"Broadcast Tick Error: {str(e)}")
+        return {"status": "error", "message": str(e)}
+
+@app.get("/api/outbox")
+async def outbox_tick():
+    """Cron entry point (see vercel.json): retries and delivers any outbox rows still due."""
+    try:
+        if not ptb_application.running:
+            await ptb_application.initialize()
+        await drain_outbox(ptb_application.bot, Config.OUTBOX_TIME_BUDGET)
+        return {"status": "success"}
+    except Exception as e:
+        logging.error(f"Outbox Tick Error: {str(e)}")
+        return {"status": "error", "message": str(e)}
+
+@app.get("/metrics")
+async def metrics_endpoint(request: Request):
+    """
+    Prometheus scrape target: handler, Database and Bot API latencies plus error and flood-wait counters.
+    Counts are per warm instance. Set METRICS_TOKEN to require 'Authorization: Bearer <token>'.
+    """
+    if Config.METRICS_TOKEN and request.headers.get("authorization") != f"Bearer {Config.METRICS_TOKEN}":
+        return Response(status_code=401)
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Releases the pooled Supabase connections when the instance is recycled."""
+    await db.close()
+
 @app.get("/")
 async def index():
     return {"message": "AERP Enterprise Bot is active and running on Vercel."}
\ No newline at end of file
@@ -0,0 +1,344 @@
+"""
+AERP BENCHMARK: HOT PATHS
+
+Microbenchmarks for the code every webhook runs: the pure helpers (calculate_metrics, bulk_chargeable,
+validate_dims, the bulk import row parser, generate_summary, the keyboard builders) and full update dispatch through
+master_message_router / master_callback_router. Dispatch runs against an in-memory
+Database and a Bot whose _post answers from canned JSON, so the numbers are the bot's own
+CPU cost (PTB parsing, routing, UnitOfWork, formatting) with no network.
+
+    python benchmarks/hot_paths.py                    # compare with the stored baseline
+    python benchmarks/hot_paths.py --save             # record a new baseline
+    python benchmarks/hot_paths.py -k dispatch --tolerance 0.4
+
+Each case reports ops/sec (best of --repeat timed runs) and, from tracemalloc, the median
+peak memory one call allocates and what it leaves behind. Exits non-zero when a case is slower
+or allocates more than the baseline allows. Baselines are machine-specific: re-record
+with --save on the host that runs the comparison.
+"""
+import argparse
+import asyncio
+import gc
+import inspect
+import itertools
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from types import SimpleNamespace
+from typing import Callable, NamedTuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Config is read at import time; nothing below talks to Supabase or Telegram
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "123456:bench")
+os.environ.setdefault("SUPABASE_URL", "https://bench.supabase.co")
+os.environ.setdefault("SUPABASE_KEY", "bench.bench.bench")
+
+from telegram import Update
+from telegram.ext import Application, ExtBot
+from core.database import db
+from core.handlers.router import register_handlers
+from core.handlers.shipment_handler import generate_summary
+from core.services.bulk_import import parse_row
+from core.utils.calculations import calculate_metrics, bulk_chargeable
+from core.utils.validators import validate_dims
+from core.utils.pagination import encode_cursor
+from core.utils import keyboards
+
+DEFAULT_BASELINE = os.path.join(ROOT, "benchmarks", "hot_paths_baseline.json")
+
+# Calls per allocation sample; enough to make per-call retention visible
+ALLOC_CALLS = 50
+
+# --- FIXTURES ---
+
+ADMIN_ID = 1
+WIZARD_ID = 1001    # mid-wizard, answering the dims step
+REVIEW_ID = 1002    # mid-wizard, answering the last step (builds the summary)
+CUSTOMER_ID = 1003  # idle, using the dashboard
+
+SHIP_ID = "6f1c2a9e-3b4d-4e5f-8a7b-9c0d1e2f3a4b"
+DRAFT_ID = "0a1b2c3d-4e5f-4a6b-8c7d-8e9f0a1b2c3d"
+
+SHIPMENT = {
+    "id": SHIP_ID, "created_by": CUSTOMER_ID, "created_at": "2026-03-14T09:26:53.589793+00:00",
+    "airline": "Ethiopian Airlines", "origin": "Addis Ababa", "destination": "Dubai",
+    "awb_number": "071-12345675", "pieces": 5, "gross_weight": 350.0, "chargeable_weight": 400.0,
+    "length_cm": 120.0, "width_cm": 80.0, "height_cm": 100.0,
+    "approved_rate_usd": 4.5, "sale_rate_usd": 5.2, "exchange_rate_etb": 56.5,
+    "shipper_info": "Abebe Trading PLC\nBole Road, Addis Ababa",
+    "consignee_info": "Gulf Imports LLC\nDeira, Dubai", "notify_party": "Same as consignee",
+    "shipment_status": "pending_approval", "payment_status": "unpaid",
+}
+
+PAGE = [
+    {**SHIPMENT, "id": f"{SHIP_ID[:-2]}{i:02d}", "created_at": f"2026-03-{14 - i:02d}T09:26:53.589793+00:00",
+     "awb_number": f"071-1234{i:04d}"}
+    for i in range(10)
+]
+
+def _profile(telegram_id, role="user", state=None, draft=None):
+    return {"telegram_id": telegram_id, "full_name": "Bench User", "company_name": "Bench Cargo",
+            "role": role, "is_approved": True, "state": state, "draft": draft}
+
+PROFILES = {
+    ADMIN_ID: _profile(ADMIN_ID, role="admin"),
+    WIZARD_ID: _profile(WIZARD_ID, state=f"SHIP_DIMS_{DRAFT_ID}",
+                        draft={**SHIPMENT, "id": DRAFT_ID, "length_cm": 0, "width_cm": 0, "height_cm": 0}),
+    REVIEW_ID: _profile(REVIEW_ID, state=f"SHIP_NOTIFY_{DRAFT_ID}", draft={**SHIPMENT, "id": DRAFT_ID}),
+    CUSTOMER_ID: _profile(CUSTOMER_ID),
+}
+
+BOT_USER = {"id": 123456, "is_bot": True, "first_name": "AERP", "username": "aerp_bench_bot"}
+
+class StubDatabase:
+    """
+    In-memory stand-in for core.database.DatabaseBackend.
+    Reads return fresh copies of the fixtures (handlers mutate what they get back);
+    writes are accepted and dropped so every iteration starts from the same state.
+    """
+    _WRITE = SimpleNamespace(data=[])
+
+    async def get_user(self, telegram_id: int):
+        user = PROFILES.get(telegram_id)
+        if user is None:
+            return None
+        return {**user, "draft": dict(user["draft"]) if user["draft"] else None}
+
+    async def update_user(self, telegram_id: int, data: dict):
+        return self._WRITE
+
+    async def update_user_state(self, telegram_id: int, state: str = None):
+        return self._WRITE
+
+    async def get_setting(self, key: str):
+        return 56.5
+
+    async def get_shipment(self, shipment_id: str):
+        return dict(SHIPMENT, id=shipment_id)
+
+    async def update_shipment(self, shipment_id: str, data: dict):
+        return self._WRITE
+
+    async def claim_update(self, update_id: int, ttl_seconds: int):
+        return True
+
+    async def get_shipments_page(self, limit: int = 10, cursor: tuple = None, backwards: bool = False,
+                                 shipment_status: str = None, payment_status: str = None,
+                                 created_by: int = None, columns: str = "*"):
+        return [dict(row) for row in PAGE[:limit]], True
+
+def install_stub_database():
+    """Points the shared `db` (what UnitOfWork and the services use) at StubDatabase."""
+    stub = StubDatabase()
+    for name, fn in inspect.getmembers(stub, inspect.iscoroutinefunction):
+        if not name.startswith("_"):
+            setattr(db, name, fn)
+
+class StubBot(ExtBot):
+    """ExtBot whose Bot API calls are answered locally, so PTB still builds and parses every object."""
+    __slots__ = ()
+
+    async def _post(self, endpoint: str, data: dict = None, *args, **kwargs):
+        if endpoint == "getMe":
+            return BOT_USER
+        if endpoint in ("sendMessage", "editMessageText", "editMessageReplyMarkup"):
+            chat_id = (data or {}).get("chat_id", CUSTOMER_ID)
+            return {"message_id": 2, "date": 0, "chat": {"id": chat_id, "type": "private"},
+                    "from": BOT_USER, "text": (data or {}).get("text", "")}
+        return True
+
+def _sender(user_id):
+    return {"id": user_id, "is_bot": False, "first_name": "Bench"}
+
+def _chat_message(user_id, text):
+    return {"message_id": 1, "date": 0, "chat": {"id": user_id, "type": "private"},
+            "from": _sender(user_id), "text": text}
+
+def message_update(user_id, text):
+    return {"update_id": 1, "message": _chat_message(user_id, text)}
+
+def callback_update(user_id, data):
+    return {"update_id": 1, "callback_query": {
+        "id": "1", "from": _sender(user_id), "chat_instance": "bench", "data": data,
+        "message": {**_chat_message(user_id, "menu"), "from": BOT_USER},
+    }}
+
+# --- CASES ---
+
+class Case(NamedTuple):
+    name: str
+    run: Callable  # run(n): performs n calls
+
+def sync_case(name, fn):
+    def run(n):
+        for _ in range(n):
+            fn()
+    return Case(name, run)
+
+def async_case(name, loop, make_coro):
+    async def repeat(n):
+        for _ in range(n):
+            await make_coro()
+    return Case(name, lambda n: loop.run_until_complete(repeat(n)))
+
+def build_cases(loop):
+    application = Application.builder().bot(StubBot("123456:bench")).updater(None).build()
+    register_handlers(application)
+    install_stub_database()
+    loop.run_until_complete(application.initialize())
+
+    # Every dispatched update gets a fresh update_id, or the de-duplication layer would drop it
+    update_ids = itertools.count(1)
+
+    def dispatch(name, payload, fresh=True):
+        async def process():
+            data = {**payload, "update_id": next(update_ids)} if fresh else payload
+            await application.process_update(Update.de_json(data, application.bot))
+        return async_case(f"dispatch.{name}", loop, process)
+
+    cursor = encode_cursor(PAGE[-1])
+    # A bulk quote: 10k dimension lines spread over 1k shipments
+    owners = [i % 1000 for i in range(10_000)]
+    sides = [float(20 + i % 180) for i in range(10_000)]
+    pieces = [1 + i % 5 for i in range(10_000)]
+    gross = [150.0] * 1000
+    pending = [{"full_name": f"Applicant {i}"} for i in range(10)]
+    # One CSV import row, fields in header order
+    import_columns = ("airline", "origin", "destination", "awb_number", "pieces", "gross_weight", "dims",
+                      "approved_rate_usd", "sale_rate_usd", "shipper_info")
+    import_mapping = {column: i for i, column in enumerate(import_columns)}
+    import_fields = ["ET", "Dubai", "Addis Ababa", "071-12345675", "12", "350",
+                     "120x80x100x2; 60x40x30x10", "4.5", "5.2", "Acme Trading"]
+    return [
+        sync_case("calculate_metrics", lambda: calculate_metrics(120, 80, 100, 5, 350, 4.5, 56.5)),
+        sync_case("validate_dims", lambda: validate_dims("120 x 80 x 100")),
+        sync_case("bulk_chargeable.10k_lines", lambda: bulk_chargeable(owners, sides, sides, sides, pieces, gross)),
+        sync_case("bulk_import.parse_row", lambda: parse_row(import_fields, import_mapping)),
+        async_case("generate_summary", loop, lambda: generate_summary(SHIPMENT)),
+        sync_case("keyboards.main_dashboard", lambda: keyboards.get_main_dashboard("admin")),
+        sync_case("keyboards.tracking", lambda: keyboards.get_tracking_keyboard(
+            PAGE[:8], "-", "All Statuses", cursor, cursor)),
+        sync_case("keyboards.staff_queue", lambda: keyboards.get_staff_queue_keyboard(
+            PAGE, "--", "All Statuses", "All Payments", cursor, cursor)),
+        sync_case("keyboards.pending_users", lambda: keyboards.get_pending_users_keyboard(
+            pending, "a", "b", 0b1010, True)),
+        dispatch("message.wizard_dims", message_update(WIZARD_ID, "120x80x100")),
+        dispatch("message.wizard_summary", message_update(REVIEW_ID, "Same as consignee")),
+        dispatch("message.dashboard_track", message_update(CUSTOMER_ID, "🔍 Track My Shipments")),
+        dispatch("callback.track_page", callback_update(CUSTOMER_ID, f"trk_-_n_{cursor}")),
+        dispatch("callback.staff_panel", callback_update(ADMIN_ID, "staff_panel")),
+        dispatch("callback.staff_view", callback_update(ADMIN_ID, f"adm_qv_{SHIP_ID}")),
+        dispatch("callback.unknown", callback_update(CUSTOMER_ID, "no_such_button")),
+        # A redelivery: the same update_id every time, dropped by the in-process LRU
+        dispatch("message.duplicate", message_update(WIZARD_ID, "120x80x100"), fresh=False),
+    ], application
+
+# --- MEASUREMENT ---
+
+def _elapsed(run, n):
+    start = time.perf_counter()
+    run(n)
+    return time.perf_counter() - start
+
+def ops_per_sec(run, min_time: float, repeat: int):
+    """Grows the call count until one run lasts min_time, then keeps the best of `repeat` runs."""
+    n = 1
+    while (elapsed := _elapsed(run, n)) < min_time:
+        n *= 2
+    best = min([elapsed] + [_elapsed(run, n) for _ in range(repeat - 1)])
+    return n / best
+
+def allocations(run):
+    """
+    (median peak KiB one call allocates, bytes per call still held afterwards).
+    Peaks are taken call by call after a collection, so cyclic garbage left by earlier
+    calls (PTB objects) does not make the figure depend on when the GC last ran.
+    """
+    run(1)  # first-call caches are not the steady state
+    gc.collect()
+    tracemalloc.start()
+    try:
+        start = tracemalloc.get_traced_memory()[0]
+        peaks = []
+        for _ in range(ALLOC_CALLS):
+            gc.collect()
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            run(1)
+            peaks.append(tracemalloc.get_traced_memory()[1] - before)
+        gc.collect()
+        kept = tracemalloc.get_traced_memory()[0] - start
+    finally:
+        tracemalloc.stop()
+    return statistics.median(peaks) / 1024, kept / ALLOC_CALLS
+
+def regressions(name, result, baseline, tolerance):
+    ref = baseline.get(name)
+    if not ref:
+        return []
+    found = []
+    if result["ops_per_sec"] < ref["ops_per_sec"] * (1 - tolerance):
+        found.append(f"{name}: {result['ops_per_sec']:,.0f} ops/s vs baseline {ref['ops_per_sec']:,.0f}")
+    # 1 KiB of slack so tiny cases do not trip on allocator noise
+    if result["peak_kib"] > ref["peak_kib"] * (1 + tolerance) + 1:
+        found.append(f"{name}: peak {result['peak_kib']:.1f} KiB vs baseline {ref['peak_kib']:.1f} KiB")
+    return found
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-k", dest="pattern", default="", help="only cases whose name contains this")
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds per timed run")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--tolerance", type=float, default=0.3, help="allowed slowdown / growth vs baseline")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save", action="store_true", help="write the results as the new baseline")
+    args = parser.parse_args()
+
+    stored = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            stored = json.load(f)
+    baseline = stored.get("results", {})
+
+    loop = asyncio.new_event_loop()
+    cases, application = build_cases(loop)
+    results, failures = {}, []
+    print(f"{'case':34} {'ops/sec':>12} {'us/op':>9} {'peak KiB':>9} {'kept B':>8} {'vs base':>8}")
+    try:
+        for case in cases:
+            if args.pattern not in case.name:
+                continue
+            ops = ops_per_sec(case.run, args.min_time, args.repeat)
+            peak_kib, kept = allocations(case.run)
+            result = results[case.name] = {"ops_per_sec": ops, "peak_kib": peak_kib, "retained_bytes": kept}
+            ref = baseline.get(case.name)
+            change = f"{(ops / ref['ops_per_sec'] - 1) * 100:+.0f}%" if ref else "new"
+            print(f"{case.name:34} {ops:12,.0f} {1e6 / ops:9.1f} {peak_kib:9.1f} {kept:8.0f} {change:>8}")
+            failures += regressions(case.name, result, baseline, args.tolerance)
+    finally:
+        loop.run_until_complete(application.shutdown())
+        loop.close()
+
+    if args.save:
+        stored = {"python": platform.python_version(), "machine": platform.machine(),
+                  "results": {**baseline, **results}}
+        with open(args.baseline, "w") as f:
+            json.dump(stored, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"baseline written to {os.path.relpath(args.baseline, ROOT)}")
+        return
+
+    if stored and stored.get("python") != platform.python_version():
+        print(f"note: baseline was recorded on Python {stored.get('python')}")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
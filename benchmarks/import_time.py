@@ -0,0 +1,95 @@
+"""
+AERP BENCHMARK: VERCEL COLD START
+
+Measures what a fresh serverless instance pays before it can answer its first webhook:
+importing api/index.py and running ptb_application.initialize(). Every run is a new
+interpreter, so nothing is shared between samples.
+
+    python benchmarks/import_time.py              # median of 5 runs against the budget
+    python benchmarks/import_time.py --runs 9 --budget-ms 700
+
+Exits non-zero when the median exceeds the budget, when initialize() would call Telegram,
+or when a module the entry point must not load at import time (supabase, realtime, storage3)
+shows up, so it can gate CI. Dummy credentials are used; no network is touched.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Budget for import + initialize on a warm disk cache; override with IMPORT_BUDGET_MS
+DEFAULT_BUDGET_MS = float(os.getenv("IMPORT_BUDGET_MS", "800"))
+
+# Must stay out of the cold path: the whole supabase meta-package and the clients only used
+# on demand (storage is imported on first upload)
+FORBIDDEN = ("supabase", "realtime", "gotrue", "supafunc", "storage3")
+
+PROBE = """
+import asyncio, json, sys, time
+t0 = time.perf_counter()
+import api.index as entry
+t1 = time.perf_counter()
+
+calls = []
+async def no_network(*args, **kwargs):
+    calls.append(args[:1])
+    return {"id": 123456, "is_bot": True, "first_name": "AERP", "username": "aerp_bench_bot"}
+entry.ptb_application.bot._post = no_network
+
+asyncio.run(entry.ptb_application.initialize())
+t2 = time.perf_counter()
+print(json.dumps({
+    "import_ms": (t1 - t0) * 1000,
+    "init_ms": (t2 - t1) * 1000,
+    "network_calls": len(calls),
+    "loaded": sorted({m.split(".")[0] for m in sys.modules}),
+}))
+"""
+
+def sample():
+    env = dict(os.environ)
+    env.update({
+        "TELEGRAM_BOT_TOKEN": "123456:bench",
+        "TELEGRAM_BOT_INFO": json.dumps({"id": 123456, "is_bot": True, "first_name": "AERP", "username": "aerp_bench_bot"}),
+        "SUPABASE_URL": "https://bench.supabase.co",
+        "SUPABASE_KEY": "bench.bench.bench",
+    })
+    out = subprocess.run([sys.executable, "-c", PROBE], cwd=ROOT, env=env,
+                         capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS)
+    args = parser.parse_args()
+
+    samples = [sample() for _ in range(args.runs)]
+    imports = [s["import_ms"] for s in samples]
+    inits = [s["init_ms"] for s in samples]
+    totals = [a + b for a, b in zip(imports, inits)]
+    median = statistics.median(totals)
+
+    print(f"import      median {statistics.median(imports):7.1f} ms  (min {min(imports):.1f}, max {max(imports):.1f})")
+    print(f"initialize  median {statistics.median(inits):7.1f} ms  (min {min(inits):.1f}, max {max(inits):.1f})")
+    print(f"total       median {median:7.1f} ms  budget {args.budget_ms:.0f} ms")
+
+    failures = []
+    if median > args.budget_ms:
+        failures.append(f"cold start {median:.1f} ms is over the {args.budget_ms:.0f} ms budget")
+    if any(s["network_calls"] for s in samples):
+        failures.append("initialize() called the Bot API; the cached getMe was not used")
+    leaked = sorted(set(FORBIDDEN) & set(samples[0]["loaded"]))
+    if leaked:
+        failures.append(f"imported at cold start: {', '.join(leaked)}")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+-- AERP BENCHMARK: ADMIN STATS AT 1M SHIPMENTS
+--
+-- Run against a scratch Postgres database (never production):
+--   createdb aerp_bench
+--   psql aerp_bench -f core/database/schema.sql
+--   psql aerp_bench -f benchmarks/stats_at_scale.sql
+--
+-- A server without the uuid-ossp extension needs this first:
+--   CREATE FUNCTION uuid_generate_v4() RETURNS uuid AS $$ SELECT gen_random_uuid() $$ LANGUAGE sql;
+--
+-- Prints the old full-scan plans (the total count and the status/payment breakdown) next
+-- to the counter read at 10k, 100k and 1M rows. Recorded on PostgreSQL 16.2, local
+-- scratch server, execution times from EXPLAIN ANALYZE:
+--
+--   rows   count(*)    status/payment GROUP BY   stats_counters read   bench_fill from the size before
+--   10k      2.5 ms       8.4 ms                   0.015 ms              0.34 s
+--   100k    23.7 ms      84.0 ms                   0.023 ms              3.4 s
+--   1M     259.4 ms     851.1 ms (parallel)        0.025 ms             45.6 s
+--
+-- The full scans grow with the table; the counter read stays flat (13 rows). The sanity
+-- query at the end returned counter = actual = 1000000.
+-- With the earlier per-row counter trigger, the 10k fill took 9.7 s and the 100k fill did not
+-- finish in 7 minutes: every inserted row updated the same counter rows again in one
+-- transaction. The statement-level triggers bump each counter once per statement.
+
+\timing on
+
+INSERT INTO profiles (telegram_id, full_name, company_name, is_approved)
+VALUES (1, 'Bench User', 'Bench Co', TRUE)
+ON CONFLICT DO NOTHING;
+
+CREATE OR REPLACE FUNCTION bench_fill(target BIGINT) RETURNS VOID AS $$
+DECLARE
+    have BIGINT;
+BEGIN
+    SELECT COUNT(*) INTO have FROM shipments;
+    INSERT INTO shipments (created_by, airline, awb_number, chargeable_weight, sale_rate_usd, exchange_rate_etb,
+                           shipment_status, payment_status)
+    SELECT 1, 'ET', '071-' || g, 100 + (g % 500), 4.5, 56,
+           (ARRAY['quotation_created', 'rate_approved', 'payment_received', 'booked', 'uplifted', 'completed'])[1 + g % 6]::shipment_status,
+           (ARRAY['unpaid', 'paid'])[1 + g % 2]::payment_status
+    FROM generate_series(have + 1, target) AS g;
+END;
+$$ LANGUAGE plpgsql;
+
+-- 10k
+SELECT bench_fill(10000);
+EXPLAIN (ANALYZE, BUFFERS) SELECT COUNT(*) FROM shipments;
+EXPLAIN (ANALYZE, BUFFERS) SELECT shipment_status, payment_status, COUNT(*), SUM(chargeable_weight * sale_rate_usd)
+    FROM shipments GROUP BY shipment_status, payment_status;
+EXPLAIN (ANALYZE, BUFFERS) SELECT key, value FROM stats_counters;
+
+-- 100k
+SELECT bench_fill(100000);
+EXPLAIN (ANALYZE, BUFFERS) SELECT COUNT(*) FROM shipments;
+EXPLAIN (ANALYZE, BUFFERS) SELECT shipment_status, payment_status, COUNT(*), SUM(chargeable_weight * sale_rate_usd)
+    FROM shipments GROUP BY shipment_status, payment_status;
+EXPLAIN (ANALYZE, BUFFERS) SELECT key, value FROM stats_counters;
+
+-- 1M
+SELECT bench_fill(1000000);
+EXPLAIN (ANALYZE, BUFFERS) SELECT COUNT(*) FROM shipments;
+EXPLAIN (ANALYZE, BUFFERS) SELECT shipment_status, payment_status, COUNT(*), SUM(chargeable_weight * sale_rate_usd)
+    FROM shipments GROUP BY shipment_status, payment_status;
+EXPLAIN (ANALYZE, BUFFERS) SELECT key, value FROM stats_counters;
+
+-- Sanity: counters agree with a real count
+SELECT (SELECT value FROM stats_counters WHERE key = 'shipments') AS counter,
+       (SELECT COUNT(*) FROM shipments) AS actual;
+
+DROP FUNCTION bench_fill(BIGINT);
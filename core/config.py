@@ -10,8 +10,61 @@ class Config:
     ADMIN_CHANNEL_ID = os.getenv("ADMIN_CHANNEL_ID")
     # The name of the bucket you created in Supabase Storage
     SUPABASE_BUCKET = "shipment-proofs"
+    # Largest payment proof accepted (Telegram's getFile limit for bots is 20 MB)
+    MAX_PROOF_BYTES = int(os.getenv("MAX_PROOF_MB", "20")) * 1024 * 1024
+
+    # Seconds a warm instance may serve global settings (exchange_rate) from memory
+    SETTINGS_TTL = float(os.getenv("SETTINGS_TTL", "300"))
 
     # Multi-Admin Support
     # In your .env file, add: ADMIN_IDS=7332957928,12345678,00000000
     _raw_admins = os.getenv("ADMIN_IDS", "")
-    ADMIN_IDS = [int(x.strip()) for x in _raw_admins.split(",") if x.strip()]
\ No newline at end of file
+    ADMIN_IDS = [int(x.strip()) for x in _raw_admins.split(",") if x.strip()]
+
+    # Broadcast engine: global send rate (msgs/sec), parallel senders, users per persisted batch,
+    # and how long one invocation may deliver before yielding (keep under the Vercel function limit)
+    BROADCAST_RATE = float(os.getenv("BROADCAST_RATE", "25"))
+    BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", "10"))
+    BROADCAST_BATCH = int(os.getenv("BROADCAST_BATCH", "50"))
+    BROADCAST_TIME_BUDGET = float(os.getenv("BROADCAST_TIME_BUDGET", "7"))
+
+    # Seconds the webhook may spend draining the notification outbox after responding
+    OUTBOX_TIME_BUDGET = float(os.getenv("OUTBOX_TIME_BUDGET", "5"))
+
+    # getMe result reused by CachedBot so Application.initialize() needs no network round trip.
+    # Set TELEGRAM_BOT_INFO to the JSON of a getMe call to skip it even on the first cold start.
+    TELEGRAM_BOT_INFO = os.getenv("TELEGRAM_BOT_INFO")
+    BOT_INFO_CACHE = os.getenv("BOT_INFO_CACHE", "/tmp/aerp_bot_info.json")
+
+    # /metrics: optional bearer token for the webhook deployment, and the port run_local.py serves it on
+    METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+    METRICS_PORT = int(os.getenv("METRICS_PORT", "9100"))
+
+    # Storage backend: "supabase" (production) or "sqlite", an embedded database plus a local
+    # directory for uploaded files that runs with no network (development, load tests, single node)
+    DATABASE_BACKEND = os.getenv("DATABASE_BACKEND", "supabase").lower()
+    SQLITE_PATH = os.getenv("SQLITE_PATH", "aerp.sqlite3")
+    LOCAL_STORAGE_DIR = os.getenv("LOCAL_STORAGE_DIR", "storage")
+
+    # Bulk shipment import (CSV/TSV documents from staff): largest file accepted, rows per insert
+    MAX_IMPORT_BYTES = int(os.getenv("MAX_IMPORT_MB", "10")) * 1024 * 1024
+    IMPORT_BATCH = int(os.getenv("IMPORT_BATCH", "500"))
+    # Rows per keyset page when exporting CSV (stay under PostgREST's max-rows, 1000 on Supabase)
+    EXPORT_PAGE = int(os.getenv("EXPORT_PAGE", "500"))
+
+    # Update de-duplication: recently seen update_ids kept in memory per process, and how long
+    # the processed_updates table remembers one (Telegram stops redelivering well within a day)
+    UPDATE_DEDUP_CACHE = int(os.getenv("UPDATE_DEDUP_CACHE", "2048"))
+    UPDATE_DEDUP_TTL = int(os.getenv("UPDATE_DEDUP_TTL", str(24 * 3600)))
+
+    # Update scheduling: handlers running at once (each user's updates still run one at a time,
+    # in order) and the size of PTB's semaphore around each update (running or queued behind
+    # their user); updates past it wait as tasks
+    UPDATE_CONCURRENCY = int(os.getenv("UPDATE_CONCURRENCY", "16"))
+    UPDATE_MAX_PENDING = int(os.getenv("UPDATE_MAX_PENDING", "256"))
+
+    # Server mode (serve.py): worker processes, updates buffered per worker before the webhook
+    # answers 503 (Telegram retries later), and seconds a worker gets to drain on shutdown
+    SERVER_WORKERS = int(os.getenv("SERVER_WORKERS", str(os.cpu_count() or 1)))
+    SERVER_QUEUE_SIZE = int(os.getenv("SERVER_QUEUE_SIZE", "1000"))
+    SERVER_DRAIN_TIMEOUT = float(os.getenv("SERVER_DRAIN_TIMEOUT", "30"))
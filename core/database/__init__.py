@@ -1,4 +1,21 @@
-from .supabase_client import db
+from core.config import Config
+from .base import DatabaseBackend, Result
+
+def create_database(backend: str = None) -> DatabaseBackend:
+    """Builds the storage backend named by DATABASE_BACKEND (or `backend`)."""
+    backend = backend or Config.DATABASE_BACKEND
+    if backend == "supabase":
+        from .supabase_client import SupabaseDatabase
+        return SupabaseDatabase()
+    if backend == "sqlite":
+        from .sqlite_backend import SQLiteDatabase
+        return SQLiteDatabase(Config.SQLITE_PATH, Config.LOCAL_STORAGE_DIR)
+    raise ValueError(f"Unknown DATABASE_BACKEND: {backend!r} (expected 'supabase' or 'sqlite')")
+
+# The shared instance every handler and service uses
+db = create_database()
+
+from .unit_of_work import UnitOfWork, get_uow
 
 # Exporting the db instance for easy access across the project
-__all__ = ['db']
\ No newline at end of file
+__all__ = ['db', 'create_database', 'DatabaseBackend', 'Result', 'UnitOfWork', 'get_uow']
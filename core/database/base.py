@@ -0,0 +1,258 @@
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import NamedTuple
+from core.config import Config
+from core.utils.metrics import instrument_methods, DB_SECONDS, DB_ERRORS
+
+class Result(NamedTuple):
+    """Rows touched by a write, shaped like a PostgREST response (`.data`, `.count`)."""
+    data: list
+    count: int = None
+
+class DatabaseBackend(ABC):
+    """
+    The storage surface the handlers and services are written against: profiles,
+    shipments, broadcast jobs, the notification outbox, settings, stats and files.
+    Implementations: SupabaseDatabase (PostgREST + Storage, production) and
+    SQLiteDatabase (embedded file + local directory, offline / single node).
+    Rows are plain dicts with the columns of core/database/schema.sql; writes return a Result.
+    """
+    def __init__(self):
+        # In-process settings cache: {key: value}, refreshed as a whole after SETTINGS_TTL
+        self._settings = None
+        self._settings_loaded_at = 0.0
+
+    async def close(self):
+        """Releases pooled connections (called on shutdown)."""
+
+    # --- USER & STATE OPERATIONS ---
+
+    @abstractmethod
+    async def get_user(self, telegram_id: int):
+        """Profile row (including state and draft), or None."""
+
+    @abstractmethod
+    async def create_user(self, data: dict):
+        """Inserts a profile."""
+
+    @abstractmethod
+    async def update_user(self, telegram_id: int, data: dict):
+        """Writes the given profile columns."""
+
+    @abstractmethod
+    async def update_user_state(self, telegram_id: int, state: str = None):
+        """Stores the user's conversation step."""
+
+    @abstractmethod
+    async def approve_user(self, telegram_id: int, role: str = 'user'):
+        """Approves one profile with a role and clears its state."""
+
+    @abstractmethod
+    async def get_all_users(self):
+        """Every profile, newest first."""
+
+    @abstractmethod
+    async def get_pending_users(self, limit: int = None, after: tuple = None, until: tuple = None):
+        """Unapproved profiles oldest first, between (created_at, telegram_id) keyset bounds."""
+
+    @abstractmethod
+    async def approve_users(self, telegram_ids: list, role: str = 'user'):
+        """approve_user for many ids in one statement."""
+
+    @abstractmethod
+    async def delete_user(self, telegram_id: int):
+        """Removes one profile."""
+
+    @abstractmethod
+    async def delete_users(self, telegram_ids: list):
+        """Removes many profiles in one statement."""
+
+    @abstractmethod
+    async def get_broadcast_list(self):
+        """telegram_id of every approved user."""
+
+    @abstractmethod
+    async def get_broadcast_batch(self, after_id: int = 0, limit: int = 50):
+        """Next approved telegram_ids after after_id, ascending."""
+
+    @abstractmethod
+    async def count_broadcast_targets(self):
+        """Number of approved users."""
+
+    # --- BROADCAST JOBS ---
+
+    @abstractmethod
+    async def create_broadcast_job(self, data: dict):
+        """Inserts a job and returns the stored row."""
+
+    @abstractmethod
+    async def get_broadcast_job(self, job_id: int):
+        """Job row, or None."""
+
+    @abstractmethod
+    async def get_active_broadcast_jobs(self):
+        """Pending or running jobs, oldest first."""
+
+    @abstractmethod
+    async def claim_broadcast_job(self, job_id: int, lease_seconds: float):
+        """Leases the job to this worker; None when another holds an unexpired lease."""
+
+    @abstractmethod
+    async def update_broadcast_job(self, job_id: int, data: dict):
+        """Writes the given job columns."""
+
+    # --- SHIPMENT OPERATIONS ---
+
+    @abstractmethod
+    async def create_shipment(self, data: dict):
+        """Inserts a shipment."""
+
+    @abstractmethod
+    async def create_shipments(self, rows: list):
+        """Inserts many shipments, each with its 'dims' lines, in one transaction. Returns how many."""
+
+    @abstractmethod
+    async def update_shipment(self, shipment_id: str, data: dict):
+        """Writes the given shipment columns."""
+
+    @abstractmethod
+    async def get_shipment(self, shipment_id: str):
+        """Shipment row with its dimension lines as 'dims', or None."""
+
+    @abstractmethod
+    async def get_user_shipments(self, telegram_id: int):
+        """Every shipment of one customer, newest first."""
+
+    @abstractmethod
+    async def get_all_shipments(self):
+        """Every shipment newest first, each with profiles: {full_name} of its owner."""
+
+    @abstractmethod
+    async def get_shipments_page(self, limit: int = 10, cursor: tuple = None, backwards: bool = False,
+                                 shipment_status: str = None, payment_status: str = None,
+                                 created_by: int = None, columns: str = "*",
+                                 created_from: str = None, created_to: str = None):
+        """
+        (rows, has_more) for one (created_at, id) keyset page, newest first.
+        created_from / created_to bound created_at to [from, to).
+        """
+
+    @abstractmethod
+    async def search_shipments(self, query: str, limit: int = 10):
+        """Ranked matches on AWB and the free-text fields (see search_shipments in schema.sql)."""
+
+    @abstractmethod
+    async def update_shipment_status(self, shipment_id: str, status: str, payment_status: str = None):
+        """Moves a shipment through the lifecycle."""
+
+    @abstractmethod
+    async def delete_shipment(self, shipment_id: str):
+        """Removes a shipment."""
+
+    @abstractmethod
+    async def apply_shipment_change(self, shipment_id: str, changes: dict, messages: list, insert: bool = False):
+        """
+        Inserts or updates a shipment and queues its outbox messages atomically.
+        A 'dims' list in changes replaces the dimension lines and an 'attachment_ids' list the
+        attachment links. Returns the row, dims included.
+        """
+
+    # --- NOTIFICATION OUTBOX ---
+
+    @abstractmethod
+    async def claim_outbox(self, limit: int = 50, lease_seconds: int = 60):
+        """Leases due outbox rows to this drainer."""
+
+    @abstractmethod
+    async def mark_outbox_sent(self, outbox_ids: list):
+        """Marks delivered outbox rows."""
+
+    @abstractmethod
+    async def mark_outbox_retry(self, outbox_id: int, attempts: int, error: str, retry_at: datetime = None):
+        """Schedules another attempt, or fails the row for good when retry_at is None."""
+
+    # --- UPDATE DE-DUPLICATION ---
+
+    @abstractmethod
+    async def claim_update(self, update_id: int, ttl_seconds: int):
+        """True if this is the first claim of update_id within ttl_seconds, False for a redelivery."""
+
+    # --- SYSTEM STATS & SETTINGS ---
+
+    @abstractmethod
+    async def _stat_counters(self):
+        """(key, value) pairs in the stats_counters layout ('users', 'shipment_status:booked', ...)."""
+
+    @abstractmethod
+    async def _load_settings(self):
+        """The settings table as {key: value}."""
+
+    @abstractmethod
+    async def _store_setting(self, key: str, value: float):
+        """Writes one setting."""
+
+    async def get_db_stats(self):
+        """Aggregate counts for the Admin Dashboard."""
+        stats = {"users": 0, "pending_users": 0, "shipments": 0, "total_usd": 0.0, "total_etb": 0.0,
+                 "shipment_status": {}, "payment_status": {}}
+        for key, value in await self._stat_counters():
+            value = float(value)
+            if ":" in key:
+                group, name = key.split(":", 1)
+                stats.setdefault(group, {})[name] = int(value)
+            elif key in ("total_usd", "total_etb"):
+                stats[key] = round(value, 2)
+            else:
+                stats[key] = int(value)
+        return stats
+
+    async def get_settings(self, refresh: bool = False):
+        """Loads the whole settings table in one query and serves it from memory until the TTL expires."""
+        expired = time.monotonic() - self._settings_loaded_at > Config.SETTINGS_TTL
+        if self._settings is None or expired or refresh:
+            self._settings = await self._load_settings()
+            self._settings_loaded_at = time.monotonic()
+        return self._settings
+
+    async def get_setting(self, key: str):
+        """Fetch global settings like exchange_rate."""
+        settings = await self.get_settings()
+        return settings.get(key, 1.0)
+
+    async def update_setting(self, key: str, value: float):
+        """Update global settings and write the new value through to the local cache."""
+        res = await self._store_setting(key, value)
+        if self._settings is not None:
+            self._settings[key] = float(value)
+        return res
+
+    # --- MEDIA & STORAGE ---
+
+    @abstractmethod
+    async def upload_file(self, file_path: str, file_path_db: str, file_content, mime_type: str, upsert: bool = False):
+        """
+        Stores a file under file_path in the proofs bucket and returns its URL.
+        file_content is bytes or an async iterator of chunks.
+        """
+
+    # --- ATTACHMENTS ---
+
+    @abstractmethod
+    async def get_attachment(self, sha256: str = None, file_unique_id: str = None):
+        """Attachment row by content hash or Telegram file_unique_id, or None."""
+
+    @abstractmethod
+    async def create_attachment(self, data: dict):
+        """Inserts an attachment; an existing row with the same sha256 is returned instead."""
+
+    @abstractmethod
+    async def set_shipment_attachments(self, shipment_id: str, attachment_ids: list):
+        """Replaces the shipment's attachment list, keeping the given order."""
+
+    @abstractmethod
+    async def get_shipment_attachments(self, shipment_id: str):
+        """Attachment rows of one shipment in submission order."""
+
+# The shared helpers above are timed too; each implementation instruments its own methods
+instrument_methods(DatabaseBackend, DB_SECONDS, DB_ERRORS)
@@ -63,4 +63,470 @@ CREATE TABLE settings (
 );
 
 -- Insert initial exchange rate
-INSERT INTO settings (key, value) VALUES ('exchange_rate', 56.00);
\ No newline at end of file
+INSERT INTO settings (key, value) VALUES ('exchange_rate', 56.00);
+
+-- MILESTONE 2: COLUMNS USED BY THE BOT RUNTIME
+
+-- Conversation state and the buffered shipment wizard draft (one write per step)
+ALTER TABLE profiles ADD COLUMN IF NOT EXISTS state TEXT;
+ALTER TABLE profiles ADD COLUMN IF NOT EXISTS draft JSONB;
+
+-- Route and admin channel message link
+ALTER TABLE shipments ADD COLUMN IF NOT EXISTS origin TEXT;
+ALTER TABLE shipments ADD COLUMN IF NOT EXISTS destination TEXT;
+ALTER TABLE shipments ADD COLUMN IF NOT EXISTS admin_message_id BIGINT;
+
+
+-- MILESTONE 3: INCREMENTAL STATISTICS
+
+-- One row per counter; the admin stats screen reads this table in a single query
+CREATE TABLE IF NOT EXISTS stats_counters (
+    key TEXT PRIMARY KEY,
+    value DECIMAL NOT NULL DEFAULT 0
+);
+
+CREATE OR REPLACE FUNCTION bump_stat(k TEXT, delta DECIMAL) RETURNS VOID AS $$
+    INSERT INTO stats_counters (key, value) VALUES (k, delta)
+    ON CONFLICT (key) DO UPDATE SET value = stats_counters.value + EXCLUDED.value;
+$$ LANGUAGE sql;
+
+CREATE OR REPLACE FUNCTION profiles_stats_trigger() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' AND OLD.is_approved IS NOT DISTINCT FROM NEW.is_approved THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM bump_stat('users', -1);
+        PERFORM bump_stat('pending_users', CASE WHEN COALESCE(OLD.is_approved, FALSE) THEN 0 ELSE -1 END);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM bump_stat('users', 1);
+        PERFORM bump_stat('pending_users', CASE WHEN COALESCE(NEW.is_approved, FALSE) THEN 0 ELSE 1 END);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- One counter delta per (key) for a shipment row entering (+1) or leaving (-1) the totals
+CREATE OR REPLACE FUNCTION shipment_stat_deltas(s shipments, sign INTEGER)
+RETURNS TABLE (key TEXT, delta DECIMAL) AS $$
+    VALUES ('shipments', sign::DECIMAL),
+           ('shipment_status:' || COALESCE(s.shipment_status::TEXT, 'none'), sign),
+           ('payment_status:' || COALESCE(s.payment_status::TEXT, 'none'), sign),
+           ('total_usd', sign * COALESCE(s.chargeable_weight * s.sale_rate_usd, 0)),
+           ('total_etb', sign * COALESCE(s.chargeable_weight * s.sale_rate_usd * s.exchange_rate_etb, 0));
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Statement-level: a bulk insert bumps each counter once instead of once per row, which
+-- would pile up row versions of the same counter inside one transaction. An UPDATE that
+-- leaves the counted columns alone nets to zero and writes nothing.
+CREATE OR REPLACE FUNCTION shipments_stats_trigger() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO stats_counters (key, value)
+        SELECT d.key, SUM(d.delta) FROM new_rows n, shipment_stat_deltas(n, 1) d
+        GROUP BY d.key ORDER BY d.key
+        ON CONFLICT (key) DO UPDATE SET value = stats_counters.value + EXCLUDED.value;
+    ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO stats_counters (key, value)
+        SELECT d.key, SUM(d.delta) FROM old_rows o, shipment_stat_deltas(o, -1) d
+        GROUP BY d.key ORDER BY d.key
+        ON CONFLICT (key) DO UPDATE SET value = stats_counters.value + EXCLUDED.value;
+    ELSE
+        INSERT INTO stats_counters (key, value)
+        SELECT d.key, SUM(d.delta) FROM (
+            SELECT d.* FROM old_rows o, shipment_stat_deltas(o, -1) d
+            UNION ALL
+            SELECT d.* FROM new_rows n, shipment_stat_deltas(n, 1) d
+        ) d
+        GROUP BY d.key HAVING SUM(d.delta) <> 0 ORDER BY d.key
+        ON CONFLICT (key) DO UPDATE SET value = stats_counters.value + EXCLUDED.value;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS profiles_stats ON profiles;
+CREATE TRIGGER profiles_stats AFTER INSERT OR UPDATE OR DELETE ON profiles
+    FOR EACH ROW EXECUTE FUNCTION profiles_stats_trigger();
+
+-- Postgres allows transition tables only on single-event triggers, hence three
+DROP TRIGGER IF EXISTS shipments_stats ON shipments;
+DROP TRIGGER IF EXISTS shipments_stats_insert ON shipments;
+CREATE TRIGGER shipments_stats_insert AFTER INSERT ON shipments
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION shipments_stats_trigger();
+DROP TRIGGER IF EXISTS shipments_stats_update ON shipments;
+CREATE TRIGGER shipments_stats_update AFTER UPDATE ON shipments
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION shipments_stats_trigger();
+DROP TRIGGER IF EXISTS shipments_stats_delete ON shipments;
+CREATE TRIGGER shipments_stats_delete AFTER DELETE ON shipments
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION shipments_stats_trigger();
+
+-- Backfill the counters from existing rows (safe to re-run)
+TRUNCATE stats_counters;
+INSERT INTO stats_counters (key, value)
+SELECT 'users', COUNT(*) FROM profiles
+UNION ALL
+SELECT 'pending_users', COUNT(*) FROM profiles WHERE NOT COALESCE(is_approved, FALSE)
+UNION ALL
+SELECT 'shipments', COUNT(*) FROM shipments
+UNION ALL
+SELECT 'shipment_status:' || COALESCE(shipment_status::TEXT, 'none'), COUNT(*) FROM shipments GROUP BY shipment_status
+UNION ALL
+SELECT 'payment_status:' || COALESCE(payment_status::TEXT, 'none'), COUNT(*) FROM shipments GROUP BY payment_status
+UNION ALL
+SELECT 'total_usd', COALESCE(SUM(chargeable_weight * sale_rate_usd), 0) FROM shipments
+UNION ALL
+SELECT 'total_etb', COALESCE(SUM(chargeable_weight * sale_rate_usd * exchange_rate_etb), 0) FROM shipments;
+
+
+-- MILESTONE 4: KEYSET PAGINATION INDEXES
+
+-- Staff Panel queue: (created_at, id) keyset, optionally filtered by one status column
+CREATE INDEX IF NOT EXISTS shipments_created_idx ON shipments (created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS shipments_status_created_idx ON shipments (shipment_status, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS shipments_payment_created_idx ON shipments (payment_status, created_at DESC, id DESC);
+
+-- Pending approvals queue: (created_at, telegram_id) keyset over unapproved profiles only
+CREATE INDEX IF NOT EXISTS profiles_pending_idx ON profiles (created_at, telegram_id) WHERE is_approved = FALSE;
+
+-- Track My Shipments: per-customer keyset
+CREATE INDEX IF NOT EXISTS shipments_owner_created_idx ON shipments (created_by, created_at DESC, id DESC);
+
+
+-- MILESTONE 5: BROADCAST JOBS
+
+-- One row per announcement; cursor is the last telegram_id handed to the sender
+CREATE TABLE IF NOT EXISTS broadcast_jobs (
+    id BIGSERIAL PRIMARY KEY,
+    created_by BIGINT REFERENCES profiles(telegram_id) ON DELETE SET NULL,
+    text TEXT NOT NULL,
+    status TEXT DEFAULT 'pending',            -- pending | running | done
+    cursor BIGINT DEFAULT 0,
+    total INTEGER DEFAULT 0,
+    delivered INTEGER DEFAULT 0,
+    failed INTEGER DEFAULT 0,
+    progress_chat_id BIGINT,
+    progress_message_id BIGINT,
+    lease_until TIMESTAMP WITH TIME ZONE,     -- set while an invocation is delivering
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    finished_at TIMESTAMP WITH TIME ZONE
+);
+
+CREATE INDEX IF NOT EXISTS broadcast_jobs_active_idx ON broadcast_jobs (id) WHERE status IN ('pending', 'running');
+CREATE INDEX IF NOT EXISTS profiles_approved_idx ON profiles (telegram_id) WHERE is_approved = TRUE;
+
+
+-- MILESTONE 6: TRANSACTIONAL NOTIFICATION OUTBOX
+
+-- Telegram messages queued in the same transaction as the shipment change that caused them
+CREATE TABLE IF NOT EXISTS notification_outbox (
+    id BIGSERIAL PRIMARY KEY,
+    chat_id TEXT NOT NULL,
+    method TEXT NOT NULL DEFAULT 'send_message',   -- send_message | send_photo | send_document | send_media_group
+    payload JSONB NOT NULL,
+    shipment_id UUID REFERENCES shipments(id) ON DELETE CASCADE,
+    track_message BOOLEAN DEFAULT FALSE,           -- write the sent message_id back to shipments.admin_message_id
+    status TEXT DEFAULT 'pending',                 -- pending | sending | sent | failed
+    attempts INTEGER DEFAULT 0,
+    next_attempt_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    last_error TEXT,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    sent_at TIMESTAMP WITH TIME ZONE
+);
+
+CREATE INDEX IF NOT EXISTS notification_outbox_due_idx ON notification_outbox (next_attempt_at, id)
+    WHERE status IN ('pending', 'sending');
+
+-- Inserts (p_insert) or updates one shipment from a JSON object of columns and queues its
+-- notifications atomically. Only the keys present in p_changes are written, so defaults still apply.
+CREATE OR REPLACE FUNCTION apply_shipment_change(p_shipment_id UUID, p_changes JSONB, p_messages JSONB, p_insert BOOLEAN DEFAULT FALSE)
+RETURNS SETOF shipments AS $$
+DECLARE
+    cols TEXT;
+BEGIN
+    SELECT string_agg(quote_ident(k), ', ') INTO cols FROM jsonb_object_keys(p_changes) AS k;
+    IF p_insert THEN
+        EXECUTE format('INSERT INTO shipments (%s) SELECT %s FROM jsonb_populate_record(NULL::shipments, $1)', cols, cols)
+            USING p_changes;
+    ELSIF cols IS NOT NULL THEN
+        EXECUTE format('UPDATE shipments SET (%s) = (SELECT %s FROM jsonb_populate_record(NULL::shipments, $1)) WHERE id = $2', cols, cols)
+            USING p_changes, p_shipment_id;
+    END IF;
+
+    INSERT INTO notification_outbox (chat_id, method, payload, shipment_id, track_message)
+    SELECT m->>'chat_id', COALESCE(m->>'method', 'send_message'), m->'payload', p_shipment_id,
+           COALESCE((m->>'track_message')::BOOLEAN, FALSE)
+    FROM jsonb_array_elements(COALESCE(p_messages, '[]'::JSONB)) AS m;
+
+    RETURN QUERY SELECT * FROM shipments WHERE id = p_shipment_id;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Per-chat ordering check in claim_outbox: the open rows of one chat, in queue order
+CREATE INDEX IF NOT EXISTS notification_outbox_chat_idx ON notification_outbox (chat_id, id)
+    WHERE status IN ('pending', 'sending');
+
+-- Hands out due messages to one drainer at a time; an expired 'sending' lease is re-claimed.
+-- A chat's rows are claimed in id order: a row is skipped while an earlier row of its chat
+-- is waiting for a retry or leased to another drainer. Claims take a transaction lock so
+-- each one sees the leases of the claim before it.
+CREATE OR REPLACE FUNCTION claim_outbox(p_limit INTEGER, p_lease_seconds INTEGER)
+RETURNS SETOF notification_outbox AS $$
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('claim_outbox'));
+    RETURN QUERY
+    UPDATE notification_outbox o
+    SET status = 'sending', next_attempt_at = now() + make_interval(secs => p_lease_seconds)
+    WHERE o.id IN (
+        SELECT n.id FROM notification_outbox n
+        WHERE n.status IN ('pending', 'sending') AND n.next_attempt_at <= now()
+          AND NOT EXISTS (
+              SELECT 1 FROM notification_outbox e
+              WHERE e.chat_id = n.chat_id AND e.id < n.id
+                AND e.status IN ('pending', 'sending') AND e.next_attempt_at > now()
+          )
+        ORDER BY n.id
+        LIMIT p_limit
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING o.*;
+END;
+$$ LANGUAGE plpgsql;
+
+-- MILESTONE 7: TELEGRAM FILE IDS FOR PAYMENT PROOFS
+-- Parallel to shipments.files: the admin channel is sent the proofs by file_id, not by Storage URL
+
+ALTER TABLE shipments ADD COLUMN IF NOT EXISTS file_ids TEXT[] DEFAULT '{}';
+
+-- MILESTONE 8: CONTENT-ADDRESSED ATTACHMENTS
+-- One row per distinct file content; Storage objects are keyed by the SHA-256, so a
+-- receipt sent twice is stored once. shipments.files/file_ids stay as the denormalised copy.
+
+CREATE TABLE IF NOT EXISTS attachments (
+    id BIGSERIAL PRIMARY KEY,
+    sha256 TEXT NOT NULL UNIQUE,
+    size_bytes BIGINT NOT NULL,
+    mime_type TEXT,
+    storage_key TEXT NOT NULL,
+    public_url TEXT NOT NULL,
+    file_unique_id TEXT,                      -- Telegram's id for the first upload; skips the download on a resend
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS attachments_file_unique_idx ON attachments (file_unique_id);
+
+-- Shipment -> attachments, in submission order. The primary key serves "attachments of a shipment".
+CREATE TABLE IF NOT EXISTS shipment_attachments (
+    shipment_id UUID NOT NULL REFERENCES shipments(id) ON DELETE CASCADE,
+    attachment_id BIGINT NOT NULL REFERENCES attachments(id),
+    position SMALLINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (shipment_id, attachment_id)
+);
+
+CREATE INDEX IF NOT EXISTS shipment_attachments_attachment_idx ON shipment_attachments (attachment_id);
+
+-- Replaces a shipment's attachment list in one transaction (a resubmission supersedes the last one)
+CREATE OR REPLACE FUNCTION set_shipment_attachments(p_shipment_id UUID, p_attachment_ids BIGINT[])
+RETURNS VOID AS $$
+    DELETE FROM shipment_attachments WHERE shipment_id = p_shipment_id;
+    INSERT INTO shipment_attachments (shipment_id, attachment_id, position)
+    SELECT p_shipment_id, a.id, a.ord - 1
+    FROM unnest(p_attachment_ids) WITH ORDINALITY AS a(id, ord)
+    ON CONFLICT DO NOTHING;
+$$ LANGUAGE sql;
+
+-- MILESTONE 9: STAFF SHIPMENT SEARCH
+-- Trigram indexes serve substring (ILIKE '%...%') and fuzzy matches alike, so an AWB fragment
+-- and a misspelt consignee both hit an index instead of scanning every shipment.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- AWB with separators stripped: '071-12345678', '071 12345678' and '07112345678' compare equal
+CREATE OR REPLACE FUNCTION shipment_awb_key(p_awb TEXT) RETURNS TEXT AS $$
+    SELECT lower(regexp_replace(COALESCE(p_awb, ''), '[^0-9A-Za-z]', '', 'g'));
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Every free-text field staff search by, as one lower-cased document
+CREATE OR REPLACE FUNCTION shipment_search_doc(p_awb TEXT, p_shipper TEXT, p_consignee TEXT,
+                                               p_notify TEXT, p_origin TEXT, p_destination TEXT)
+RETURNS TEXT AS $$
+    SELECT lower(COALESCE(p_awb, '') || ' ' || COALESCE(p_shipper, '') || ' ' || COALESCE(p_consignee, '') || ' ' ||
+                 COALESCE(p_notify, '') || ' ' || COALESCE(p_origin, '') || ' ' || COALESCE(p_destination, ''));
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE INDEX IF NOT EXISTS shipments_awb_trgm_idx ON shipments USING GIN (shipment_awb_key(awb_number) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS shipments_search_trgm_idx ON shipments USING GIN (
+    shipment_search_doc(awb_number, shipper_info, consignee_info, notify_party, origin, destination) gin_trgm_ops
+);
+
+-- Ranked, bounded search: AWB hits first, then substring matches, then fuzzy word matches
+CREATE OR REPLACE FUNCTION search_shipments(p_query TEXT, p_limit INTEGER DEFAULT 10)
+RETURNS TABLE (
+    id UUID, airline TEXT, awb_number TEXT, origin TEXT, destination TEXT,
+    shipment_status shipment_status, payment_status payment_status,
+    created_at TIMESTAMP WITH TIME ZONE, owner TEXT, rank REAL
+) AS $$
+    WITH q AS (
+        SELECT lower(trim(p_query)) AS text, shipment_awb_key(p_query) AS awb
+    ), hits AS (
+        SELECT s.*,
+               shipment_search_doc(s.awb_number, s.shipper_info, s.consignee_info, s.notify_party, s.origin, s.destination) AS doc,
+               shipment_awb_key(s.awb_number) AS awb_key
+        FROM shipments s, q
+        WHERE (length(q.awb) >= 3 AND shipment_awb_key(s.awb_number) LIKE '%' || q.awb || '%')
+           OR shipment_search_doc(s.awb_number, s.shipper_info, s.consignee_info, s.notify_party, s.origin, s.destination)
+              LIKE '%' || q.text || '%'
+           OR q.text <% shipment_search_doc(s.awb_number, s.shipper_info, s.consignee_info, s.notify_party, s.origin, s.destination)
+    )
+    SELECT h.id, h.airline, h.awb_number, h.origin, h.destination, h.shipment_status, h.payment_status,
+           h.created_at, p.full_name,
+           (CASE WHEN length(q.awb) >= 3 AND h.awb_key LIKE '%' || q.awb || '%' THEN 2 ELSE 0 END
+            + CASE WHEN h.doc LIKE '%' || q.text || '%' THEN 1 ELSE 0 END
+            + word_similarity(q.text, h.doc))::REAL AS rank
+    FROM hits h
+    CROSS JOIN q
+    LEFT JOIN profiles p ON p.telegram_id = h.created_by
+    ORDER BY rank DESC, h.created_at DESC
+    LIMIT LEAST(GREATEST(p_limit, 1), 50);
+$$ LANGUAGE sql STABLE;
+
+-- MILESTONE 10: MULTI-LINE DIMENSIONS
+-- One row per size in a consignment (L x W x H x pieces). shipments.volumetric_weight and
+-- chargeable_weight hold the totals computed from these lines; length/width/height_cm are legacy.
+
+CREATE TABLE IF NOT EXISTS shipment_dimensions (
+    shipment_id UUID NOT NULL REFERENCES shipments(id) ON DELETE CASCADE,
+    line_no SMALLINT NOT NULL,
+    length_cm DECIMAL NOT NULL,
+    width_cm DECIMAL NOT NULL,
+    height_cm DECIMAL NOT NULL,
+    pieces INTEGER NOT NULL DEFAULT 1,
+    PRIMARY KEY (shipment_id, line_no)
+);
+
+-- Existing single-size shipments become one line covering all their pieces (safe to re-run)
+INSERT INTO shipment_dimensions (shipment_id, line_no, length_cm, width_cm, height_cm, pieces)
+SELECT id, 0, length_cm, width_cm, height_cm, GREATEST(COALESCE(pieces, 1), 1)
+FROM shipments
+WHERE length_cm IS NOT NULL AND width_cm IS NOT NULL AND height_cm IS NOT NULL
+ON CONFLICT DO NOTHING;
+
+-- A shipment's lines as the JSON array the bot reads ('dims')
+CREATE OR REPLACE FUNCTION shipment_dims(p_shipment_id UUID) RETURNS JSONB AS $$
+    SELECT COALESCE(jsonb_agg(jsonb_build_object(
+        'length_cm', length_cm, 'width_cm', width_cm, 'height_cm', height_cm, 'pieces', pieces
+    ) ORDER BY line_no), '[]'::JSONB)
+    FROM shipment_dimensions WHERE shipment_id = p_shipment_id;
+$$ LANGUAGE sql STABLE;
+
+-- apply_shipment_change now also takes a 'dims' array in p_changes (replacing the lines) and
+-- returns the row with its dims, so the return type changes from SETOF shipments to JSONB.
+-- An 'attachment_ids' array replaces the shipment's proof links (MILESTONE 8) in the same
+-- transaction, so a shipment never points at proofs its status change did not record.
+DROP FUNCTION IF EXISTS apply_shipment_change(UUID, JSONB, JSONB, BOOLEAN);
+CREATE FUNCTION apply_shipment_change(p_shipment_id UUID, p_changes JSONB, p_messages JSONB, p_insert BOOLEAN DEFAULT FALSE)
+RETURNS JSONB AS $$
+DECLARE
+    v_dims JSONB := p_changes->'dims';
+    v_attachments JSONB := p_changes->'attachment_ids';
+    v_changes JSONB := p_changes - 'dims' - 'attachment_ids';
+    cols TEXT;
+BEGIN
+    SELECT string_agg(quote_ident(k), ', ') INTO cols FROM jsonb_object_keys(v_changes) AS k;
+    IF p_insert THEN
+        EXECUTE format('INSERT INTO shipments (%s) SELECT %s FROM jsonb_populate_record(NULL::shipments, $1)', cols, cols)
+            USING v_changes;
+    ELSIF cols IS NOT NULL THEN
+        EXECUTE format('UPDATE shipments SET (%s) = (SELECT %s FROM jsonb_populate_record(NULL::shipments, $1)) WHERE id = $2', cols, cols)
+            USING v_changes, p_shipment_id;
+    END IF;
+
+    IF v_dims IS NOT NULL THEN
+        DELETE FROM shipment_dimensions WHERE shipment_id = p_shipment_id;
+        INSERT INTO shipment_dimensions (shipment_id, line_no, length_cm, width_cm, height_cm, pieces)
+        SELECT p_shipment_id, d.ord - 1, (d.line->>'length_cm')::DECIMAL, (d.line->>'width_cm')::DECIMAL,
+               (d.line->>'height_cm')::DECIMAL, COALESCE((d.line->>'pieces')::INTEGER, 1)
+        FROM jsonb_array_elements(v_dims) WITH ORDINALITY AS d(line, ord);
+    END IF;
+
+    IF v_attachments IS NOT NULL THEN
+        PERFORM set_shipment_attachments(p_shipment_id, ARRAY(
+            SELECT a.id::BIGINT FROM jsonb_array_elements_text(v_attachments) WITH ORDINALITY AS a(id, ord) ORDER BY a.ord
+        ));
+    END IF;
+
+    INSERT INTO notification_outbox (chat_id, method, payload, shipment_id, track_message)
+    SELECT m->>'chat_id', COALESCE(m->>'method', 'send_message'), m->'payload', p_shipment_id,
+           COALESCE((m->>'track_message')::BOOLEAN, FALSE)
+    FROM jsonb_array_elements(COALESCE(p_messages, '[]'::JSONB)) AS m;
+
+    RETURN (SELECT to_jsonb(s) || jsonb_build_object('dims', shipment_dims(s.id)) FROM shipments s WHERE s.id = p_shipment_id);
+END;
+$$ LANGUAGE plpgsql;
+
+-- MILESTONE 11: BULK SHIPMENT IMPORT
+-- Staff upload a CSV/TSV of bookings; the bot validates it and sends the valid rows in batches.
+-- p_rows is a JSON array of shipments rows, each with its 'dims' lines. All rows carry the same
+-- keys, so one column list covers the batch. Rows and lines go in as two set-based INSERTs in
+-- one transaction. The statistics triggers (MILESTONE 3) bump the counters once per INSERT.
+CREATE OR REPLACE FUNCTION import_shipments(p_rows JSONB)
+RETURNS INTEGER AS $$
+DECLARE
+    cols TEXT;
+    inserted INTEGER;
+BEGIN
+    SELECT string_agg(quote_ident(k), ', ') INTO cols
+    FROM jsonb_object_keys((p_rows->0) - 'dims') AS k;
+    IF cols IS NULL THEN
+        RETURN 0;
+    END IF;
+
+    EXECUTE format(
+        'INSERT INTO shipments (%s) SELECT %s FROM jsonb_populate_recordset(NULL::shipments, $1)', cols, cols
+    ) USING p_rows;
+    GET DIAGNOSTICS inserted = ROW_COUNT;
+
+    INSERT INTO shipment_dimensions (shipment_id, line_no, length_cm, width_cm, height_cm, pieces)
+    SELECT (r->>'id')::UUID, d.ord - 1, (d.line->>'length_cm')::DECIMAL, (d.line->>'width_cm')::DECIMAL,
+           (d.line->>'height_cm')::DECIMAL, COALESCE((d.line->>'pieces')::INTEGER, 1)
+    FROM jsonb_array_elements(p_rows) AS r,
+         jsonb_array_elements(COALESCE(r->'dims', '[]'::JSONB)) WITH ORDINALITY AS d(line, ord);
+
+    RETURN inserted;
+END;
+$$ LANGUAGE plpgsql;
+
+-- MILESTONE 12: WEBHOOK UPDATE DE-DUPLICATION
+-- Telegram redelivers an update when the webhook answers slowly, so every update_id is
+-- claimed here before it is routed. Telegram's ids are only unique for a while (the sequence
+-- may restart after a quiet week), so a claim expires after p_ttl_seconds and can be
+-- taken again. Expired rows are pruned as a side effect of every 100th claim.
+CREATE TABLE IF NOT EXISTS processed_updates (
+    update_id BIGINT PRIMARY KEY,
+    seen_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS processed_updates_seen_idx ON processed_updates (seen_at);
+
+-- TRUE when the caller is the first to see p_update_id (within the TTL) and should process it
+CREATE OR REPLACE FUNCTION claim_update(p_update_id BIGINT, p_ttl_seconds INTEGER)
+RETURNS BOOLEAN AS $$
+DECLARE
+    claimed BOOLEAN;
+BEGIN
+    IF p_update_id % 100 = 0 THEN
+        DELETE FROM processed_updates WHERE seen_at < now() - make_interval(secs => p_ttl_seconds);
+    END IF;
+
+    INSERT INTO processed_updates AS p (update_id) VALUES (p_update_id)
+    ON CONFLICT (update_id) DO UPDATE SET seen_at = now()
+        WHERE p.seen_at < now() - make_interval(secs => p_ttl_seconds)
+    RETURNING TRUE INTO claimed;
+
+    RETURN COALESCE(claimed, FALSE);
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,240 @@
+-- AERP EMBEDDED SCHEMA (SQLite)
+-- The tables of schema.sql for DATABASE_BACKEND=sqlite. Applied on first connect; safe to re-run.
+-- UUIDs and timestamps are TEXT (ids are generated by the bot, created_at is ISO-8601 UTC with
+-- microseconds so it sorts as text), arrays and JSONB are JSON text, booleans are 0/1.
+-- The Postgres functions (apply_shipment_change, claim_outbox, set_shipment_attachments,
+-- search_shipments, import_shipments, claim_update) are implemented in core/database/sqlite_backend.py.
+
+PRAGMA journal_mode = WAL;
+PRAGMA foreign_keys = ON;
+
+CREATE TABLE IF NOT EXISTS profiles (
+    telegram_id INTEGER PRIMARY KEY,
+    username TEXT,
+    full_name TEXT,
+    company_name TEXT,
+    role TEXT DEFAULT 'user' CHECK (role IN ('admin', 'staff', 'user')),
+    is_approved INTEGER DEFAULT 0,
+    state TEXT,
+    draft TEXT,                                   -- JSON
+    created_at TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS shipments (
+    id TEXT PRIMARY KEY,
+    created_by INTEGER REFERENCES profiles(telegram_id),
+    date TEXT DEFAULT CURRENT_DATE,
+    airline TEXT,
+    awb_number TEXT,
+    origin TEXT,
+    destination TEXT,
+
+    -- Cargo Physicals
+    pieces INTEGER,
+    gross_weight REAL,
+    length_cm REAL,
+    width_cm REAL,
+    height_cm REAL,
+    volumetric_weight REAL,
+    chargeable_weight REAL,
+
+    -- Financials
+    approved_rate_usd REAL,
+    sale_rate_usd REAL,
+    exchange_rate_etb REAL,
+
+    -- Address Blocks
+    shipper_info TEXT,
+    consignee_info TEXT,
+    notify_party TEXT,
+
+    -- Status
+    shipment_status TEXT DEFAULT 'quotation_created',
+    payment_status TEXT DEFAULT 'unpaid',
+
+    -- Media Links (JSON arrays) and the admin channel message
+    files TEXT DEFAULT '[]',
+    file_ids TEXT DEFAULT '[]',
+    admin_message_id INTEGER,
+    created_at TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS settings (
+    key TEXT PRIMARY KEY,
+    value REAL,
+    updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT OR IGNORE INTO settings (key, value) VALUES ('exchange_rate', 56.00);
+
+-- Incremental statistics (MILESTONE 3): the same counters as schema.sql, kept by triggers
+CREATE TABLE IF NOT EXISTS stats_counters (
+    key TEXT PRIMARY KEY,
+    value REAL NOT NULL DEFAULT 0
+);
+
+CREATE TRIGGER IF NOT EXISTS profiles_stats_insert AFTER INSERT ON profiles BEGIN
+    INSERT INTO stats_counters (key, value)
+    VALUES ('users', 1), ('pending_users', CASE WHEN COALESCE(NEW.is_approved, 0) THEN 0 ELSE 1 END)
+    ON CONFLICT (key) DO UPDATE SET value = value + excluded.value;
+END;
+
+CREATE TRIGGER IF NOT EXISTS profiles_stats_update AFTER UPDATE OF is_approved ON profiles
+WHEN COALESCE(OLD.is_approved, 0) IS NOT COALESCE(NEW.is_approved, 0) BEGIN
+    INSERT INTO stats_counters (key, value)
+    VALUES ('pending_users', CASE WHEN COALESCE(NEW.is_approved, 0) THEN -1 ELSE 1 END)
+    ON CONFLICT (key) DO UPDATE SET value = value + excluded.value;
+END;
+
+CREATE TRIGGER IF NOT EXISTS profiles_stats_delete AFTER DELETE ON profiles BEGIN
+    INSERT INTO stats_counters (key, value)
+    VALUES ('users', -1), ('pending_users', CASE WHEN COALESCE(OLD.is_approved, 0) THEN 0 ELSE -1 END)
+    ON CONFLICT (key) DO UPDATE SET value = value + excluded.value;
+END;
+
+CREATE TRIGGER IF NOT EXISTS shipments_stats_insert AFTER INSERT ON shipments BEGIN
+    INSERT INTO stats_counters (key, value)
+    VALUES ('shipments', 1),
+           ('shipment_status:' || COALESCE(NEW.shipment_status, 'none'), 1),
+           ('payment_status:' || COALESCE(NEW.payment_status, 'none'), 1),
+           ('total_usd', COALESCE(NEW.chargeable_weight * NEW.sale_rate_usd, 0)),
+           ('total_etb', COALESCE(NEW.chargeable_weight * NEW.sale_rate_usd * NEW.exchange_rate_etb, 0))
+    ON CONFLICT (key) DO UPDATE SET value = value + excluded.value;
+END;
+
+CREATE TRIGGER IF NOT EXISTS shipments_stats_update
+AFTER UPDATE OF shipment_status, payment_status, chargeable_weight, sale_rate_usd, exchange_rate_etb ON shipments
+WHEN OLD.shipment_status IS NOT NEW.shipment_status OR OLD.payment_status IS NOT NEW.payment_status
+  OR OLD.chargeable_weight IS NOT NEW.chargeable_weight OR OLD.sale_rate_usd IS NOT NEW.sale_rate_usd
+  OR OLD.exchange_rate_etb IS NOT NEW.exchange_rate_etb BEGIN
+    INSERT INTO stats_counters (key, value)
+    VALUES ('shipment_status:' || COALESCE(OLD.shipment_status, 'none'), -1),
+           ('payment_status:' || COALESCE(OLD.payment_status, 'none'), -1),
+           ('total_usd', -COALESCE(OLD.chargeable_weight * OLD.sale_rate_usd, 0)),
+           ('total_etb', -COALESCE(OLD.chargeable_weight * OLD.sale_rate_usd * OLD.exchange_rate_etb, 0))
+    ON CONFLICT (key) DO UPDATE SET value = value + excluded.value;
+    INSERT INTO stats_counters (key, value)
+    VALUES ('shipment_status:' || COALESCE(NEW.shipment_status, 'none'), 1),
+           ('payment_status:' || COALESCE(NEW.payment_status, 'none'), 1),
+           ('total_usd', COALESCE(NEW.chargeable_weight * NEW.sale_rate_usd, 0)),
+           ('total_etb', COALESCE(NEW.chargeable_weight * NEW.sale_rate_usd * NEW.exchange_rate_etb, 0))
+    ON CONFLICT (key) DO UPDATE SET value = value + excluded.value;
+END;
+
+CREATE TRIGGER IF NOT EXISTS shipments_stats_delete AFTER DELETE ON shipments BEGIN
+    INSERT INTO stats_counters (key, value)
+    VALUES ('shipments', -1),
+           ('shipment_status:' || COALESCE(OLD.shipment_status, 'none'), -1),
+           ('payment_status:' || COALESCE(OLD.payment_status, 'none'), -1),
+           ('total_usd', -COALESCE(OLD.chargeable_weight * OLD.sale_rate_usd, 0)),
+           ('total_etb', -COALESCE(OLD.chargeable_weight * OLD.sale_rate_usd * OLD.exchange_rate_etb, 0))
+    ON CONFLICT (key) DO UPDATE SET value = value + excluded.value;
+END;
+
+-- Backfill once, for a database file created before the counters existed
+INSERT INTO stats_counters (key, value)
+SELECT key, value FROM (
+    SELECT 'users' AS key, COUNT(*) AS value FROM profiles
+    UNION ALL
+    SELECT 'pending_users', COUNT(*) FROM profiles WHERE NOT COALESCE(is_approved, 0)
+    UNION ALL
+    SELECT 'shipments', COUNT(*) FROM shipments
+    UNION ALL
+    SELECT 'shipment_status:' || COALESCE(shipment_status, 'none'), COUNT(*) FROM shipments GROUP BY shipment_status
+    UNION ALL
+    SELECT 'payment_status:' || COALESCE(payment_status, 'none'), COUNT(*) FROM shipments GROUP BY payment_status
+    UNION ALL
+    SELECT 'total_usd', COALESCE(SUM(chargeable_weight * sale_rate_usd), 0) FROM shipments
+    UNION ALL
+    SELECT 'total_etb', COALESCE(SUM(chargeable_weight * sale_rate_usd * exchange_rate_etb), 0) FROM shipments
+) WHERE NOT EXISTS (SELECT 1 FROM stats_counters);
+
+-- Keyset pagination (schema.sql MILESTONE 4)
+CREATE INDEX IF NOT EXISTS shipments_created_idx ON shipments (created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS shipments_status_created_idx ON shipments (shipment_status, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS shipments_payment_created_idx ON shipments (payment_status, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS shipments_owner_created_idx ON shipments (created_by, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS profiles_pending_idx ON profiles (created_at, telegram_id) WHERE is_approved = 0;
+CREATE INDEX IF NOT EXISTS profiles_approved_idx ON profiles (telegram_id) WHERE is_approved = 1;
+
+-- Broadcast jobs (MILESTONE 5)
+CREATE TABLE IF NOT EXISTS broadcast_jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_by INTEGER REFERENCES profiles(telegram_id) ON DELETE SET NULL,
+    text TEXT NOT NULL,
+    status TEXT DEFAULT 'pending',
+    cursor INTEGER DEFAULT 0,
+    total INTEGER DEFAULT 0,
+    delivered INTEGER DEFAULT 0,
+    failed INTEGER DEFAULT 0,
+    progress_chat_id INTEGER,
+    progress_message_id INTEGER,
+    lease_until TEXT,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    finished_at TEXT
+);
+
+CREATE INDEX IF NOT EXISTS broadcast_jobs_active_idx ON broadcast_jobs (id) WHERE status IN ('pending', 'running');
+
+-- Notification outbox (MILESTONE 6)
+CREATE TABLE IF NOT EXISTS notification_outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    chat_id TEXT NOT NULL,
+    method TEXT NOT NULL DEFAULT 'send_message',
+    payload TEXT NOT NULL,                        -- JSON
+    shipment_id TEXT REFERENCES shipments(id) ON DELETE CASCADE,
+    track_message INTEGER DEFAULT 0,
+    status TEXT DEFAULT 'pending',
+    attempts INTEGER DEFAULT 0,
+    next_attempt_at TEXT,
+    last_error TEXT,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    sent_at TEXT
+);
+
+CREATE INDEX IF NOT EXISTS notification_outbox_due_idx ON notification_outbox (next_attempt_at, id)
+    WHERE status IN ('pending', 'sending');
+CREATE INDEX IF NOT EXISTS notification_outbox_chat_idx ON notification_outbox (chat_id, id)
+    WHERE status IN ('pending', 'sending');
+
+-- Content-addressed attachments (MILESTONE 8)
+CREATE TABLE IF NOT EXISTS attachments (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    sha256 TEXT NOT NULL UNIQUE,
+    size_bytes INTEGER NOT NULL,
+    mime_type TEXT,
+    storage_key TEXT NOT NULL,
+    public_url TEXT NOT NULL,
+    file_unique_id TEXT,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS attachments_file_unique_idx ON attachments (file_unique_id);
+
+CREATE TABLE IF NOT EXISTS shipment_attachments (
+    shipment_id TEXT NOT NULL REFERENCES shipments(id) ON DELETE CASCADE,
+    attachment_id INTEGER NOT NULL REFERENCES attachments(id),
+    position INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (shipment_id, attachment_id)
+);
+
+CREATE INDEX IF NOT EXISTS shipment_attachments_attachment_idx ON shipment_attachments (attachment_id);
+
+-- Multi-line dimensions (MILESTONE 10)
+CREATE TABLE IF NOT EXISTS shipment_dimensions (
+    shipment_id TEXT NOT NULL REFERENCES shipments(id) ON DELETE CASCADE,
+    line_no INTEGER NOT NULL,
+    length_cm REAL NOT NULL,
+    width_cm REAL NOT NULL,
+    height_cm REAL NOT NULL,
+    pieces INTEGER NOT NULL DEFAULT 1,
+    PRIMARY KEY (shipment_id, line_no)
+);
+
+-- Webhook update de-duplication (MILESTONE 12)
+CREATE TABLE IF NOT EXISTS processed_updates (
+    update_id INTEGER PRIMARY KEY,
+    seen_at TEXT NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS processed_updates_seen_idx ON processed_updates (seen_at);
@@ -0,0 +1,495 @@
+import json
+import os
+import re
+import sqlite3
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from core.config import Config
+from core.database.base import DatabaseBackend, Result
+from core.utils.metrics import instrument_methods, DB_SECONDS, DB_ERRORS
+
+SCHEMA = Path(__file__).with_name("schema_sqlite.sql")
+# An embedded resource in a PostgREST select list: table(col, ...)
+_EMBED = re.compile(r"(\w+)\((.*)\)")
+
+# Column types SQLite has no native form for (see schema_sqlite.sql)
+JSON_COLUMNS = {"draft", "files", "file_ids", "payload"}
+BOOL_COLUMNS = {"is_approved", "track_message"}
+TIMESTAMP_COLUMNS = {"created_at", "lease_until", "next_attempt_at", "sent_at", "finished_at"}
+
+def _ts(value):
+    """ISO-8601 UTC with microseconds, the one text form that sorts chronologically."""
+    dt = value if isinstance(value, datetime) else datetime.fromisoformat(value)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc).isoformat(timespec="microseconds")
+
+def _now(seconds: float = 0):
+    return _ts(datetime.now(timezone.utc) + timedelta(seconds=seconds))
+
+def _encode(column: str, value):
+    if value is None:
+        return None
+    if column in JSON_COLUMNS:
+        return json.dumps(value)
+    if column in TIMESTAMP_COLUMNS:
+        return _ts(value)
+    if isinstance(value, bool):
+        return int(value)
+    return value
+
+def _row_factory(cursor, row):
+    out = {}
+    for (name, *_), value in zip(cursor.description, row):
+        if value is not None:
+            if name in JSON_COLUMNS:
+                value = json.loads(value)
+            elif name in BOOL_COLUMNS:
+                value = bool(value)
+        out[name] = value
+    return out
+
+def _awb_key(awb):
+    # Same as shipment_awb_key() in schema.sql
+    return re.sub(r"[^0-9A-Za-z]", "", awb or "").lower()
+
+def _nest(row: dict):
+    # "profiles.full_name" -> profiles: {full_name}, or None without an owner, like a PostgREST embed
+    embedded = {k.split(".", 1)[1]: row.pop(k) for k in [k for k in row if k.startswith("profiles.")]}
+    if embedded:
+        row['profiles'] = embedded if any(v is not None for v in embedded.values()) else None
+    return row
+
+def _in(values: list):
+    return "(" + ",".join("?" * len(values)) + ")" if values else "(NULL)"
+
+class SQLiteDatabase(DatabaseBackend):
+    """
+    Embedded backend: one SQLite file plus a local directory standing in for Storage.
+    Every query is a sub-millisecond in-process call, so statements run directly on the
+    event loop; as none of them awaits, each method is atomic with respect to other updates.
+    The schema (schema_sqlite.sql) is created on first use.
+    """
+    def __init__(self, path: str, storage_dir: str):
+        super().__init__()
+        self.path = path
+        self.storage_dir = Path(storage_dir)
+        self._conn = None
+        self._columns = {}
+
+    @property
+    def conn(self):
+        """The connection, opened and migrated on first use (autocommit; see _transaction)."""
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+            conn.row_factory = _row_factory
+            conn.executescript(SCHEMA.read_text())
+            conn.execute("PRAGMA synchronous = NORMAL")
+            conn.create_function("awb_key", 1, _awb_key, deterministic=True)
+            self._conn = conn
+        return self._conn
+
+    async def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    # --- SQL HELPERS ---
+
+    @contextmanager
+    def _transaction(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        self.conn.execute("COMMIT")
+
+    def _query(self, sql: str, params=()):
+        return self.conn.execute(sql, params).fetchall()
+
+    def _one(self, sql: str, params=()):
+        rows = self._query(sql, params)
+        return rows[0] if rows else None
+
+    def _checked(self, table: str, names):
+        """Column names are interpolated into SQL, so only real columns of `table` get through."""
+        if table not in self._columns:
+            self._columns[table] = {row['name'] for row in self._query(f"PRAGMA table_info({table})")}
+        unknown = [n for n in names if n not in self._columns[table]]
+        if unknown:
+            raise ValueError(f"Unknown {table} column(s): {', '.join(unknown)}")
+        return list(names)
+
+    def _insert(self, table: str, data: dict, on_conflict: str = ""):
+        cols = self._checked(table, data)
+        sql = (f"INSERT INTO {table} ({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))}) "
+               f"{on_conflict} RETURNING *")
+        return self._query(sql, [_encode(c, data[c]) for c in cols])
+
+    def _update(self, table: str, data: dict, where: str, params=()):
+        cols = self._checked(table, data)
+        if not cols:
+            return []
+        sql = f"UPDATE {table} SET {', '.join(f'{c} = ?' for c in cols)} WHERE {where} RETURNING *"
+        return self._query(sql, [_encode(c, data[c]) for c in cols] + list(params))
+
+    def _select_list(self, columns: str):
+        """
+        A PostgREST select list over shipments s as SQL. The one embed the bot asks for,
+        profiles(...), reads from the owner join as "profiles.<col>"; _nest folds it back.
+        """
+        out = []
+        for part in (p.strip() for p in re.split(r",(?![^()]*\))", columns)):
+            embed = _EMBED.fullmatch(part)
+            if part == "*":
+                out.append("s.*")
+            elif embed and embed.group(1) == "profiles":
+                cols = self._checked("profiles", [c.strip() for c in embed.group(2).split(",")])
+                out += [f'p.{c} AS "profiles.{c}"' for c in cols]
+            else:
+                out += [f"s.{c}" for c in self._checked("shipments", [part])]
+        return ", ".join(out)
+
+    # --- USER & STATE OPERATIONS ---
+
+    async def get_user(self, telegram_id: int):
+        return self._one("SELECT * FROM profiles WHERE telegram_id = ?", (telegram_id,))
+
+    async def create_user(self, data: dict):
+        return Result(self._insert("profiles", {"created_at": _now(), **data}))
+
+    async def update_user(self, telegram_id: int, data: dict):
+        return Result(self._update("profiles", data, "telegram_id = ?", (telegram_id,)))
+
+    async def update_user_state(self, telegram_id: int, state: str = None):
+        return Result(self._update("profiles", {"state": state}, "telegram_id = ?", (telegram_id,)))
+
+    async def approve_user(self, telegram_id: int, role: str = 'user'):
+        return Result(self._update("profiles", {"is_approved": True, "role": role, "state": None},
+                                   "telegram_id = ?", (telegram_id,)))
+
+    async def get_all_users(self):
+        return self._query("SELECT * FROM profiles ORDER BY created_at DESC")
+
+    async def get_pending_users(self, limit: int = None, after: tuple = None, until: tuple = None):
+        where, params = ["is_approved = 0"], []
+        if after:
+            ts, tid = after
+            where.append("(created_at > ? OR (created_at = ? AND telegram_id > ?))")
+            params += [_ts(ts), _ts(ts), tid]
+        if until:
+            ts, tid = until
+            where.append("(created_at < ? OR (created_at = ? AND telegram_id <= ?))")
+            params += [_ts(ts), _ts(ts), tid]
+        sql = f"SELECT * FROM profiles WHERE {' AND '.join(where)} ORDER BY created_at, telegram_id"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return self._query(sql, params)
+
+    async def approve_users(self, telegram_ids: list, role: str = 'user'):
+        return Result(self._update("profiles", {"is_approved": True, "role": role, "state": None},
+                                   f"telegram_id IN {_in(telegram_ids)}", telegram_ids))
+
+    async def delete_user(self, telegram_id: int):
+        return Result(self._query("DELETE FROM profiles WHERE telegram_id = ? RETURNING *", (telegram_id,)))
+
+    async def delete_users(self, telegram_ids: list):
+        return Result(self._query(f"DELETE FROM profiles WHERE telegram_id IN {_in(telegram_ids)} RETURNING *",
+                                  telegram_ids))
+
+    async def get_broadcast_list(self):
+        return [row['telegram_id'] for row in self._query("SELECT telegram_id FROM profiles WHERE is_approved = 1")]
+
+    async def get_broadcast_batch(self, after_id: int = 0, limit: int = 50):
+        rows = self._query("SELECT telegram_id FROM profiles WHERE is_approved = 1 AND telegram_id > ? "
+                           "ORDER BY telegram_id LIMIT ?", (after_id, limit))
+        return [row['telegram_id'] for row in rows]
+
+    async def count_broadcast_targets(self):
+        return self._one("SELECT COUNT(*) AS n FROM profiles WHERE is_approved = 1")['n']
+
+    # --- BROADCAST JOBS ---
+
+    async def create_broadcast_job(self, data: dict):
+        return self._insert("broadcast_jobs", data)[0]
+
+    async def get_broadcast_job(self, job_id: int):
+        return self._one("SELECT * FROM broadcast_jobs WHERE id = ?", (job_id,))
+
+    async def get_active_broadcast_jobs(self):
+        return self._query("SELECT * FROM broadcast_jobs WHERE status IN ('pending', 'running') ORDER BY id")
+
+    async def claim_broadcast_job(self, job_id: int, lease_seconds: float):
+        rows = self._update(
+            "broadcast_jobs", {"status": "running", "lease_until": _now(lease_seconds)},
+            "id = ? AND status IN ('pending', 'running') AND (lease_until IS NULL OR lease_until < ?)",
+            (job_id, _now())
+        )
+        return rows[0] if rows else None
+
+    async def update_broadcast_job(self, job_id: int, data: dict):
+        return Result(self._update("broadcast_jobs", data, "id = ?", (job_id,)))
+
+    # --- SHIPMENT OPERATIONS ---
+
+    def _new_shipment(self, data: dict):
+        # Column defaults the Postgres schema generates server-side
+        return {"id": str(uuid.uuid4()), "created_at": _now(), **data}
+
+    async def create_shipment(self, data: dict):
+        return Result(self._insert("shipments", self._new_shipment(data)))
+
+    async def update_shipment(self, shipment_id: str, data: dict):
+        return Result(self._update("shipments", data, "id = ?", (shipment_id,)))
+
+    async def create_shipments(self, rows: list):
+        """import_shipments() from schema.sql: one executemany per table inside a transaction."""
+        if not rows:
+            return 0
+        shipments = [self._new_shipment({k: v for k, v in row.items() if k != 'dims'}) for row in rows]
+        cols = self._checked("shipments", shipments[0])
+        with self._transaction():
+            self.conn.executemany(
+                f"INSERT INTO shipments ({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))})",
+                [[_encode(c, s.get(c)) for c in cols] for s in shipments]
+            )
+            self.conn.executemany(
+                "INSERT INTO shipment_dimensions (shipment_id, line_no, length_cm, width_cm, height_cm, pieces) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(s['id'], i, d['length_cm'], d['width_cm'], d['height_cm'], d.get('pieces') or 1)
+                 for s, row in zip(shipments, rows) for i, d in enumerate(row.get('dims') or [])]
+            )
+        return len(rows)
+
+    def _with_dims(self, row: dict):
+        if row is not None:
+            row['dims'] = self._query("SELECT length_cm, width_cm, height_cm, pieces FROM shipment_dimensions "
+                                      "WHERE shipment_id = ? ORDER BY line_no", (row['id'],))
+        return row
+
+    async def get_shipment(self, shipment_id: str):
+        return self._with_dims(self._one("SELECT * FROM shipments WHERE id = ?", (shipment_id,)))
+
+    async def get_user_shipments(self, telegram_id: int):
+        return self._query("SELECT * FROM shipments WHERE created_by = ? ORDER BY created_at DESC", (telegram_id,))
+
+    async def get_all_shipments(self):
+        rows = self._query("SELECT s.*, p.full_name AS owner_name FROM shipments s "
+                           "LEFT JOIN profiles p ON p.telegram_id = s.created_by ORDER BY s.created_at DESC")
+        for row in rows:
+            name = row.pop('owner_name')
+            row['profiles'] = {"full_name": name} if row['created_by'] is not None else None
+        return rows
+
+    async def get_shipments_page(self, limit: int = 10, cursor: tuple = None, backwards: bool = False,
+                                 shipment_status: str = None, payment_status: str = None,
+                                 created_by: int = None, columns: str = "*",
+                                 created_from: str = None, created_to: str = None):
+        where, params = [], []
+        for column, value in (("shipment_status", shipment_status), ("payment_status", payment_status),
+                              ("created_by", created_by)):
+            if value:
+                where.append(f"s.{column} = ?")
+                params.append(value)
+        if created_from:
+            where.append("s.created_at >= ?")
+            params.append(_ts(created_from))
+        if created_to:
+            where.append("s.created_at < ?")
+            params.append(_ts(created_to))
+        op = ">" if backwards else "<"
+        if cursor:
+            ts, sid = cursor
+            where.append(f"(s.created_at {op} ? OR (s.created_at = ? AND s.id {op} ?))")
+            params += [_ts(ts), _ts(ts), sid]
+        order = "ASC" if backwards else "DESC"
+        sql = (f"SELECT {self._select_list(columns)} FROM shipments s "
+               f"LEFT JOIN profiles p ON p.telegram_id = s.created_by"
+               f"{' WHERE ' + ' AND '.join(where) if where else ''} "
+               f"ORDER BY s.created_at {order}, s.id {order} LIMIT ?")
+        found = [_nest(row) for row in self._query(sql, params + [limit + 1])]
+        rows = found[:limit]
+        if backwards:
+            rows.reverse()
+        return rows, len(found) > limit
+
+    async def search_shipments(self, query: str, limit: int = 10):
+        """
+        search_shipments() from schema.sql without the trigram fuzzy term: AWB fragment hits
+        rank first, then substring matches on the free-text fields. Scans, which is fine at
+        single-node sizes.
+        """
+        text, awb = query.strip().lower(), _awb_key(query)
+        return self._query("""
+            SELECT * FROM (
+                SELECT s.id, s.airline, s.awb_number, s.origin, s.destination, s.shipment_status,
+                       s.payment_status, s.created_at, p.full_name AS owner,
+                       (CASE WHEN length(:awb) >= 3 AND instr(awb_key(s.awb_number), :awb) > 0 THEN 2 ELSE 0 END
+                        + CASE WHEN instr(lower(COALESCE(s.awb_number, '') || ' ' || COALESCE(s.shipper_info, '') || ' ' ||
+                                                COALESCE(s.consignee_info, '') || ' ' || COALESCE(s.notify_party, '') || ' ' ||
+                                                COALESCE(s.origin, '') || ' ' || COALESCE(s.destination, '')), :text) > 0
+                               THEN 1 ELSE 0 END) * 1.0 AS rank
+                FROM shipments s
+                LEFT JOIN profiles p ON p.telegram_id = s.created_by
+            )
+            WHERE rank > 0
+            ORDER BY rank DESC, created_at DESC
+            LIMIT :limit
+        """, {"awb": awb, "text": text, "limit": min(max(limit, 1), 50)})
+
+    async def update_shipment_status(self, shipment_id: str, status: str, payment_status: str = None):
+        update_data = {"shipment_status": status}
+        if payment_status:
+            update_data["payment_status"] = payment_status
+        return Result(self._update("shipments", update_data, "id = ?", (shipment_id,)))
+
+    async def delete_shipment(self, shipment_id: str):
+        return Result(self._query("DELETE FROM shipments WHERE id = ? RETURNING *", (shipment_id,)))
+
+    async def apply_shipment_change(self, shipment_id: str, changes: dict, messages: list, insert: bool = False):
+        """apply_shipment_change() from schema.sql: the shipment write and its outbox rows in one transaction."""
+        changes = dict(changes)
+        dims = changes.pop('dims', None)
+        attachment_ids = changes.pop('attachment_ids', None)
+        with self._transaction():
+            if insert:
+                self._insert("shipments", self._new_shipment({**changes, "id": shipment_id}))
+            elif changes:
+                self._update("shipments", changes, "id = ?", (shipment_id,))
+            if dims is not None:
+                self.conn.execute("DELETE FROM shipment_dimensions WHERE shipment_id = ?", (shipment_id,))
+                self.conn.executemany(
+                    "INSERT INTO shipment_dimensions (shipment_id, line_no, length_cm, width_cm, height_cm, pieces) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    [(shipment_id, i, d['length_cm'], d['width_cm'], d['height_cm'], d.get('pieces') or 1)
+                     for i, d in enumerate(dims)]
+                )
+            if attachment_ids is not None:
+                self._link_attachments(shipment_id, attachment_ids)
+            now = _now()
+            self.conn.executemany(
+                "INSERT INTO notification_outbox (chat_id, method, payload, shipment_id, track_message, next_attempt_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(str(m['chat_id']), m.get('method') or "send_message", json.dumps(m['payload']), shipment_id,
+                  int(bool(m.get('track_message'))), now) for m in messages or []]
+            )
+            return self._with_dims(self._one("SELECT * FROM shipments WHERE id = ?", (shipment_id,)))
+
+    # --- NOTIFICATION OUTBOX ---
+
+    async def claim_outbox(self, limit: int = 50, lease_seconds: int = 60):
+        """
+        claim_outbox() from schema.sql; a single UPDATE, so no other drainer can claim the same rows.
+        A row waits while an earlier row of its chat is due for a retry later or leased elsewhere.
+        """
+        now = _now()
+        rows = self._query("""
+            UPDATE notification_outbox SET status = 'sending', next_attempt_at = ?
+            WHERE id IN (
+                SELECT n.id FROM notification_outbox n
+                WHERE n.status IN ('pending', 'sending') AND n.next_attempt_at <= ?
+                  AND NOT EXISTS (
+                      SELECT 1 FROM notification_outbox e
+                      WHERE e.chat_id = n.chat_id AND e.id < n.id
+                        AND e.status IN ('pending', 'sending') AND e.next_attempt_at > ?
+                  )
+                ORDER BY n.id LIMIT ?
+            )
+            RETURNING *
+        """, (_now(lease_seconds), now, now, limit))
+        return sorted(rows, key=lambda row: row['id'])
+
+    async def mark_outbox_sent(self, outbox_ids: list):
+        return Result(self._update("notification_outbox", {"status": "sent", "sent_at": _now()},
+                                   f"id IN {_in(outbox_ids)}", outbox_ids))
+
+    async def mark_outbox_retry(self, outbox_id: int, attempts: int, error: str, retry_at: datetime = None):
+        return Result(self._update("notification_outbox", {
+            "status": "pending" if retry_at else "failed",
+            "attempts": attempts,
+            "last_error": error[:500],
+            "next_attempt_at": retry_at
+        }, "id = ?", (outbox_id,)))
+
+    # --- UPDATE DE-DUPLICATION ---
+
+    async def claim_update(self, update_id: int, ttl_seconds: int):
+        """claim_update() from schema.sql: an insert that only overwrites an expired claim."""
+        expired = _now(-ttl_seconds)
+        if update_id % 100 == 0:
+            self.conn.execute("DELETE FROM processed_updates WHERE seen_at < ?", (expired,))
+        return bool(self._query(
+            "INSERT INTO processed_updates (update_id, seen_at) VALUES (?, ?) "
+            "ON CONFLICT (update_id) DO UPDATE SET seen_at = excluded.seen_at "
+            "WHERE processed_updates.seen_at < ? RETURNING update_id",
+            (update_id, _now(), expired)
+        ))
+
+    # --- SYSTEM STATS & SETTINGS ---
+
+    async def _stat_counters(self):
+        """The trigger-maintained stats_counters rows (schema_sqlite.sql), as on Postgres."""
+        return [(row['key'], row['value']) for row in self._query("SELECT key, value FROM stats_counters")]
+
+    async def _load_settings(self):
+        rows = self._query("SELECT key, value FROM settings")
+        return {row['key']: float(row['value']) for row in rows if row['value'] is not None}
+
+    async def _store_setting(self, key: str, value: float):
+        return Result(self._update("settings", {"value": value}, "key = ?", (key,)))
+
+    # --- MEDIA & STORAGE ---
+
+    async def upload_file(self, file_path: str, file_path_db: str, file_content, mime_type: str, upsert: bool = False):
+        """
+        Writes the file under LOCAL_STORAGE_DIR/<bucket>/ and returns its file:// URL.
+        Chunks are written as they arrive and the file is renamed into place when complete.
+        """
+        target = self.storage_dir / Config.SUPABASE_BUCKET / file_path
+        if target.exists() and not upsert:
+            raise FileExistsError(f"{file_path} already exists in {Config.SUPABASE_BUCKET}")
+        target.parent.mkdir(parents=True, exist_ok=True)
+        partial = target.with_name(target.name + ".part")
+        with open(partial, "wb") as f:
+            if isinstance(file_content, (bytes, bytearray)):
+                f.write(file_content)
+            else:
+                async for chunk in file_content:
+                    f.write(chunk)
+        os.replace(partial, target)
+        return target.resolve().as_uri()
+
+    # --- ATTACHMENTS ---
+
+    async def get_attachment(self, sha256: str = None, file_unique_id: str = None):
+        if sha256:
+            return self._one("SELECT * FROM attachments WHERE sha256 = ? LIMIT 1", (sha256,))
+        return self._one("SELECT * FROM attachments WHERE file_unique_id = ? LIMIT 1", (file_unique_id,))
+
+    async def create_attachment(self, data: dict):
+        # The no-op DO UPDATE makes RETURNING yield the existing row on a duplicate hash
+        return self._insert("attachments", data, "ON CONFLICT (sha256) DO UPDATE SET sha256 = excluded.sha256")[0]
+
+    def _link_attachments(self, shipment_id: str, attachment_ids: list):
+        self.conn.execute("DELETE FROM shipment_attachments WHERE shipment_id = ?", (shipment_id,))
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO shipment_attachments (shipment_id, attachment_id, position) VALUES (?, ?, ?)",
+            [(shipment_id, attachment_id, i) for i, attachment_id in enumerate(attachment_ids)]
+        )
+
+    async def set_shipment_attachments(self, shipment_id: str, attachment_ids: list):
+        with self._transaction():
+            self._link_attachments(shipment_id, attachment_ids)
+        return Result([])
+
+    async def get_shipment_attachments(self, shipment_id: str):
+        return self._query("SELECT a.* FROM shipment_attachments sa JOIN attachments a ON a.id = sa.attachment_id "
+                           "WHERE sa.shipment_id = ? ORDER BY sa.position", (shipment_id,))
+
+# Every public method is timed on /metrics (aerp_db_seconds{method=...})
+instrument_methods(SQLiteDatabase, DB_SECONDS, DB_ERRORS)
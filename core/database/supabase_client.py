@@ -1,120 +1,367 @@
-from supabase import create_client, Client
+from datetime import datetime, timedelta, timezone
 from core.config import Config
+from core.database.base import DatabaseBackend
+from core.utils.metrics import instrument_methods, DB_SECONDS, DB_ERRORS
 
-class Database:
+class SupabaseDatabase(DatabaseBackend):
+    """
+    Production backend: Supabase Postgres and Storage.
+    Talks to PostgREST and Storage directly instead of through supabase.AClient, which
+    imports and builds auth, realtime and functions clients this bot never uses.
+    Both sub-clients are created on first use, so importing this module costs no I/O
+    and a webhook that never uploads a file never loads storage3.
+    """
     def __init__(self):
-        self.supabase: Client = create_client(Config.SUPABASE_URL, Config.SUPABASE_KEY)
+        super().__init__()
+        self._headers = {
+            "apiKey": Config.SUPABASE_KEY,
+            "Authorization": f"Bearer {Config.SUPABASE_KEY}",
+        }
+        self._rest = None
+        self._storage = None
+
+    @property
+    def rest(self):
+        """PostgREST client; its session is a pooled httpx.AsyncClient shared by concurrent updates."""
+        if self._rest is None:
+            from postgrest import AsyncPostgrestClient
+            self._rest = AsyncPostgrestClient(f"{Config.SUPABASE_URL}/rest/v1", headers=self._headers)
+        return self._rest
+
+    @property
+    def storage(self):
+        """Storage client, only built when a file is actually uploaded."""
+        if self._storage is None:
+            from storage3 import AsyncStorageClient
+            self._storage = AsyncStorageClient(f"{Config.SUPABASE_URL}/storage/v1", self._headers)
+        return self._storage
+
+    async def close(self):
+        """Releases the pooled HTTP connections (called on shutdown)."""
+        if self._rest is not None:
+            await self._rest.aclose()
+            self._rest = None
+        if self._storage is not None:
+            await self._storage.aclose()
+            self._storage = None
 
     # --- USER & STATE OPERATIONS ---
 
-    def get_user(self, telegram_id: int):
+    async def get_user(self, telegram_id: int):
         """Fetch user profile and their current database-stored state."""
-        res = self.supabase.table("profiles").select("*").eq("telegram_id", telegram_id).execute()
+        res = await self.rest.table("profiles").select("*").eq("telegram_id", telegram_id).execute()
         return res.data[0] if res.data else None
 
-    def create_user(self, data: dict):
+    async def create_user(self, data: dict):
         """Register a new user profile."""
-        return self.supabase.table("profiles").insert(data).execute()
+        return await self.rest.table("profiles").insert(data).execute()
 
-    def update_user_state(self, telegram_id: int, state: str = None):
+    async def update_user(self, telegram_id: int, data: dict):
+        """Update any profile column (registration details, state, ...)."""
+        return await self.rest.table("profiles").update(data).eq("telegram_id", telegram_id).execute()
+
+    async def update_user_state(self, telegram_id: int, state: str = None):
         """
         Saves the user's current step in the database.
         Ensures buttons and messages work perfectly on Vercel.
         """
-        return self.supabase.table("profiles").update({"state": state}).eq("telegram_id", telegram_id).execute()
+        return await self.rest.table("profiles").update({"state": state}).eq("telegram_id", telegram_id).execute()
 
-    def approve_user(self, telegram_id: int, role: str = 'user'):
+    async def approve_user(self, telegram_id: int, role: str = 'user'):
         """Approve a pending user and assign a role."""
-        return self.supabase.table("profiles").update({
-            "is_approved": True, 
+        return await self.rest.table("profiles").update({
+            "is_approved": True,
             "role": role,
             "state": None
         }).eq("telegram_id", telegram_id).execute()
 
-    def get_all_users(self):
+    async def get_all_users(self):
         """Fetch every registered user for Admin Management."""
-        res = self.supabase.table("profiles").select("*").order("created_at", desc=True).execute()
+        res = await self.rest.table("profiles").select("*").order("created_at", desc=True).execute()
         return res.data
 
-    def get_pending_users(self):
-        """List all users waiting for access approval."""
-        res = self.supabase.table("profiles").select("*").eq("is_approved", False).execute()
+    async def get_pending_users(self, limit: int = None, after: tuple = None, until: tuple = None):
+        """
+        List users waiting for access approval, oldest first.
+        after/until are (created_at, telegram_id) keyset bounds: rows strictly after `after`
+        and up to and including `until`, so a rendered page can be re-read exactly.
+        """
+        q = self.rest.table("profiles").select("*").eq("is_approved", False)
+        bounds = []
+        if after:
+            ts, tid = after
+            bounds.append(f'or(created_at.gt."{ts}",and(created_at.eq."{ts}",telegram_id.gt.{tid}))')
+        if until:
+            ts, tid = until
+            bounds.append(f'or(created_at.lt."{ts}",and(created_at.eq."{ts}",telegram_id.lte.{tid}))')
+        if bounds:
+            q = q.or_(f"and({','.join(bounds)})")
+        q = q.order("created_at").order("telegram_id")
+        if limit:
+            q = q.limit(limit)
+        res = await q.execute()
         return res.data
 
-    def delete_user(self, telegram_id: int):
+    async def approve_users(self, telegram_ids: list, role: str = 'user'):
+        """Set-based approval: one UPDATE ... WHERE telegram_id IN (...)."""
+        return await self.rest.table("profiles").update({
+            "is_approved": True,
+            "role": role,
+            "state": None
+        }).in_("telegram_id", telegram_ids).execute()
+
+    async def delete_user(self, telegram_id: int):
         """Remove a user from the system."""
-        return self.supabase.table("profiles").delete().eq("telegram_id", telegram_id).execute()
+        return await self.rest.table("profiles").delete().eq("telegram_id", telegram_id).execute()
 
-    def get_broadcast_list(self):
+    async def delete_users(self, telegram_ids: list):
+        """Set-based removal: one DELETE ... WHERE telegram_id IN (...)."""
+        return await self.rest.table("profiles").delete().in_("telegram_id", telegram_ids).execute()
+
+    async def get_broadcast_list(self):
         """Get all approved user IDs for announcements."""
-        res = self.supabase.table("profiles").select("telegram_id").eq("is_approved", True).execute()
+        res = await self.rest.table("profiles").select("telegram_id").eq("is_approved", True).execute()
         return [item['telegram_id'] for item in res.data]
 
+    async def get_broadcast_batch(self, after_id: int = 0, limit: int = 50):
+        """Next slice of approved user IDs in telegram_id order (the broadcast cursor)."""
+        res = await self.rest.table("profiles").select("telegram_id").eq("is_approved", True) \
+            .gt("telegram_id", after_id).order("telegram_id").limit(limit).execute()
+        return [item['telegram_id'] for item in res.data]
+
+    async def count_broadcast_targets(self):
+        """Number of approved users, without fetching them."""
+        res = await self.rest.table("profiles").select("telegram_id", count="exact").eq("is_approved", True).limit(1).execute()
+        return res.count
+
+    # --- BROADCAST JOBS ---
+
+    async def create_broadcast_job(self, data: dict):
+        """Persist a new broadcast job and return the stored row."""
+        res = await self.rest.table("broadcast_jobs").insert(data).execute()
+        return res.data[0]
+
+    async def get_broadcast_job(self, job_id: int):
+        res = await self.rest.table("broadcast_jobs").select("*").eq("id", job_id).execute()
+        return res.data[0] if res.data else None
+
+    async def get_active_broadcast_jobs(self):
+        """Jobs that still have recipients left, oldest first."""
+        res = await self.rest.table("broadcast_jobs").select("*").in_("status", ["pending", "running"]).order("id").execute()
+        return res.data
+
+    async def claim_broadcast_job(self, job_id: int, lease_seconds: float):
+        """
+        Takes a time-limited lease on a job so only one invocation delivers it at a time.
+        Returns the job row, or None if another worker holds an unexpired lease.
+        """
+        now = datetime.now(timezone.utc)
+        res = await self.rest.table("broadcast_jobs").update({
+            "status": "running",
+            "lease_until": (now + timedelta(seconds=lease_seconds)).isoformat()
+        }).eq("id", job_id).in_("status", ["pending", "running"]) \
+            .or_(f'lease_until.is.null,lease_until.lt."{now.isoformat()}"').execute()
+        return res.data[0] if res.data else None
+
+    async def update_broadcast_job(self, job_id: int, data: dict):
+        return await self.rest.table("broadcast_jobs").update(data).eq("id", job_id).execute()
+
     # --- SHIPMENT OPERATIONS ---
 
-    def create_shipment(self, data: dict):
+    async def create_shipment(self, data: dict):
         """Create a new shipment record."""
-        return self.supabase.table("shipments").insert(data).execute()
+        return await self.rest.table("shipments").insert(data).execute()
 
-    def update_shipment(self, shipment_id: str, data: dict):
+    async def create_shipments(self, rows: list):
+        """
+        Bulk insert (import_shipments RPC): every row and its 'dims' lines in one request and
+        one transaction, so a failed batch leaves nothing half-imported.
+        """
+        if not rows:
+            return 0
+        res = await self.rest.rpc("import_shipments", {"p_rows": rows}).execute()
+        return res.data
+
+    async def update_shipment(self, shipment_id: str, data: dict):
         """Update any shipment variable."""
-        return self.supabase.table("shipments").update(data).eq("id", shipment_id).execute()
+        return await self.rest.table("shipments").update(data).eq("id", shipment_id).execute()
 
-    def get_shipment(self, shipment_id: str):
-        """Fetch a specific shipment by UUID."""
-        res = self.supabase.table("shipments").select("*").eq("id", shipment_id).execute()
-        return res.data[0] if res.data else None
+    async def get_shipment(self, shipment_id: str):
+        """Fetch a specific shipment by UUID, with its dimension lines embedded as 'dims'."""
+        res = await self.rest.table("shipments") \
+            .select("*, shipment_dimensions(length_cm, width_cm, height_cm, pieces)").eq("id", shipment_id) \
+            .order("line_no", foreign_table="shipment_dimensions").execute()
+        if not res.data:
+            return None
+        row = res.data[0]
+        row['dims'] = row.pop('shipment_dimensions')
+        return row
 
-    def get_user_shipments(self, telegram_id: int):
+    async def get_user_shipments(self, telegram_id: int):
         """Fetch all shipments created by a specific user."""
-        res = self.supabase.table("shipments").select("*").eq("created_by", telegram_id).order("created_at", desc=True).execute()
+        res = await self.rest.table("shipments").select("*").eq("created_by", telegram_id).order("created_at", desc=True).execute()
         return res.data
 
-    def get_all_shipments(self):
+    async def get_all_shipments(self):
         """Fetch all shipments in the system for the Staff Panel."""
-        res = self.supabase.table("shipments").select("*, profiles(full_name)").order("created_at", desc=True).execute()
+        res = await self.rest.table("shipments").select("*, profiles(full_name)").order("created_at", desc=True).execute()
         return res.data
 
-    def update_shipment_status(self, shipment_id: str, status: str, payment_status: str = None):
+    async def get_shipments_page(self, limit: int = 10, cursor: tuple = None, backwards: bool = False,
+                                 shipment_status: str = None, payment_status: str = None,
+                                 created_by: int = None, columns: str = "*",
+                                 created_from: str = None, created_to: str = None):
+        """
+        Keyset pagination over shipments, newest first, ordered by (created_at, id).
+        cursor is the (created_at, id) of the row to page from; backwards=True walks towards newer rows.
+        Returns (rows, has_more) where has_more says another page exists in the walking direction.
+        created_from / created_to restrict created_at to [from, to).
+        """
+        q = self.rest.table("shipments").select(columns)
+        if shipment_status:
+            q = q.eq("shipment_status", shipment_status)
+        if payment_status:
+            q = q.eq("payment_status", payment_status)
+        if created_by:
+            q = q.eq("created_by", created_by)
+        if created_from:
+            q = q.gte("created_at", str(created_from))
+        if created_to:
+            q = q.lt("created_at", str(created_to))
+        if cursor:
+            ts, sid = cursor
+            op = "gt" if backwards else "lt"
+            q = q.or_(f'created_at.{op}."{ts}",and(created_at.eq."{ts}",id.{op}.{sid})')
+        desc = not backwards
+        res = await q.order("created_at", desc=desc).order("id", desc=desc).limit(limit + 1).execute()
+        rows = res.data[:limit]
+        if backwards:
+            rows.reverse()
+        return rows, len(res.data) > limit
+
+    async def search_shipments(self, query: str, limit: int = 10):
+        """
+        Ranked shipment search for staff (search_shipments RPC, trigram-indexed).
+        Matches AWB fragments regardless of separators, plus shipper, consignee, notify party and route.
+        """
+        res = await self.rest.rpc("search_shipments", {"p_query": query, "p_limit": limit}).execute()
+        return res.data
+
+    async def update_shipment_status(self, shipment_id: str, status: str, payment_status: str = None):
         """Transitions shipment through the lifecycle."""
         update_data = {"shipment_status": status}
         if payment_status:
             update_data["payment_status"] = payment_status
-        return self.supabase.table("shipments").update(update_data).eq("id", shipment_id).execute()
+        return await self.rest.table("shipments").update(update_data).eq("id", shipment_id).execute()
 
-    def delete_shipment(self, shipment_id: str):
+    async def delete_shipment(self, shipment_id: str):
         """Remove a shipment record."""
-        return self.supabase.table("shipments").delete().eq("id", shipment_id).execute()
+        return await self.rest.table("shipments").delete().eq("id", shipment_id).execute()
+
+    async def apply_shipment_change(self, shipment_id: str, changes: dict, messages: list, insert: bool = False):
+        """
+        Writes a shipment change and queues its notifications in one transaction
+        (apply_shipment_change RPC). A 'dims' list in changes replaces the shipment's
+        dimension lines and an 'attachment_ids' list its attachment links.
+        Returns the resulting shipment row, dims included.
+        """
+        res = await self.rest.rpc("apply_shipment_change", {
+            "p_shipment_id": shipment_id,
+            "p_changes": changes,
+            "p_messages": messages,
+            "p_insert": insert
+        }).execute()
+        return res.data
+
+    # --- NOTIFICATION OUTBOX ---
+
+    async def claim_outbox(self, limit: int = 50, lease_seconds: int = 60):
+        """Claims due outbox rows (FOR UPDATE SKIP LOCKED) for this drainer."""
+        res = await self.rest.rpc("claim_outbox", {"p_limit": limit, "p_lease_seconds": lease_seconds}).execute()
+        return res.data
+
+    async def mark_outbox_sent(self, outbox_ids: list):
+        return await self.rest.table("notification_outbox").update({
+            "status": "sent",
+            "sent_at": datetime.now(timezone.utc).isoformat()
+        }).in_("id", outbox_ids).execute()
+
+    async def mark_outbox_retry(self, outbox_id: int, attempts: int, error: str, retry_at: datetime = None):
+        """Schedules another attempt, or marks the row failed for good when retry_at is None."""
+        return await self.rest.table("notification_outbox").update({
+            "status": "pending" if retry_at else "failed",
+            "attempts": attempts,
+            "last_error": error[:500],
+            "next_attempt_at": retry_at.isoformat() if retry_at else None
+        }).eq("id", outbox_id).execute()
+
+    # --- UPDATE DE-DUPLICATION ---
+
+    async def claim_update(self, update_id: int, ttl_seconds: int):
+        """Claims an update_id (claim_update RPC); False when it was already processed within the TTL."""
+        res = await self.rest.rpc("claim_update", {"p_update_id": update_id, "p_ttl_seconds": int(ttl_seconds)}).execute()
+        return bool(res.data)
 
     # --- SYSTEM STATS & SETTINGS ---
 
-    def get_db_stats(self):
-        """Aggregate counts for the Admin Dashboard."""
-        users_count = self.supabase.table("profiles").select("telegram_id", count="exact").execute()
-        shipments_count = self.supabase.table("shipments").select("id", count="exact").execute()
-        return {
-            "users": users_count.count,
-            "shipments": shipments_count.count
-        }
+    async def _stat_counters(self):
+        """Reads the trigger-maintained stats_counters rows in one query instead of counting the tables."""
+        res = await self.rest.table("stats_counters").select("key, value").execute()
+        return [(row['key'], row['value']) for row in res.data]
 
-    def get_setting(self, key: str):
-        """Fetch global settings like exchange_rate."""
-        res = self.supabase.table("settings").select("value").eq("key", key).execute()
-        return float(res.data[0]['value']) if res.data else 1.0
+    async def _load_settings(self):
+        res = await self.rest.table("settings").select("key, value").execute()
+        return {row['key']: float(row['value']) for row in res.data if row['value'] is not None}
 
-    def update_setting(self, key: str, value: float):
-        """Update global settings."""
-        return self.supabase.table("settings").update({"value": value}).eq("key", key).execute()
+    async def _store_setting(self, key: str, value: float):
+        return await self.rest.table("settings").update({"value": value}).eq("key", key).execute()
 
     # --- MEDIA & STORAGE ---
 
-    async def upload_file(self, file_path: str, file_path_db: str, file_content: bytes, mime_type: str):
-        """Uploads files to Supabase Storage and returns the public link."""
-        self.supabase.storage.from_(Config.SUPABASE_BUCKET).upload(
-            path=file_path,
-            file=file_content,
-            file_options={"content-type": mime_type}
+    async def upload_file(self, file_path: str, file_path_db: str, file_content, mime_type: str, upsert: bool = False):
+        """
+        Uploads files to Supabase Storage and returns the public link.
+        file_content may be bytes or an async iterator of chunks; chunks are sent as a raw
+        streamed body (no multipart envelope), so the file is never held in memory whole.
+        """
+        bucket = self.storage.from_(Config.SUPABASE_BUCKET)
+        res = await self.storage.session.post(
+            f"/object/{Config.SUPABASE_BUCKET}/{file_path}",
+            content=file_content,
+            headers={"content-type": mime_type, "cache-control": "max-age=3600", "x-upsert": "true" if upsert else "false"}
         )
-        return self.supabase.storage.from_(Config.SUPABASE_BUCKET).get_public_url(file_path)
+        res.raise_for_status()
+        return await bucket.get_public_url(file_path)
+
+    # --- ATTACHMENTS ---
+
+    async def get_attachment(self, sha256: str = None, file_unique_id: str = None):
+        """Looks up stored content by hash, or by the Telegram file it was first received as."""
+        q = self.rest.table("attachments").select("*")
+        q = q.eq("sha256", sha256) if sha256 else q.eq("file_unique_id", file_unique_id)
+        res = await q.limit(1).execute()
+        return res.data[0] if res.data else None
+
+    async def create_attachment(self, data: dict):
+        """
+        Records stored content. A concurrent insert of the same hash leaves the first row as it
+        is (ON CONFLICT DO NOTHING returns no row) and that row is read back instead.
+        """
+        res = await self.rest.table("attachments").upsert(data, on_conflict="sha256", ignore_duplicates=True).execute()
+        return res.data[0] if res.data else await self.get_attachment(sha256=data['sha256'])
+
+    async def set_shipment_attachments(self, shipment_id: str, attachment_ids: list):
+        """Replaces the shipment's attachment list, keeping the given order."""
+        return await self.rest.rpc("set_shipment_attachments", {
+            "p_shipment_id": shipment_id,
+            "p_attachment_ids": attachment_ids
+        }).execute()
+
+    async def get_shipment_attachments(self, shipment_id: str):
+        """Attachment rows of one shipment in submission order (served by the link table's primary key)."""
+        res = await self.rest.table("shipment_attachments").select("position, attachments(*)") \
+            .eq("shipment_id", shipment_id).order("position").execute()
+        return [row['attachments'] for row in res.data]
 
-db = Database()
\ No newline at end of file
+# Every public method is timed on /metrics (aerp_db_seconds{method=...})
+instrument_methods(SupabaseDatabase, DB_SECONDS, DB_ERRORS)
@@ -0,0 +1,112 @@
+from core.database import db
+
+class UnitOfWork:
+    """
+    Request-scoped identity map over the shared Database.
+    One instance lives on the PTB context for the lifetime of a single update, so
+    repeated get_user/get_shipment lookups are answered from memory and local writes
+    are applied to the cached rows instead of forcing a re-read.
+    """
+    def __init__(self, database=db):
+        self.db = database
+        self._users = {}
+        self._shipments = {}
+
+    def __getattr__(self, name):
+        # Anything not cached here (lists, stats, settings, storage) goes straight through.
+        return getattr(self.db, name)
+
+    def _patch(self, cache: dict, key, data: dict):
+        row = cache.get(key)
+        if row is not None:
+            row.update(data)
+
+    # --- PROFILES ---
+
+    async def get_user(self, telegram_id: int):
+        """Returns the profile, hitting the database at most once per update."""
+        if telegram_id not in self._users:
+            self._users[telegram_id] = await self.db.get_user(telegram_id)
+        return self._users[telegram_id]
+
+    async def create_user(self, data: dict):
+        res = await self.db.create_user(data)
+        self._users[data['telegram_id']] = res.data[0] if res.data else dict(data)
+        return res
+
+    async def update_user(self, telegram_id: int, data: dict):
+        res = await self.db.update_user(telegram_id, data)
+        self._patch(self._users, telegram_id, data)
+        return res
+
+    async def update_user_state(self, telegram_id: int, state: str = None):
+        res = await self.db.update_user_state(telegram_id, state)
+        self._patch(self._users, telegram_id, {"state": state})
+        return res
+
+    async def approve_user(self, telegram_id: int, role: str = 'user'):
+        res = await self.db.approve_user(telegram_id, role)
+        self._patch(self._users, telegram_id, {"is_approved": True, "role": role, "state": None})
+        return res
+
+    async def delete_user(self, telegram_id: int):
+        res = await self.db.delete_user(telegram_id)
+        self._users[telegram_id] = None
+        return res
+
+    async def approve_users(self, telegram_ids: list, role: str = 'user'):
+        res = await self.db.approve_users(telegram_ids, role)
+        for tid in telegram_ids:
+            self._patch(self._users, tid, {"is_approved": True, "role": role, "state": None})
+        return res
+
+    async def delete_users(self, telegram_ids: list):
+        res = await self.db.delete_users(telegram_ids)
+        for tid in telegram_ids:
+            self._users[tid] = None
+        return res
+
+    # --- SHIPMENTS ---
+
+    async def get_shipment(self, shipment_id: str):
+        """Returns the shipment, hitting the database at most once per update."""
+        if shipment_id not in self._shipments:
+            self._shipments[shipment_id] = await self.db.get_shipment(shipment_id)
+        return self._shipments[shipment_id]
+
+    async def create_shipment(self, data: dict):
+        res = await self.db.create_shipment(data)
+        if res.data:
+            self._shipments[res.data[0]['id']] = res.data[0]
+        return res
+
+    async def update_shipment(self, shipment_id: str, data: dict):
+        res = await self.db.update_shipment(shipment_id, data)
+        self._patch(self._shipments, shipment_id, data)
+        return res
+
+    async def update_shipment_status(self, shipment_id: str, status: str, payment_status: str = None):
+        res = await self.db.update_shipment_status(shipment_id, status, payment_status)
+        update_data = {"shipment_status": status}
+        if payment_status:
+            update_data["payment_status"] = payment_status
+        self._patch(self._shipments, shipment_id, update_data)
+        return res
+
+    async def apply_shipment_change(self, shipment_id: str, changes: dict, messages: list, insert: bool = False):
+        row = await self.db.apply_shipment_change(shipment_id, changes, messages, insert)
+        self._shipments[shipment_id] = row
+        return row
+
+    async def delete_shipment(self, shipment_id: str):
+        res = await self.db.delete_shipment(shipment_id)
+        self._shipments[shipment_id] = None
+        return res
+
+def get_uow(context) -> UnitOfWork:
+    """Returns the UnitOfWork bound to this update's context, creating it on first use."""
+    uow = getattr(context, "uow", None)
+    if uow is None:
+        uow = UnitOfWork()
+        context.uow = uow
+    return uow
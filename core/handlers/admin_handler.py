@@ -1,7 +1,8 @@
 import asyncio
+from datetime import datetime, timezone
 from telegram import Update, constants
 from telegram.ext import ContextTypes
-from core.database.supabase_client import db
+from core.database.unit_of_work import get_uow
 from core.utils.keyboards import (
     get_admin_settings_menu, 
     get_user_approval_keyboard,
@@ -9,8 +10,23 @@ from core.utils.keyboards import (
     get_back_to_main,
     get_main_dashboard,
     get_staff_shipment_manage_keyboard,
-    get_user_shipment_actions
+    get_user_shipment_actions,
+    get_staff_queue_keyboard,
+    get_pending_users_keyboard,
+    get_search_results_keyboard
 )
+from core.utils.pagination import (
+    SHIPMENT_STATUSES, PAYMENT_STATUSES,
+    encode_cursor, decode_cursor,
+    encode_user_cursor, decode_user_cursor, decode_mask,
+    encode_filter, decode_filter, next_filter_value
+)
+from core.handlers.shipment_handler import generate_summary
+from core.services.broadcast import start_broadcast, run_broadcast, notify_users
+from core.services.outbox import outbox_message
+from core.services.bulk_import import import_shipments, ImportRejected
+from core.services.export import export_shipments, parse_export_filter, EXPORT_FILTER_HELP
+from core.utils.bot import FileTooLarge
 from core.config import Config
 
 async def open_admin_settings(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -18,15 +34,16 @@ async def open_admin_settings(update: Update, context: ContextTypes.DEFAULT_TYPE
     THE MASTER ADMIN ENTRY POINT.
     Supports both Dashboard (text) and Inline (callback) triggers.
     """
+    uow = get_uow(context)
     query = update.callback_query
     user_id = update.effective_user.id
-    user = db.get_user(user_id)
+    user = await uow.get_user(user_id)
     
     # Permission check for Admin/Staff only
     if not user or user['role'] not in ['admin', 'staff']:
         return
 
-    rate = db.get_setting('exchange_rate')
+    rate = await uow.get_setting('exchange_rate')
     text = (
         f"👑 Admin Control Panel\n\n"
         f"Current Global Exchange Rate: {rate} ETB\n"
@@ -45,22 +62,25 @@ async def handle_admin_msg(update: Update, context: ContextTypes.DEFAULT_TYPE):
     Master Admin Message Router for text inputs.
     Handles Exchange Rate, Announcements, and Rejection Reasons.
     """
+    uow = get_uow(context)
     if not update.message or not update.message.text:
         return
     
     user_id = update.effective_user.id
     text = update.message.text
-    user = db.get_user(user_id)
+    user = await uow.get_user(user_id)
     
     if not user or user['role'] not in ['admin', 'staff']:
         return
 
     # --- STATE HANDLING: EXCHANGE RATE ---
-    if user.get('state') == "SET_EXCHANGE":
+    step = context.route
+
+    if step.key == "SET_EXCHANGE":
         try:
             new_rate = float(text)
-            db.update_setting('exchange_rate', new_rate)
-            db.update_user_state(user_id, None)
+            await uow.update_setting('exchange_rate', new_rate)
+            await uow.update_user_state(user_id, None)
             await update.message.reply_text(
                 f"✅ Exchange Rate updated to: {new_rate} ETB", 
                 reply_markup=get_main_dashboard(user['role'])
@@ -70,64 +90,64 @@ async def handle_admin_msg(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     # --- STATE HANDLING: BROADCAST (ANNOUNCEMENTS) ---
-    if user.get('state') == "ADM_BROADCAST":
-        db.update_user_state(user_id, None)
-        target_ids = db.get_broadcast_list()
-        count = 0
-        
-        await update.message.reply_text(f"📢 Starting broadcast to {len(target_ids)} users...")
-        
-        for tid in target_ids:
-            try:
-                await context.bot.send_message(
-                    chat_id=tid, 
-                    text=f"📢 ANNOUNCEMENT\n\n{text}"
-                )
-                count += 1
-                await asyncio.sleep(0.05) # Prevent Telegram flood limits
-            except:
-                continue
-                
+    if step.key == "ADM_BROADCAST":
+        await uow.update_user_state(user_id, None)
+        job = await start_broadcast(context.bot, user_id, update.effective_chat.id, text)
         await update.message.reply_text(
-            f"✅ Broadcast complete. Successfully sent to {count} users.", 
+            f"✅ Broadcast #{job['id']} queued. Progress is shown above and delivery resumes automatically.",
             reply_markup=get_main_dashboard(user['role'])
         )
+        # Deliver as much as this invocation's time budget allows; the rest is resumed later
+        await run_broadcast(context.bot, job['id'], Config.BROADCAST_TIME_BUDGET)
+        return
+
+    # --- STATE HANDLING: SHIPMENT SEARCH ---
+    if step.key == "ADM_SEARCH":
+        await uow.update_user_state(user_id, None)
+        await show_search_results(update, context, text)
+        return
+
+    # --- STATE HANDLING: CSV EXPORT FILTERS ---
+    if step.key == "ADM_EXPORT":
+        if user['role'] != 'admin':
+            return
+        await send_export(update, context, text)
         return
 
     # --- STATE HANDLING: REJECTION REASONS ---
-    if user.get('state') and user['state'].startswith("REJECT_"):
+    if step.key == "REJECT_":
         await process_admin_rejection(update, context, user, text)
         return
 
 async def process_admin_rejection(update: Update, context: ContextTypes.DEFAULT_TYPE, user: dict, text: str):
     """Helper to process rejection text based on stored state."""
-    state_parts = user['state'].split("_") # REJECT_TYPE_ID
-    reject_type = state_parts[1]
-    shipment_id = state_parts[2]
-    shipment = db.get_shipment(shipment_id)
+    uow = get_uow(context)
+    # REJECT_{RATE|PAYMENT}_{id}
+    reject_type, shipment_id = context.route.field, context.route.ship_id
+    shipment = await uow.get_shipment(shipment_id)
     
     if not shipment:
         await update.message.reply_text("❌ Error: Shipment not found.")
-        db.update_user_state(user['telegram_id'], None)
+        await uow.update_user_state(user['telegram_id'], None)
         return
 
     if reject_type == "RATE":
         title = "❌ Shipment Rate Rejected"
         new_status = "quotation_created"
-        db.update_shipment_status(shipment_id, new_status)
+        changes = {"shipment_status": new_status}
     else:
         title = "❌ Payment Proof Rejected"
         new_status = "rate_approved"
-        db.update_shipment_status(shipment_id, new_status, "unpaid")
+        changes = {"shipment_status": new_status, "payment_status": "unpaid"}
 
-    # Notify User with the appropriate Re-submit/Edit buttons
-    await context.bot.send_message(
-        chat_id=shipment['created_by'], 
-        text=f"{title}\nAWB: {shipment['awb_number']}\n\nComment from Staff:\n{text}\n\nPlease fix the issue and resubmit.",
-        reply_markup=get_user_shipment_actions(shipment_id, new_status)
-    )
+    # Status change and the user's Re-submit/Edit notification are committed together
+    await uow.apply_shipment_change(shipment_id, changes, [outbox_message(
+        shipment['created_by'],
+        f"{title}\nAWB: {shipment['awb_number']}\n\nComment from Staff:\n{text}\n\nPlease fix the issue and resubmit.",
+        get_user_shipment_actions(shipment_id, new_status)
+    )])
     
-    db.update_user_state(user['telegram_id'], None)
+    await uow.update_user_state(user['telegram_id'], None)
     await update.message.reply_text(
         "✅ Comment has been sent to the user.", 
         reply_markup=get_main_dashboard(user['role'])
@@ -135,139 +155,451 @@ async def process_admin_rejection(update: Update, context: ContextTypes.DEFAULT_
 
 # --- STAFF PANEL (GLOBAL QUEUE) ---
 
+STAFF_QUEUE_PAGE_SIZE = 10
+STAFF_QUEUE_COLUMNS = "id, airline, awb_number, shipment_status, payment_status, created_at, profiles(full_name)"
+
 async def open_staff_panel(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Lists recent shipments for manual lifecycle management."""
+    """Opens the first page of the shipment queue for manual lifecycle management."""
+    uow = get_uow(context)
     query = update.callback_query
-    user_id = update.effective_user.id
-    user = db.get_user(user_id)
-    
+    user = await uow.get_user(update.effective_user.id)
     if query: await query.answer()
-    
-    shipments = db.get_all_shipments()
-    if not shipments:
-        msg = "No shipments found in the system database."
-        if query: await query.edit_message_text(msg, reply_markup=get_back_to_main())
-        else: await update.message.reply_text(msg, reply_markup=get_back_to_main())
+
+    if not user or user['role'] not in ['admin', 'staff']:
         return
+    await show_staff_queue(update, context, "--")
 
-    await (query.message.reply_text if query else update.message.reply_text)(
-        "🛠 STAFF MANAGEMENT QUEUE\n(Showing last 10 shipments)"
+async def show_staff_queue(update: Update, context: ContextTypes.DEFAULT_TYPE, filter_code: str, direction: str = None, cursor: str = None):
+    """Renders exactly one keyset page of the queue into a single message (edited in place on clicks)."""
+    uow = get_uow(context)
+    query = update.callback_query
+    user = await uow.get_user(update.effective_user.id)
+    if not user or user['role'] not in ['admin', 'staff']:
+        return
+    shipment_status, payment_status = decode_filter(filter_code)
+    backwards = direction == "p"
+
+    shipments, has_more = await uow.get_shipments_page(
+        limit=STAFF_QUEUE_PAGE_SIZE,
+        cursor=decode_cursor(cursor) if cursor else None,
+        backwards=backwards,
+        shipment_status=shipment_status,
+        payment_status=payment_status,
+        columns=STAFF_QUEUE_COLUMNS
     )
-    
-    for s in shipments[:10]:
-        status = s['shipment_status'].replace('_', ' ').title()
-        owner = s.get('profiles', {}).get('full_name', 'Unknown User')
-        text = (
-            f"✈️ {s['airline']} | AWB: {s['awb_number']}\n"
-            f"👤 User: {owner}\n"
-            f"📝 Status: {status}\n"
-            f"💰 Payment: {s['payment_status'].upper()}"
+
+    status_label = shipment_status.replace('_', ' ').title() if shipment_status else "All Statuses"
+    payment_label = payment_status.upper() if payment_status else "All Payments"
+
+    if not shipments:
+        text = f"🛠 STAFF MANAGEMENT QUEUE\nFilter: {status_label} · {payment_label}\n\nNo shipments found."
+        prev_cursor = next_cursor = None
+    else:
+        lines = []
+        for i, s in enumerate(shipments, 1):
+            owner = (s.get('profiles') or {}).get('full_name', 'Unknown User')
+            lines.append(
+                f"{i}. ✈️ {s['airline']} | AWB: {s['awb_number']}\n"
+                f"    👤 {owner} · 📝 {s['shipment_status'].replace('_', ' ').title()} · 💰 {s['payment_status'].upper()}"
+            )
+        text = f"🛠 STAFF MANAGEMENT QUEUE\nFilter: {status_label} · {payment_label}\n\n" + "\n".join(lines)
+        # Forward walks always have a newer page behind them once a cursor is set; backward walks always have an older one.
+        has_prev = has_more if backwards else cursor is not None
+        has_next = True if backwards else has_more
+        prev_cursor = encode_cursor(shipments[0]) if has_prev else None
+        next_cursor = encode_cursor(shipments[-1]) if has_next else None
+
+    markup = get_staff_queue_keyboard(shipments, filter_code, status_label, payment_label, prev_cursor, next_cursor)
+    if query:
+        await query.edit_message_text(text, reply_markup=markup)
+    else:
+        await update.message.reply_text(text, reply_markup=markup)
+
+# --- SHIPMENT SEARCH ---
+
+SEARCH_PAGE_SIZE = 10
+SEARCH_MIN_LENGTH = 3
+SEARCH_PROMPT = (
+    "🔎 SHIPMENT SEARCH\n\n"
+    "Type an AWB (or part of one), a shipper/consignee/notify name, or a city:"
+)
+
+async def search_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/search <AWB fragment or text>: staff shortcut; without arguments it asks for the query."""
+    uow = get_uow(context)
+    user = await uow.get_user(update.effective_user.id)
+    if not user or user['role'] not in ['admin', 'staff']:
+        return
+    if context.args:
+        await show_search_results(update, context, " ".join(context.args))
+    else:
+        await uow.update_user_state(user['telegram_id'], "ADM_SEARCH")
+        await update.message.reply_text(SEARCH_PROMPT, reply_markup=get_back_to_main())
+
+async def show_search_results(update: Update, context: ContextTypes.DEFAULT_TYPE, text: str):
+    """Replies with one ranked page of matches; a single hit opens straight into its management view."""
+    uow = get_uow(context)
+    text = text.strip()
+    if len(text) < SEARCH_MIN_LENGTH:
+        await update.message.reply_text(
+            f"⚠️ Please enter at least {SEARCH_MIN_LENGTH} characters.",
+            reply_markup=get_search_results_keyboard([])
+        )
+        return
+
+    shipments = await uow.search_shipments(text, SEARCH_PAGE_SIZE)
+    if len(shipments) == 1:
+        ship_id = shipments[0]['id']
+        summary = await generate_summary(await uow.get_shipment(ship_id))
+        await update.message.reply_text(
+            f"🛠 SHIPMENT {ship_id}\n\n{summary}",
+            reply_markup=get_staff_shipment_manage_keyboard(ship_id)
         )
-        await (query.message.reply_text if query else update.message.reply_text)(
-            text, reply_markup=get_staff_shipment_manage_keyboard(s['id'])
+        return
+
+    if not shipments:
+        body = "No shipments found."
+    else:
+        body = "\n".join(
+            f"{i}. ✈️ {s['airline']} | AWB: {s['awb_number']}\n"
+            f"    👤 {s['owner'] or 'Unknown User'} · 📍 {s['origin'] or '-'} → {s['destination'] or '-'} · "
+            f"📝 {s['shipment_status'].replace('_', ' ').title()}"
+            for i, s in enumerate(shipments, 1)
+        )
+    await update.message.reply_text(
+        f"🔎 SEARCH: {text}\n\n{body}",
+        reply_markup=get_search_results_keyboard(shipments)
+    )
+
+# --- BULK IMPORT ---
+
+# Rejected rows listed in the import summary; the rest are counted (Telegram messages cap at 4096 chars)
+IMPORT_ERROR_LINES = 20
+IMPORT_PROMPT = (
+    "📥 BULK SHIPMENT IMPORT\n\n"
+    "Send a CSV or TSV file as a document. The first row is the header:\n"
+    "airline, origin, destination, awb, pieces, gross_weight, dims, approved_rate, sale_rate\n"
+    "Optional: shipper, consignee, notify, shipment_status, payment_status.\n\n"
+    "dims uses the wizard format, e.g. 120x80x100x2; 60x40x30x10. Separate length, width and "
+    "height columns also work. Chargeable weight is computed. Shipments are filed under your account."
+)
+
+async def handle_bulk_import(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """ADM_IMPORT: imports an uploaded CSV/TSV document and replies with a single summary."""
+    uow = get_uow(context)
+    user = await uow.get_user(update.effective_user.id)
+    if not user or user['role'] not in ['admin', 'staff']:
+        return
+
+    document = update.message.document
+    if not document:
+        await update.message.reply_text(IMPORT_PROMPT, reply_markup=get_back_to_main())
+        return
+
+    limit_text = f"❌ File too large. Maximum size is {Config.MAX_IMPORT_BYTES // (1024 * 1024)} MB."
+    if (document.file_size or 0) > Config.MAX_IMPORT_BYTES:
+        await update.message.reply_text(limit_text)
+        return
+
+    await context.bot.send_chat_action(update.effective_chat.id, constants.ChatAction.TYPING)
+    try:
+        report = await import_shipments(uow, document, user['telegram_id'])
+    except FileTooLarge:
+        await update.message.reply_text(limit_text)
+        return
+    except ImportRejected as e:
+        await update.message.reply_text(f"❌ {e}\n\n{IMPORT_PROMPT}", reply_markup=get_back_to_main())
+        return
+
+    await uow.update_user_state(user['telegram_id'], None)
+    lines = [f"Row {line}: {reason}"[:120] for line, reason in report.errors[:IMPORT_ERROR_LINES]]
+    if len(report.errors) > IMPORT_ERROR_LINES:
+        lines.append(f"... and {len(report.errors) - IMPORT_ERROR_LINES} more")
+    text = (
+        f"📥 IMPORT FINISHED: {document.file_name or 'file'}\n\n"
+        f"✅ Imported: {report.imported}\n"
+        f"⚠️ Rejected: {len(report.errors)}"
+    )
+    if lines:
+        text += "\n\n" + "\n".join(lines)
+    await update.message.reply_text(text, reply_markup=get_main_dashboard(user['role']))
+
+# --- CSV EXPORT ---
+
+EXPORT_PROMPT = f"📤 SHIPMENT EXPORT (CSV)\n\nType the filters, separated by spaces:\n{EXPORT_FILTER_HELP}"
+
+async def export_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/export [filters]: admin shortcut; without arguments it asks for the filters."""
+    uow = get_uow(context)
+    user = await uow.get_user(update.effective_user.id)
+    if not user or user['role'] != 'admin':
+        return
+    if context.args:
+        await send_export(update, context, " ".join(context.args))
+    else:
+        await uow.update_user_state(user['telegram_id'], "ADM_EXPORT")
+        await update.message.reply_text(EXPORT_PROMPT, reply_markup=get_back_to_main())
+
+async def send_export(update: Update, context: ContextTypes.DEFAULT_TYPE, text: str):
+    """Streams the matching shipments into a CSV file and sends it back as a document."""
+    uow = get_uow(context)
+    user_id = update.effective_user.id
+    try:
+        export_filter = parse_export_filter(text)
+    except ValueError as e:
+        await update.message.reply_text(f"⚠️ {e}\n\n{EXPORT_PROMPT}", reply_markup=get_back_to_main())
+        return
+
+    await uow.update_user_state(user_id, None)
+    await context.bot.send_chat_action(update.effective_chat.id, constants.ChatAction.UPLOAD_DOCUMENT)
+    spool, count = await export_shipments(uow, export_filter)
+    with spool:
+        if not count:
+            await update.message.reply_text(
+                f"📤 No shipments match: {export_filter.describe()}", reply_markup=get_main_dashboard('admin')
+            )
+            return
+        # PTB reads the whole file before uploading anyway, and cannot take a spooled file
+        # object directly (it derives a filename from .name, which is None until it spills)
+        await update.message.reply_document(
+            document=spool.read(),
+            filename=f"shipments-{datetime.now(timezone.utc):%Y%m%d-%H%M}.csv",
+            caption=f"📤 {count} shipments · {export_filter.describe()}",
+            reply_markup=get_main_dashboard('admin')
         )
 
+# --- PENDING APPROVALS QUEUE ---
+
+PENDING_PAGE_SIZE = 10
+
+async def show_pending_queue(update: Update, context: ContextTypes.DEFAULT_TYPE, after: str, mask: int = 0, notice: str = ""):
+    """Renders one page of get_pending_users into the callback message, with selection state in the buttons."""
+    uow = get_uow(context)
+    query = update.callback_query
+    user = await uow.get_user(update.effective_user.id)
+    if not user or user['role'] not in ['admin', 'staff']:
+        return
+    rows = await uow.get_pending_users(
+        limit=PENDING_PAGE_SIZE + 1,
+        after=decode_user_cursor(after) if after != "-" else None
+    )
+    has_more = len(rows) > PENDING_PAGE_SIZE
+    users = rows[:PENDING_PAGE_SIZE]
+
+    header = "👥 PENDING APPROVALS"
+    if notice:
+        header += f"\n{notice}"
+    if not users:
+        text = f"{header}\n\nNo users are waiting for approval."
+        until = "-"
+    else:
+        lines = []
+        for i, u in enumerate(users):
+            mark = "☑️" if mask & (1 << i) else "⬜"
+            lines.append(
+                f"{mark} {i + 1}. {u['full_name']}\n"
+                f"    🏢 {u['company_name']} · @{u.get('username') or 'NoUsername'} · ID {u['telegram_id']}"
+            )
+        text = f"{header}\n\n" + "\n".join(lines)
+        until = encode_user_cursor(users[-1])
+
+    await query.edit_message_text(text, reply_markup=get_pending_users_keyboard(users, after, until, mask, has_more))
+
 # --- CALLBACK HANDLERS (ADMIN / STAFF ACTIONS) ---
 
 async def handle_admin_callbacks(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Master Callback Router for all Admin and Staff inline buttons."""
+    uow = get_uow(context)
     query = update.callback_query
-    data = query.data
+    route = context.route
+    key, ship_id, args = route.key, route.ship_id, route.args
     user_id = update.effective_user.id
-    user = db.get_user(user_id)
+    user = await uow.get_user(user_id)
     await query.answer()
 
-    parts = data.split("_")
-    ship_id = parts[-1]
-
     # 1. SYSTEM SETTINGS & STATS
-    if data == "adm_stats":
-        stats = db.get_db_stats()
+    if key == "adm_stats":
+        stats = await uow.get_db_stats()
+        status_lines = "\n".join(
+            f"  {name.replace('_', ' ').title()}: {count}" for name, count in stats['shipment_status'].items() if count
+        )
+        payment_lines = "\n".join(
+            f"  {name.upper()}: {count}" for name, count in stats['payment_status'].items() if count
+        )
         text = (
             f"📊 SYSTEM STATISTICS\n\n"
             f"Total Registered Users: {stats['users']}\n"
-            f"Total Shipment Records: {stats['shipments']}"
+            f"Pending Approvals: {stats['pending_users']}\n"
+            f"Total Shipment Records: {stats['shipments']}\n\n"
+            f"📦 By Shipment Status:\n{status_lines or '  -'}\n\n"
+            f"💳 By Payment Status:\n{payment_lines or '  -'}\n\n"
+            f"💰 Total Value: ${stats['total_usd']} ({stats['total_etb']} ETB)"
         )
         await query.edit_message_text(text, reply_markup=get_back_to_main())
 
-    elif data == "adm_users":
-        users = db.get_all_users()
-        await query.edit_message_text("👥 USER MANAGEMENT LIST (Last 15):")
-        for u in users[:15]:
-            status = "Approved" if u['is_approved'] else "Pending"
-            user_text = (
-                f"👤 {u['full_name']}\n"
-                f"Company: {u['company_name']}\n"
-                f"Role: {u['role'].upper()}\n"
-                f"Status: {status}"
-            )
-            await query.message.reply_text(
-                user_text, 
-                reply_markup=get_user_approval_keyboard(u['telegram_id'])
+    elif key == "adm_users":
+        await show_pending_queue(update, context, "-")
+
+    # PENDING APPROVALS: PAGING, SELECTION AND BULK ACTIONS
+    elif key == "adm_pl_":
+        # adm_pl_{after}
+        await show_pending_queue(update, context, args[0])
+
+    elif key == "adm_ps_":
+        # adm_ps_{after}_{until}_{mask}
+        await show_pending_queue(update, context, args[0], decode_mask(args[2]))
+
+    elif key == "adm_pa_":
+        # adm_pa_{u|s}_{after}_{until}: approve every still-pending user shown on the page
+        if not user or user['role'] not in ['admin', 'staff']:
+            return
+        role = "staff" if args[0] == "s" else "user"
+        after, until = args[1], args[2]
+        rows = await uow.get_pending_users(
+            after=decode_user_cursor(after) if after != "-" else None,
+            until=decode_user_cursor(until)
+        )
+        ids = [u['telegram_id'] for u in rows]
+        notice = "Nothing left to approve on this page."
+        if ids:
+            await uow.approve_users(ids, role)
+            delivered = await notify_users(
+                context.bot, ids,
+                f"🎉 Account Approved!\nYou have been granted {role.upper()} access.",
+                get_main_dashboard(role)
             )
+            notice = f"✅ Approved {len(ids)} users as {role.upper()} ({delivered} notified)."
+        await show_pending_queue(update, context, after, notice=notice)
+
+    elif key == "adm_pb_":
+        # adm_pb_{after}_{until}_{mask}_{rows shown}: block the selected rows
+        if not user or user['role'] not in ['admin', 'staff']:
+            return
+        after, until, mask, shown = args[0], args[1], decode_mask(args[2]), int(args[3])
+        rows = await uow.get_pending_users(
+            after=decode_user_cursor(after) if after != "-" else None,
+            until=decode_user_cursor(until)
+        )
+        if len(rows) != shown:
+            # Someone else acted on this page meanwhile; the row indexes no longer line up.
+            notice = "⚠️ The queue changed. Please re-select."
+        else:
+            ids = [u['telegram_id'] for i, u in enumerate(rows) if mask & (1 << i)]
+            if ids:
+                await uow.delete_users(ids)
+            notice = f"🚫 Blocked and removed {len(ids)} users."
+        await show_pending_queue(update, context, after, notice=notice)
 
-    elif data == "adm_broadcast":
-        db.update_user_state(user_id, "ADM_BROADCAST")
+    elif key == "adm_broadcast":
+        await uow.update_user_state(user_id, "ADM_BROADCAST")
         await query.edit_message_text(
             "📢 ANNOUNCEMENT MODE\n\n"
             "Type the message you want to broadcast to all approved users below:", 
             reply_markup=get_back_to_main()
         )
 
-    elif data == "set_ex_rate":
-        db.update_user_state(user_id, "SET_EXCHANGE")
+    elif key == "adm_bc_":
+        if not user or user['role'] not in ['admin', 'staff']:
+            return
+        job = await run_broadcast(context.bot, int(args[0]), Config.BROADCAST_TIME_BUDGET)
+        if job is None:
+            await query.message.reply_text("ℹ️ This broadcast is already being delivered or has finished.")
+
+    elif key == "adm_search":
+        if not user or user['role'] not in ['admin', 'staff']:
+            return
+        await uow.update_user_state(user_id, "ADM_SEARCH")
+        await query.edit_message_text(SEARCH_PROMPT, reply_markup=get_back_to_main())
+
+    elif key == "adm_import":
+        if not user or user['role'] not in ['admin', 'staff']:
+            return
+        await uow.update_user_state(user_id, "ADM_IMPORT")
+        await query.edit_message_text(IMPORT_PROMPT, reply_markup=get_back_to_main())
+
+    elif key == "adm_export":
+        if not user or user['role'] != 'admin':
+            return
+        await uow.update_user_state(user_id, "ADM_EXPORT")
+        await query.edit_message_text(EXPORT_PROMPT, reply_markup=get_back_to_main())
+
+    elif key == "set_ex_rate":
+        await uow.update_user_state(user_id, "SET_EXCHANGE")
         await query.edit_message_text(
             "📈 Enter the new USD to ETB Exchange Rate:", 
             reply_markup=get_back_to_main()
         )
 
+    # STAFF QUEUE: PAGING, FILTERS AND DETAIL
+    elif key == "adm_q_":
+        # adm_q_{filter}_{n|p}_{cursor}
+        await show_staff_queue(update, context, *args)
+
+    elif key == "adm_qf_":
+        # adm_qf_{s|p}{filter}: cycle one filter and restart from the newest page
+        shipment_status, payment_status = decode_filter(args[0])
+        if route.field == "s":
+            shipment_status = next_filter_value(SHIPMENT_STATUSES, shipment_status)
+        else:
+            payment_status = next_filter_value(PAYMENT_STATUSES, payment_status)
+        await show_staff_queue(update, context, encode_filter(shipment_status, payment_status))
+
+    elif key == "adm_qv_":
+        if not user or user['role'] not in ['admin', 'staff']:
+            return
+        shipment = await uow.get_shipment(ship_id)
+        if not shipment:
+            await query.message.reply_text("❌ Error: Shipment not found.")
+            return
+        summary = await generate_summary(shipment)
+        await query.message.reply_text(
+            f"🛠 SHIPMENT {ship_id}\n\n{summary}",
+            reply_markup=get_staff_shipment_manage_keyboard(ship_id)
+        )
+
     # 2. PHASE 1 & 2 APPROVALS / REJECTIONS
-    elif data.startswith("rate_apprv_"):
-        shipment = db.get_shipment(ship_id)
-        db.update_shipment_status(ship_id, "rate_approved")
+    elif key == "rate_apprv_":
+        shipment = await uow.get_shipment(ship_id)
+        await uow.apply_shipment_change(ship_id, {"shipment_status": "rate_approved"}, [outbox_message(
+            shipment['created_by'],
+            f"✅ Rate Approved for AWB: {shipment['awb_number']}.\n"
+            f"You can now upload your payment proof receipt.",
+            get_upload_proof_button(ship_id)
+        )])
         await query.edit_message_text(f"{query.message.text}\n\n✅ RATE APPROVED")
-        await context.bot.send_message(
-            chat_id=shipment['created_by'], 
-            text=f"✅ Rate Approved for AWB: {shipment['awb_number']}.\n"
-                 f"You can now upload your payment proof receipt.", 
-            reply_markup=get_upload_proof_button(ship_id)
-        )
 
-    elif data.startswith("rate_rejct_"):
-        db.update_user_state(user_id, f"REJECT_RATE_{ship_id}")
+    elif key == "rate_rejct_":
+        await uow.update_user_state(user_id, f"REJECT_RATE_{ship_id}")
         await query.message.reply_text("📝 Please type the reason for Rate Rejection:")
 
-    elif data.startswith("pay_apprv_"):
-        shipment = db.get_shipment(ship_id)
-        db.update_shipment(ship_id, {"payment_status": "paid", "shipment_status": "booked"})
+    elif key == "pay_apprv_":
+        shipment = await uow.get_shipment(ship_id)
+        await uow.apply_shipment_change(ship_id, {"payment_status": "paid", "shipment_status": "booked"}, [outbox_message(
+            shipment['created_by'],
+            f"💰 Payment Verified for AWB: {shipment['awb_number']}.\n"
+            f"Shipment is now officially Booked."
+        )])
         await query.edit_message_text(f"{query.message.caption if query.message.caption else query.message.text}\n\n✅ PAYMENT VERIFIED")
-        await context.bot.send_message(
-            chat_id=shipment['created_by'], 
-            text=f"💰 Payment Verified for AWB: {shipment['awb_number']}.\n"
-                 f"Shipment is now officially Booked."
-        )
 
-    elif data.startswith("pay_rejct_"):
-        db.update_user_state(user_id, f"REJECT_PAYMENT_{ship_id}")
+    elif key == "pay_rejct_":
+        await uow.update_user_state(user_id, f"REJECT_PAYMENT_{ship_id}")
         await query.message.reply_text("📝 Please type the reason for Payment Rejection:")
 
     # 3. STAFF LIFECYCLE MANAGEMENT
-    elif data.startswith("st_upd_"):
-        new_status = parts[2]
-        db.update_shipment_status(ship_id, new_status)
+    elif key == "st_upd_":
+        new_status = route.field
+        shipment = await uow.get_shipment(ship_id)
+        await uow.apply_shipment_change(ship_id, {"shipment_status": new_status}, [outbox_message(
+            shipment['created_by'],
+            f"📦 STATUS UPDATE\nAWB: {shipment['awb_number']} is now {new_status.upper()}."
+        )])
         await query.edit_message_text(f"{query.message.text}\n\n✅ Lifecycle status updated to {new_status.upper()}")
-        
-        shipment = db.get_shipment(ship_id)
-        await context.bot.send_message(
-            chat_id=shipment['created_by'], 
-            text=f"📦 STATUS UPDATE\nAWB: {shipment['awb_number']} is now {new_status.upper()}."
-        )
 
     # 4. USER ACCESS MANAGEMENT (Multi-Admin / Multi-Staff Support)
-    elif data.startswith("usr_apprv_"):
-        tid = int(parts[2])
-        role = parts[3] # admin, staff, or user
-        db.approve_user(tid, role)
+    elif key == "usr_apprv_":
+        tid = int(args[0])
+        role = args[1] # admin, staff, or user
+        await uow.approve_user(tid, role)
         await query.edit_message_text(f"✅ Approved User ID {tid} as {role.upper()}")
         await context.bot.send_message(
             tid, 
@@ -276,11 +608,11 @@ async def handle_admin_callbacks(update: Update, context: ContextTypes.DEFAULT_T
             reply_markup=get_main_dashboard(role)
         )
 
-    elif data.startswith("usr_block_"):
-        tid = int(parts[2])
-        db.delete_user(tid)
+    elif key == "usr_block_":
+        tid = int(args[0])
+        await uow.delete_user(tid)
         await query.edit_message_text(f"🚫 User ID {tid} has been blocked and removed.")
 
     # 5. NAVIGATION RE-ENTRY
-    elif data == "admin_settings":
+    elif key == "admin_settings":
         await open_admin_settings(update, context)
\ No newline at end of file
@@ -1,6 +1,6 @@
 from telegram import Update, constants
 from telegram.ext import ContextTypes, ConversationHandler
-from core.database.supabase_client import db
+from core.database import db
 from core.utils.validators import validate_dims
 from core.utils.calculations import calculate_metrics
 from core.utils.keyboards import get_edit_menu, get_confirmation_keyboard, get_airline_keyboard
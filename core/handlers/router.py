@@ -0,0 +1,135 @@
+import functools
+from telegram import Update
+from telegram.ext import CommandHandler, MessageHandler, CallbackQueryHandler, TypeHandler, filters, ContextTypes
+from core.database.unit_of_work import get_uow
+from core.handlers import start_handler, shipment_handler, admin_handler
+from core.services.dedup import drop_duplicate_updates
+from core.utils.routes import parse_state, parse_callback
+from core.utils.metrics import timed, ROUTE_HITS, HANDLER_SECONDS, HANDLER_ERRORS
+
+async def dispatch(handler, update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Runs one handler under its latency histogram (aerp_handler_seconds on /metrics)."""
+    async with timed(HANDLER_SECONDS, HANDLER_ERRORS, handler=handler.__name__):
+        await handler(update, context)
+
+def timed_handler(handler):
+    """PTB callback wrapper for handlers registered outside the routers (commands)."""
+    @functools.wraps(handler)
+    async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        await dispatch(handler, update, context)
+    return wrapper
+
+async def back_to_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Clears the stored step and shows the dashboard again."""
+    await get_uow(context).update_user_state(update.effective_user.id, None)
+    await start_handler.start(update, context)
+
+# Dashboard buttons override whatever step the user is in
+DASHBOARD_ROUTES = {
+    "📦 New Shipment": shipment_handler.start_new_shipment,
+    "🔍 Track My Shipments": shipment_handler.track_shipments,
+    "👤 My Profile": shipment_handler.view_profile,
+    "🛠 Staff Panel": admin_handler.open_staff_panel,
+    "👑 Admin Settings": admin_handler.open_admin_settings,
+    "🏠 Back to Menu": back_to_menu,
+}
+
+# Route key (see core.utils.routes) -> handler for text/media sent while in that state
+STATE_ROUTES = {
+    "REG_NAME": start_handler.handle_registration_name,
+    "REG_COMPANY": start_handler.handle_registration_company,
+    "SHIP_AIRLINE": shipment_handler.handle_shipment_text_input,
+    **{key: shipment_handler.handle_shipment_text_input for key in (
+        "SHIP_AIRLINE_", "SHIP_ORIGIN_", "SHIP_DEST_", "SHIP_AWB_", "SHIP_PIECES_", "SHIP_GROSS_",
+        "SHIP_CHARGEABLE_", "SHIP_DIMS_", "SHIP_RATES_", "SHIP_SHIPPER_", "SHIP_CONSIGNEE_",
+        "SHIP_NOTIFY_", "SHIP_CONFIRM_", "EDIT_INPUT_"
+    )},
+    "UPLOAD_": shipment_handler.handle_phase2_upload,
+    "SET_EXCHANGE": admin_handler.handle_admin_msg,
+    "ADM_BROADCAST": admin_handler.handle_admin_msg,
+    "ADM_SEARCH": admin_handler.handle_admin_msg,
+    "ADM_EXPORT": admin_handler.handle_admin_msg,
+    "ADM_IMPORT": admin_handler.handle_bulk_import,
+    "REJECT_": admin_handler.handle_admin_msg,
+}
+
+# Route key -> handler for inline buttons
+CALLBACK_ROUTES = {
+    **{key: shipment_handler.handle_shipment_callbacks for key in (
+        "confirm_shipment", "open_edit_menu", "edit_field_", "back_to_summary",
+        "edit_hist_", "back_step", "cancel_wizard"
+    )},
+    **{key: admin_handler.handle_admin_callbacks for key in (
+        "rate_apprv_", "rate_rejct_", "pay_apprv_", "pay_rejct_", "st_upd_",
+        "usr_apprv_", "usr_block_", "adm_stats", "adm_users", "adm_broadcast", "adm_search", "adm_import", "adm_export",
+        "adm_pl_", "adm_ps_", "adm_pa_", "adm_pb_", "adm_bc_", "adm_q_", "adm_qf_", "adm_qv_",
+        "set_ex_rate", "admin_settings"
+    )},
+    "start_upload_": shipment_handler.start_proof_upload,
+    "trk_v_": shipment_handler.handle_tracking_callbacks,
+    "trk_f": shipment_handler.handle_tracking_callbacks,
+    "trk_": shipment_handler.handle_tracking_callbacks,
+    "new_shipment": shipment_handler.start_new_shipment,
+    "track_shipment": shipment_handler.track_shipments,
+    "view_profile": shipment_handler.view_profile,
+    "staff_panel": admin_handler.open_staff_panel,
+    "back_to_main": back_to_menu,
+}
+
+async def master_message_router(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    Routes all text/media inputs.
+    Priority: unregistered users, then dashboard buttons, then the step stored in Supabase.
+    The parsed state is left on context.route for the handler.
+    """
+    if not update.message:
+        return
+    uow = get_uow(context)
+    text = update.message.text or ""
+    user = await uow.get_user(update.effective_user.id)
+
+    # 1. Unregistered users: /start or the first registration answer
+    if not user:
+        handler = start_handler.start if text == "/start" else start_handler.handle_registration_name
+        ROUTE_HITS.inc(route="unregistered")
+        await dispatch(handler, update, context)
+        return
+
+    # 2. Dashboard overrides
+    handler = DASHBOARD_ROUTES.get(text)
+    if handler:
+        # Dashboard buttons count under their label
+        ROUTE_HITS.inc(route=text)
+        await dispatch(handler, update, context)
+        return
+
+    # 3. State-based routing
+    route = parse_state(user.get('state'))
+    handler = STATE_ROUTES.get(route.key) if route else None
+    if handler:
+        ROUTE_HITS.inc(route=route.key)
+        context.route = route
+        await dispatch(handler, update, context)
+
+async def master_callback_router(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Routes all inline button clicks; the parsed callback_data is left on context.route."""
+    query = update.callback_query
+    route = parse_callback(query.data)
+    handler = CALLBACK_ROUTES.get(route.key) if route else None
+    if not handler:
+        ROUTE_HITS.inc(route="unknown_callback")
+        await query.answer()
+        return
+    ROUTE_HITS.inc(route=route.key)
+    context.route = route
+    await dispatch(handler, update, context)
+
+def register_handlers(application):
+    """Installs the routers on a PTB Application (shared by the webhook and polling entry points)."""
+    # Group -1 runs first: Telegram's redeliveries of an update already taken are dropped here
+    application.add_handler(TypeHandler(Update, drop_duplicate_updates), group=-1)
+    application.add_handler(CommandHandler("start", timed_handler(start_handler.start)))
+    application.add_handler(CommandHandler("search", timed_handler(admin_handler.search_command)))
+    application.add_handler(CommandHandler("export", timed_handler(admin_handler.export_command)))
+    application.add_handler(MessageHandler(filters.ALL & ~filters.COMMAND, master_message_router))
+    application.add_handler(CallbackQueryHandler(master_callback_router))
@@ -1,31 +1,55 @@
 import uuid
-from telegram import Update, constants
+from telegram import Update
 from telegram.ext import ContextTypes
-from core.database.supabase_client import db
-from core.utils.calculations import calculate_metrics
-from core.utils.validators import is_float, validate_dims
+from core.database.unit_of_work import get_uow
+from core.utils.calculations import dims_metrics
+from core.utils.validators import parse_dim_lines
 from core.config import Config
 from core.utils.keyboards import (
-    get_airline_keyboard, get_confirmation_keyboard, 
-    get_edit_menu, get_shipment_approval_keyboard,
-    get_payment_decision_keyboard, get_cancel_back,
-    get_upload_proof_button, get_back_to_main,
+    get_confirmation_keyboard, get_edit_menu,
+    get_shipment_approval_keyboard, get_payment_decision_keyboard,
+    get_cancel_back, get_back_to_main,
     get_main_dashboard, get_user_shipment_actions,
-    get_simple_cancel
+    get_simple_cancel, get_tracking_keyboard
 )
+from core.services.outbox import outbox_message, outbox_media_group
+from core.services.attachments import store_attachment
+from core.utils.bot import FileTooLarge
+from core.utils.routes import parse_state
+from core.utils.pagination import (
+    SHIPMENT_STATUSES, encode_cursor, decode_cursor,
+    encode_filter, decode_filter, next_filter_value
+)
+
+# Dimension lines listed in a summary; the rest are counted (Telegram messages cap at 4096 chars)
+SUMMARY_DIM_LINES = 10
+
+def format_dims(s):
+    """The summary's dimension block: one row per line, or the legacy single LxWxH columns."""
+    lines = s.get('dims')
+    if not lines:
+        return f" {float(s.get('length_cm') or 0)} x {float(s.get('width_cm') or 0)} x {float(s.get('height_cm') or 0)} cm"
+    rows = [
+        f"\n   {float(d['length_cm'])} x {float(d['width_cm'])} x {float(d['height_cm'])} cm x {d['pieces']}"
+        for d in lines[:SUMMARY_DIM_LINES]
+    ]
+    if len(lines) > SUMMARY_DIM_LINES:
+        rows.append(f"\n   ... and {len(lines) - SUMMARY_DIM_LINES} more lines")
+    return "".join(rows)
 
 async def generate_summary(s, stage="review"):
     """Calculates metrics and formats summary with zero bolding."""
-    l = float(s.get('length_cm', 0))
-    w = float(s.get('width_cm', 0))
-    h = float(s.get('height_cm', 0))
-    pcs = int(s.get('pieces', 0))
-    gross = float(s.get('gross_weight', 0))
-    chargeable = float(s.get('chargeable_weight', 0))
-    sale = float(s.get('sale_rate_usd', 0))
-    ex = float(s.get('exchange_rate_etb', 1))
-
-    # Calculate totals based on manual chargeable weight
+    pcs = int(s.get('pieces') or 0)
+    gross = float(s.get('gross_weight') or 0)
+    sale = float(s.get('sale_rate_usd') or 0)
+    ex = float(s.get('exchange_rate_etb') or 1)
+
+    # Volumetric/chargeable come from the dimension lines; a manual chargeable override is kept
+    lines = s.get('dims')
+    metrics = dims_metrics(lines, gross) if lines else {}
+    volumetric = float(s.get('volumetric_weight') or metrics.get('vol_weight', 0))
+    chargeable = float(s.get('chargeable_weight') or metrics.get('chargeable_weight', 0))
+
     total_usd = round(chargeable * sale, 2)
     total_etb = round(total_usd * ex, 2)
     
@@ -46,8 +70,9 @@ async def generate_summary(s, stage="review"):
         f"🔢 AWB: {s.get('awb_number', 'N/A')}\n"
         f"📦 Pieces: {pcs} Pcs\n"
         f"⚖️ Normal Weight: {gross}kg\n"
+        f"⚖️ Volumetric Weight: {volumetric}kg\n"
         f"⚖️ Chargeable Weight: {chargeable}kg\n"
-        f"📏 Dims: {l} x {w} x {h} cm\n"
+        f"📏 Dims:{format_dims(s)}\n"
         f"💵 Sale Rate: ${sale}\n"
         f"💰 Total: ${total_usd} ({total_etb} ETB)\n"
         f"━━━━━━━━━━━━━━━\n"
@@ -62,7 +87,8 @@ async def generate_summary(s, stage="review"):
 # --- PROFILE & TRACKING ---
 
 async def view_profile(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    user = db.get_user(update.effective_user.id)
+    uow = get_uow(context)
+    user = await uow.get_user(update.effective_user.id)
     text = (
         f"👤 USER PROFILE\n\n"
         f"Name: {user['full_name']}\n"
@@ -76,34 +102,82 @@ async def view_profile(update: Update, context: ContextTypes.DEFAULT_TYPE):
     else:
         await update.message.reply_text(text, reply_markup=get_back_to_main())
 
+TRACK_PAGE_SIZE = 8
+TRACK_COLUMNS = "id, airline, awb_number, shipment_status, payment_status, created_at"
+
 async def track_shipments(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    user_id = update.effective_user.id
-    shipments = db.get_user_shipments(user_id)
     if update.callback_query: await update.callback_query.answer()
+    await show_tracking_page(update, context, "-")
+
+async def show_tracking_page(update: Update, context: ContextTypes.DEFAULT_TYPE, status_code: str, direction: str = None, cursor: str = None):
+    """One message per customer, edited in place: a keyset page of their shipments plus filter/paging buttons."""
+    uow = get_uow(context)
+    user_id = update.effective_user.id
+    shipment_status = decode_filter(status_code + "-")[0]
+    backwards = direction == "p"
+
+    shipments, has_more = await uow.get_shipments_page(
+        limit=TRACK_PAGE_SIZE,
+        cursor=decode_cursor(cursor) if cursor else None,
+        backwards=backwards,
+        shipment_status=shipment_status,
+        created_by=user_id,
+        columns=TRACK_COLUMNS
+    )
 
+    status_label = shipment_status.replace('_', ' ').title() if shipment_status else "All Statuses"
     if not shipments:
-        msg = "You have no shipments yet."
-        if update.callback_query: await update.callback_query.edit_message_text(msg, reply_markup=get_back_to_main())
-        else: await update.message.reply_text(msg, reply_markup=get_back_to_main())
-        return
+        text = "You have no shipments yet." if not shipment_status else f"No shipments with status: {status_label}."
+        prev_cursor = next_cursor = None
+    else:
+        lines = [
+            f"{i}. ✈️ {s['airline']} | AWB: {s['awb_number']}\n"
+            f"    Status: {s['shipment_status'].replace('_', ' ').title()} · Payment: {s['payment_status'].upper()}"
+            for i, s in enumerate(shipments, 1)
+        ]
+        text = f"🔍 YOUR SHIPMENTS ({status_label})\nSelect one to Edit or View:\n\n" + "\n".join(lines)
+        has_prev = has_more if backwards else cursor is not None
+        has_next = True if backwards else has_more
+        prev_cursor = encode_cursor(shipments[0]) if has_prev else None
+        next_cursor = encode_cursor(shipments[-1]) if has_next else None
+
+    markup = get_tracking_keyboard(shipments, status_code, status_label, prev_cursor, next_cursor)
+    if update.callback_query:
+        await update.callback_query.edit_message_text(text, reply_markup=markup)
+    else:
+        await update.message.reply_text(text, reply_markup=markup)
 
-    msg_target = update.callback_query.message if update.callback_query else update.message
-    await msg_target.reply_text("🔍 YOUR SHIPMENTS (Select to Edit or View):")
+async def handle_tracking_callbacks(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """trk_{status}_{n|p}_{cursor} pages, trk_f{status} cycles the filter, trk_v_{id} opens one shipment."""
+    uow = get_uow(context)
+    query = update.callback_query
+    route = context.route
+    await query.answer()
 
-    for s in shipments:
-        status_clean = s['shipment_status'].replace('_', ' ').title()
-        text = (
-            f"✈️ {s['airline']} | AWB: {s['awb_number']}\n"
-            f"Payment: {s['payment_status'].upper()}\n"
-            f"Status: {status_clean}"
-        )
-        await msg_target.reply_text(text, reply_markup=get_user_shipment_actions(s['id'], s['shipment_status']))
+    if route.key == "trk_v_":
+        ship_id = route.ship_id
+        shipment = await uow.get_shipment(ship_id)
+        if not shipment or shipment['created_by'] != update.effective_user.id:
+            await query.message.reply_text("❌ Error: Shipment not found.")
+            return
+        summary = await generate_summary(shipment)
+        await query.message.reply_text(summary, reply_markup=get_user_shipment_actions(ship_id, shipment['shipment_status']))
+
+    elif route.key == "trk_f":
+        current = decode_filter(route.args[0] + "-")[0]
+        status = next_filter_value(SHIPMENT_STATUSES, current)
+        await show_tracking_page(update, context, encode_filter(status)[0])
+
+    else:
+        status_code, direction, cursor = route.args
+        await show_tracking_page(update, context, status_code, direction, cursor)
 
 # --- SHIPMENT WIZARD & EDIT ENGINE (DB-STATE DRIVEN) ---
 
 async def start_new_shipment(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    uow = get_uow(context)
     user_id = update.effective_user.id
-    db.update_user_state(user_id, "SHIP_AIRLINE")
+    await uow.update_user_state(user_id, "SHIP_AIRLINE")
     text = "✈️ New Shipment\nEnter the Airline Name:"
     if update.callback_query:
         await update.callback_query.answer()
@@ -111,136 +185,171 @@ async def start_new_shipment(update: Update, context: ContextTypes.DEFAULT_TYPE)
     else:
         await update.message.reply_text(text, reply_markup=get_simple_cancel())
 
-async def handle_shipment_text_input(update: Update, context: ContextTypes.DEFAULT_TYPE, user, text):
-    user_id = user['telegram_id']
-    state = user['state']
+def get_draft(user, ship_id):
+    """Returns the buffered wizard draft for ship_id, or None once the shipment row exists."""
+    draft = user.get('draft')
+    if draft and draft.get('id') == ship_id:
+        return draft
+    return None
+
+async def save_step(uow, user, ship_id, next_state, fields):
+    """
+    Persists one wizard/edit step.
+    Drafts cost a single profiles write (state + draft together); shipments that
+    already exist (history edits) are written through to their row.
+    """
+    draft = get_draft(user, ship_id)
+    if draft is None:
+        # The RPC also replaces shipment_dimensions when fields carries 'dims'
+        await uow.apply_shipment_change(ship_id, fields, [])
+        await uow.update_user_state(user['telegram_id'], next_state)
+    else:
+        draft.update(fields)
+        await uow.update_user(user['telegram_id'], {"state": next_state, "draft": draft})
+
+DIMS_PROMPT = "📏 Enter Dimensions in cm, one size per line: L x W x H x Pcs\n(e.g., 120x80x100x2\n60x40x30x10)"
+
+def dims_fields(lines, shipment):
+    """Shipment columns for new dimension lines: the lines themselves plus the computed weights."""
+    metrics = dims_metrics(lines, float(shipment.get('gross_weight') or 0))
+    return {
+        "dims": lines,
+        "pieces": metrics['pieces'],
+        "volumetric_weight": metrics['vol_weight'],
+        "chargeable_weight": metrics['chargeable_weight'],
+    }
+
+async def load_shipment(uow, user, ship_id):
+    """Draft-aware shipment read used by the summary screens."""
+    return get_draft(user, ship_id) or await uow.get_shipment(ship_id)
+
+async def handle_shipment_text_input(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Wizard and edit-mode text steps; context.route is the parsed SHIP_*/EDIT_INPUT_* state."""
+    uow = get_uow(context)
+    user_id = update.effective_user.id
+    user = await uow.get_user(user_id)
+    text = update.message.text or ""
+    step, ship_id = context.route.key, context.route.ship_id
     
-    # 1. Airline Name
-    if state == "SHIP_AIRLINE":
+    # 1. Airline Name (opens the draft; nothing is inserted into shipments yet)
+    if step == "SHIP_AIRLINE":
         ship_id = str(uuid.uuid4())
-        db.create_shipment({"id": ship_id, "created_by": user_id, "airline": text, "shipment_status": "quotation_created", "payment_status": "unpaid"})
-        db.update_user_state(user_id, f"SHIP_ORIGIN_{ship_id}")
+        draft = {"id": ship_id, "created_by": user_id, "airline": text, "shipment_status": "quotation_created", "payment_status": "unpaid"}
+        await uow.update_user(user_id, {"state": f"SHIP_ORIGIN_{ship_id}", "draft": draft})
+        await update.message.reply_text("📍 Enter Origin City:", reply_markup=get_cancel_back())
+
+    # 1b. Airline re-entered after "Back"
+    elif step == "SHIP_AIRLINE_":
+        await save_step(uow, user, ship_id, f"SHIP_ORIGIN_{ship_id}", {"airline": text})
         await update.message.reply_text("📍 Enter Origin City:", reply_markup=get_cancel_back())
 
     # 2. Origin
-    elif state.startswith("SHIP_ORIGIN_"):
-        ship_id = state.split("_")[-1]
-        db.update_shipment(ship_id, {"origin": text})
-        db.update_user_state(user_id, f"SHIP_DEST_{ship_id}")
+    elif step == "SHIP_ORIGIN_":
+        await save_step(uow, user, ship_id, f"SHIP_DEST_{ship_id}", {"origin": text})
         await update.message.reply_text("🏁 Enter Destination City:", reply_markup=get_cancel_back())
 
     # 3. Destination
-    elif state.startswith("SHIP_DEST_"):
-        ship_id = state.split("_")[-1]
-        db.update_shipment(ship_id, {"destination": text})
-        db.update_user_state(user_id, f"SHIP_AWB_{ship_id}")
+    elif step == "SHIP_DEST_":
+        await save_step(uow, user, ship_id, f"SHIP_AWB_{ship_id}", {"destination": text})
         await update.message.reply_text("🔢 Enter AWB Number:", reply_markup=get_cancel_back())
 
     # 4. AWB
-    elif state.startswith("SHIP_AWB_"):
-        ship_id = state.split("_")[-1]
-        db.update_shipment(ship_id, {"awb_number": text})
-        db.update_user_state(user_id, f"SHIP_PIECES_{ship_id}")
+    elif step == "SHIP_AWB_":
+        await save_step(uow, user, ship_id, f"SHIP_PIECES_{ship_id}", {"awb_number": text})
         await update.message.reply_text("🔢 Enter Total Pieces:", reply_markup=get_cancel_back())
 
     # 5. Pieces
-    elif state.startswith("SHIP_PIECES_"):
-        ship_id = state.split("_")[-1]
+    elif step == "SHIP_PIECES_":
         if text.isdigit():
-            db.update_shipment(ship_id, {"pieces": int(text)})
-            db.update_user_state(user_id, f"SHIP_GROSS_{ship_id}")
+            await save_step(uow, user, ship_id, f"SHIP_GROSS_{ship_id}", {"pieces": int(text)})
             await update.message.reply_text("⚖️ Enter Normal Weight (kg):", reply_markup=get_cancel_back())
         else: await update.message.reply_text("⚠️ Enter a valid number:")
 
     # 6. Normal Weight (Gross)
-    elif state.startswith("SHIP_GROSS_"):
-        ship_id = state.split("_")[-1]
+    elif step == "SHIP_GROSS_":
         try:
             val = float(text)
-            db.update_shipment(ship_id, {"gross_weight": val})
-            db.update_user_state(user_id, f"SHIP_CHARGEABLE_{ship_id}")
-            await update.message.reply_text("⚖️ Enter Chargeable Weight (kg):", reply_markup=get_cancel_back())
+            await save_step(uow, user, ship_id, f"SHIP_DIMS_{ship_id}", {"gross_weight": val})
+            await update.message.reply_text(DIMS_PROMPT, reply_markup=get_cancel_back())
         except: await update.message.reply_text("⚠️ Enter a valid number:")
 
-    # 7. Chargeable Weight
-    elif state.startswith("SHIP_CHARGEABLE_"):
-        ship_id = state.split("_")[-1]
+    # 7. Chargeable Weight (no longer asked: computed from the dims; kept for wizards already at this step)
+    elif step == "SHIP_CHARGEABLE_":
         try:
             val = float(text)
-            db.update_shipment(ship_id, {"chargeable_weight": val})
-            db.update_user_state(user_id, f"SHIP_DIMS_{ship_id}")
-            await update.message.reply_text("📏 Enter Dimensions LxWxH (e.g., 120x80x100 or 12*5*7):", reply_markup=get_cancel_back())
+            await save_step(uow, user, ship_id, f"SHIP_DIMS_{ship_id}", {"chargeable_weight": val})
+            await update.message.reply_text(DIMS_PROMPT, reply_markup=get_cancel_back())
         except: await update.message.reply_text("⚠️ Enter a valid number:")
 
     # 8. Dimensions
-    elif state.startswith("SHIP_DIMS_"):
-        ship_id = state.split("_")[-1]
-        dims = validate_dims(text)
-        if dims:
-            db.update_shipment(ship_id, {"length_cm": dims[0], "width_cm": dims[1], "height_cm": dims[2], "exchange_rate_etb": db.get_setting('exchange_rate')})
-            db.update_user_state(user_id, f"SHIP_RATES_{ship_id}")
-            await update.message.reply_text("💰 Enter Approved Rate, Sale Rate in USD (e.g., 4.5, 5.2):", reply_markup=get_cancel_back())
-        else: await update.message.reply_text("⚠️ Use format: LxWxH")
+    elif step == "SHIP_DIMS_":
+        shipment = await load_shipment(uow, user, ship_id)
+        lines = parse_dim_lines(text, default_pieces=shipment.get('pieces'))
+        if lines:
+            fields = dims_fields(lines, shipment)
+            fields["exchange_rate_etb"] = await uow.get_setting('exchange_rate')
+            await save_step(uow, user, ship_id, f"SHIP_RATES_{ship_id}", fields)
+            await update.message.reply_text(
+                f"📦 {len(lines)} size(s), {fields['pieces']} Pcs\n"
+                f"⚖️ Volumetric: {fields['volumetric_weight']}kg · Chargeable: {fields['chargeable_weight']}kg\n\n"
+                "💰 Enter Approved Rate, Sale Rate in USD (e.g., 4.5, 5.2):",
+                reply_markup=get_cancel_back()
+            )
+        else: await update.message.reply_text(f"⚠️ Use format: L x W x H x Pcs, one size per line.\n\n{DIMS_PROMPT}")
 
     # 9. Rates
-    elif state.startswith("SHIP_RATES_"):
-        ship_id = state.split("_")[-1]
+    elif step == "SHIP_RATES_":
         try:
             parts = text.split(',')
-            db.update_shipment(ship_id, {"approved_rate_usd": float(parts[0].strip()), "sale_rate_usd": float(parts[1].strip())})
-            db.update_user_state(user_id, f"SHIP_SHIPPER_{ship_id}")
+            await save_step(uow, user, ship_id, f"SHIP_SHIPPER_{ship_id}", {"approved_rate_usd": float(parts[0].strip()), "sale_rate_usd": float(parts[1].strip())})
             await update.message.reply_text("🏠 Enter Shipper Details:", reply_markup=get_cancel_back())
         except: await update.message.reply_text("⚠️ Use format: AppRate, SaleRate")
 
     # 10. Shipper
-    elif state.startswith("SHIP_SHIPPER_"):
-        ship_id = state.split("_")[-1]
-        db.update_shipment(ship_id, {"shipper_info": text})
-        db.update_user_state(user_id, f"SHIP_CONSIGNEE_{ship_id}")
+    elif step == "SHIP_SHIPPER_":
+        await save_step(uow, user, ship_id, f"SHIP_CONSIGNEE_{ship_id}", {"shipper_info": text})
         await update.message.reply_text("🏢 Enter Consignee Details:", reply_markup=get_cancel_back())
 
     # 11. Consignee
-    elif state.startswith("SHIP_CONSIGNEE_"):
-        ship_id = state.split("_")[-1]
-        db.update_shipment(ship_id, {"consignee_info": text})
-        db.update_user_state(user_id, f"SHIP_NOTIFY_{ship_id}")
+    elif step == "SHIP_CONSIGNEE_":
+        await save_step(uow, user, ship_id, f"SHIP_NOTIFY_{ship_id}", {"consignee_info": text})
         await update.message.reply_text("🔔 Enter Notify Party Details:", reply_markup=get_cancel_back())
 
     # 12. Notify & Show Summary
-    elif state.startswith("SHIP_NOTIFY_"):
-        ship_id = state.split("_")[-1]
-        db.update_shipment(ship_id, {"notify_party": text})
-        db.update_user_state(user_id, f"SHIP_CONFIRM_{ship_id}")
-        summary = await generate_summary(db.get_shipment(ship_id), stage="review")
+    elif step == "SHIP_NOTIFY_":
+        await save_step(uow, user, ship_id, f"SHIP_CONFIRM_{ship_id}", {"notify_party": text})
+        summary = await generate_summary(await load_shipment(uow, user, ship_id), stage="review")
         await update.message.reply_text(summary, reply_markup=get_confirmation_keyboard())
 
     # --- EDIT MODE INPUTS ---
-    elif state.startswith("EDIT_INPUT_"):
-        parts = state.split("_")
-        field = parts[2]
-        ship_id = parts[3]
+    elif step == "EDIT_INPUT_":
+        field = context.route.field
         try:
-            if field == "awb": db.update_shipment(ship_id, {"awb_number": text})
-            elif field == "airline": db.update_shipment(ship_id, {"airline": text})
+            if field == "awb": fields = {"awb_number": text}
+            elif field == "airline": fields = {"airline": text}
             elif field == "route": 
                 r = text.split(' to ')
-                db.update_shipment(ship_id, {"origin": r[0], "destination": r[1]})
-            elif field == "pcs": db.update_shipment(ship_id, {"pieces": int(text)})
-            elif field == "gross": db.update_shipment(ship_id, {"gross_weight": float(text)})
-            elif field == "chargeable": db.update_shipment(ship_id, {"chargeable_weight": float(text)})
+                fields = {"origin": r[0], "destination": r[1]}
+            elif field == "pcs": fields = {"pieces": int(text)}
+            elif field == "gross":
+                gross = float(text)
+                volumetric = float((await load_shipment(uow, user, ship_id)).get('volumetric_weight') or 0)
+                fields = {"gross_weight": gross, "chargeable_weight": round(max(gross, volumetric), 2)}
+            elif field == "chargeable": fields = {"chargeable_weight": float(text)}
             elif field == "dims":
-                d = validate_dims(text)
-                db.update_shipment(ship_id, {"length_cm": d[0], "width_cm": d[1], "height_cm": d[2]})
+                shipment = await load_shipment(uow, user, ship_id)
+                fields = dims_fields(parse_dim_lines(text, default_pieces=shipment.get('pieces')), shipment)
             elif field == "rates":
                 p = text.split(',')
-                db.update_shipment(ship_id, {"approved_rate_usd": float(p[0].strip()), "sale_rate_usd": float(p[1].strip())})
-            elif field == "shipper": db.update_shipment(ship_id, {"shipper_info": text})
-            elif field == "consignee": db.update_shipment(ship_id, {"consignee_info": text})
-            elif field == "notify": db.update_shipment(ship_id, {"notify_party": text})
-
-            db.update_shipment_status(ship_id, "quotation_created")
-            db.update_user_state(user_id, f"SHIP_CONFIRM_{ship_id}")
-            summary = await generate_summary(db.get_shipment(ship_id), stage="review")
+                fields = {"approved_rate_usd": float(p[0].strip()), "sale_rate_usd": float(p[1].strip())}
+            elif field == "shipper": fields = {"shipper_info": text}
+            elif field == "consignee": fields = {"consignee_info": text}
+            elif field == "notify": fields = {"notify_party": text}
+            else: fields = {}
+
+            fields["shipment_status"] = "quotation_created"
+            await save_step(uow, user, ship_id, f"SHIP_CONFIRM_{ship_id}", fields)
+            summary = await generate_summary(await load_shipment(uow, user, ship_id), stage="review")
             await update.message.reply_text(f"✅ Field updated. Shipment reset for re-approval.\n\n{summary}", reply_markup=get_confirmation_keyboard())
         except:
             await update.message.reply_text("⚠️ Invalid format. Please try again.")
@@ -248,118 +357,154 @@ async def handle_shipment_text_input(update: Update, context: ContextTypes.DEFAU
 # --- CALLBACK HANDLERS ---
 
 async def handle_shipment_callbacks(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    uow = get_uow(context)
     query = update.callback_query
-    data = query.data
+    route = context.route
     user_id = update.effective_user.id
-    user = db.get_user(user_id)
+    user = await uow.get_user(user_id)
+    # The wizard step the button belongs to (ship id for confirm/edit/back)
+    step = parse_state(user.get('state'))
     await query.answer()
 
-    if data == "confirm_shipment":
-        state = user.get('state', '')
-        if state.startswith("SHIP_CONFIRM_"):
-            ship_id = state.split("_")[-1]
-            db.update_user_state(user_id, None)
-            await query.edit_message_text("🚀 Shipment Submitted for Rate Review.")
-            shipment = db.get_shipment(ship_id)
+    if route.key == "confirm_shipment":
+        if step and step.key == "SHIP_CONFIRM_":
+            ship_id = step.ship_id
+            draft = get_draft(user, ship_id)
+            shipment = draft or await uow.get_shipment(ship_id)
             admin_summary = await generate_summary(shipment, stage="pending_approval")
-            admin_msg = await context.bot.send_message(
-                chat_id=Config.ADMIN_CHANNEL_ID,
-                text=f"🚨 NEW SHIPMENT REVIEW REQUEST\nFrom: {user['full_name']}\nID: {ship_id}\n\n{admin_summary}",
-                reply_markup=get_shipment_approval_keyboard(ship_id)
+            review_request = outbox_message(
+                Config.ADMIN_CHANNEL_ID,
+                f"🚨 NEW SHIPMENT REVIEW REQUEST\nFrom: {user['full_name']}\nID: {ship_id}\n\n{admin_summary}",
+                get_shipment_approval_keyboard(ship_id),
+                track=True
             )
-            db.update_shipment(ship_id, {"admin_message_id": admin_msg.message_id})
+            # Materialise the buffered wizard (single insert) and queue the admin review request atomically
+            await uow.apply_shipment_change(ship_id, draft or {}, [review_request], insert=bool(draft))
+            await uow.update_user(user_id, {"state": None, "draft": None})
+            await query.edit_message_text("🚀 Shipment Submitted for Rate Review.")
 
-    elif data == "open_edit_menu":
+    elif route.key == "open_edit_menu":
         await query.edit_message_text("📝 Select field to edit:", reply_markup=get_edit_menu())
 
-    elif data.startswith("edit_hist_"):
-        ship_id = data.replace("edit_hist_", "")
-        db.update_user_state(user_id, f"SHIP_CONFIRM_{ship_id}")
-        summary = await generate_summary(db.get_shipment(ship_id))
+    elif route.key == "edit_hist_":
+        ship_id = route.ship_id
+        await uow.update_user_state(user_id, f"SHIP_CONFIRM_{ship_id}")
+        summary = await generate_summary(await uow.get_shipment(ship_id))
         await query.message.reply_text(f"Editing Shipment Mode:\n\n{summary}", reply_markup=get_confirmation_keyboard())
 
-    elif data.startswith("edit_field_"):
-        field = data.replace("edit_field_", "")
-        ship_id = user['state'].split("_")[-1]
-        db.update_user_state(user_id, f"EDIT_INPUT_{field}_{ship_id}")
-        prompts = {"airline": "Enter Airline Name:", "awb": "Enter AWB Number:", "pcs": "Enter Total Pieces:", "gross": "Enter Normal Weight:", "chargeable": "Enter Chargeable Weight:", "dims": "Enter Dims LxWxH:", "rates": "Enter AppRate, SaleRate:", "shipper": "Enter Shipper:", "consignee": "Enter Consignee:", "notify": "Enter Notify:", "route": "Enter new Route (e.g. Dubai to Addis):"}
+    elif route.key == "edit_field_":
+        field = route.field
+        ship_id = step.ship_id
+        await uow.update_user_state(user_id, f"EDIT_INPUT_{field}_{ship_id}")
+        prompts = {"airline": "Enter Airline Name:", "awb": "Enter AWB Number:", "pcs": "Enter Total Pieces:", "gross": "Enter Normal Weight:", "chargeable": "Enter Chargeable Weight:", "dims": DIMS_PROMPT, "rates": "Enter AppRate, SaleRate:", "shipper": "Enter Shipper:", "consignee": "Enter Consignee:", "notify": "Enter Notify:", "route": "Enter new Route (e.g. Dubai to Addis):"}
         await query.edit_message_text(prompts.get(field, "Enter new value:"), reply_markup=get_simple_cancel())
 
-    elif data == "back_to_summary":
+    elif route.key == "back_to_summary":
         # Cancel Editing: Just return to the summary screen
-        ship_id = user['state'].split("_")[-1]
-        summary = await generate_summary(db.get_shipment(ship_id))
+        ship_id = step.ship_id
+        summary = await generate_summary(await load_shipment(uow, user, ship_id))
         await query.edit_message_text(summary, reply_markup=get_confirmation_keyboard())
 
-    elif data == "cancel_wizard":
-        db.update_user_state(user_id, None)
+    elif route.key == "cancel_wizard":
+        await uow.update_user(user_id, {"state": None, "draft": None})
         try: await query.message.delete()
         except: pass
         await context.bot.send_message(chat_id=user_id, text="❌ Action cancelled.", reply_markup=get_main_dashboard(user['role']))
 
-    elif data == "back_step":
+    elif route.key == "back_step":
         await handle_back_step(update, context, user)
 
 async def handle_back_step(update: Update, context: ContextTypes.DEFAULT_TYPE, user):
-    current_state = user['state']
-    ship_id = current_state.split("_")[-1]
-    steps = ["SHIP_AIRLINE", "SHIP_ORIGIN", "SHIP_DEST", "SHIP_AWB", "SHIP_PIECES", "SHIP_GROSS", "SHIP_CHARGEABLE", "SHIP_DIMS", "SHIP_RATES", "SHIP_SHIPPER", "SHIP_CONSIGNEE", "SHIP_NOTIFY", "SHIP_CONFIRM"]
+    uow = get_uow(context)
+    step = parse_state(user['state'])
+    steps = ["SHIP_AIRLINE", "SHIP_ORIGIN", "SHIP_DEST", "SHIP_AWB", "SHIP_PIECES", "SHIP_GROSS", "SHIP_DIMS", "SHIP_RATES", "SHIP_SHIPPER", "SHIP_CONSIGNEE", "SHIP_NOTIFY", "SHIP_CONFIRM"]
+    # SHIP_CHARGEABLE (legacy wizards) stood where SHIP_DIMS is now, so Back leads to the same step
+    action = "SHIP_DIMS" if step.action == "SHIP_CHARGEABLE" else step.action
     try:
-        current_base = "_".join(current_state.split("_")[:2])
-        idx = steps.index(current_base)
+        idx = steps.index(action)
         if idx > 0:
-            db.update_user_state(user['telegram_id'], f"{steps[idx-1]}_{ship_id}")
-            prompts = {"SHIP_AIRLINE": "✈️ Airline Name:", "SHIP_ORIGIN": "📍 Origin City:", "SHIP_DEST": "🏁 Destination City:", "SHIP_AWB": "🔢 AWB Number:", "SHIP_PIECES": "🔢 Total Pieces:", "SHIP_GROSS": "⚖️ Normal Weight:", "SHIP_CHARGEABLE": "⚖️ Chargeable Weight:", "SHIP_DIMS": "📏 Dimensions LxWxH:", "SHIP_RATES": "💰 AppRate, SaleRate:", "SHIP_SHIPPER": "🏠 Shipper:", "SHIP_CONSIGNEE": "🏢 Consignee:", "SHIP_NOTIFY": "🔔 Notify Party:"}
+            await uow.update_user_state(user['telegram_id'], f"{steps[idx-1]}_{step.ship_id}")
+            prompts = {"SHIP_AIRLINE": "✈️ Airline Name:", "SHIP_ORIGIN": "📍 Origin City:", "SHIP_DEST": "🏁 Destination City:", "SHIP_AWB": "🔢 AWB Number:", "SHIP_PIECES": "🔢 Total Pieces:", "SHIP_GROSS": "⚖️ Normal Weight:", "SHIP_DIMS": DIMS_PROMPT, "SHIP_RATES": "💰 AppRate, SaleRate:", "SHIP_SHIPPER": "🏠 Shipper:", "SHIP_CONSIGNEE": "🏢 Consignee:", "SHIP_NOTIFY": "🔔 Notify Party:"}
             await update.callback_query.edit_message_text(prompts.get(steps[idx-1]), reply_markup=get_cancel_back())
     except: await start_new_shipment(update, context)
 
 # --- PHASE 2: UPLOAD ---
 
 async def start_proof_upload(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    uow = get_uow(context)
     query = update.callback_query
     await query.answer()
-    shipment_id = query.data.replace("start_upload_", "")
-    db.update_user_state(update.effective_user.id, f"UPLOAD_1_{shipment_id}")
-    context.user_data['proofs'] = []
+    shipment_id = context.route.ship_id
+    # Proofs collected so far live in the profile draft, so they survive a cold start between files
+    await uow.update_user(update.effective_user.id, {"state": f"UPLOAD_1_{shipment_id}", "draft": None})
     await query.edit_message_text("💳 Payment Proof Upload\nSend the first file now (Photo or PDF):")
 
-async def handle_phase2_upload(update: Update, context: ContextTypes.DEFAULT_TYPE, user):
-    user_id, state = user['telegram_id'], user['state']
-    ship_id = state.split("_")[-1]
+async def handle_phase2_upload(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    uow = get_uow(context)
+    user_id = update.effective_user.id
+    user = await uow.get_user(user_id)
+    ship_id = context.route.ship_id
     
     if update.message.photo:
-        file = await update.message.photo[-1].get_file()
+        attachment = update.message.photo[-1]
         mime, ext, f_type = "image/jpeg", ".jpg", "photo"
     elif update.message.document:
-        file = await update.message.document.get_file()
-        mime = update.message.document.mime_type
+        attachment = update.message.document
+        mime = attachment.mime_type or "application/octet-stream"
         ext = ".pdf" if "pdf" in mime else ".dat"
-        f_type = "doc"
+        f_type = "document"
     else:
         await update.message.reply_text("❌ Send a Photo or PDF.")
         return
 
-    f_bytes = await file.download_as_bytearray()
-    f_path = f"{user_id}/{ship_id}/{uuid.uuid4()}{ext}"
-    p_url = await db.upload_file(f_path, f_path, bytes(f_bytes), mime)
+    # Reject oversized files before downloading anything
+    limit_text = f"❌ File too large. Maximum size is {Config.MAX_PROOF_BYTES // (1024 * 1024)} MB."
+    if (attachment.file_size or 0) > Config.MAX_PROOF_BYTES:
+        await update.message.reply_text(limit_text)
+        return
+
+    try:
+        # Deduplicated by content: a receipt sent again reuses the stored object
+        stored = await store_attachment(uow, attachment, mime, ext, Config.MAX_PROOF_BYTES)
+    except FileTooLarge:
+        await update.message.reply_text(limit_text)
+        return
     
-    if 'proofs' not in context.user_data: context.user_data['proofs'] = []
-    context.user_data['proofs'].append({"url": p_url, "type": f_type})
+    pending = user.get('draft') or {}
+    proofs = pending.get('proofs', []) if pending.get('proofs_for') == ship_id else []
+    # Keep the Telegram file_id next to the Storage copy: the admin channel gets the file by id
+    proofs.append({"url": stored['public_url'], "attachment_id": stored['id'], "file_id": attachment.file_id, "type": f_type})
     
-    if len(context.user_data['proofs']) < 2:
-        db.update_user_state(user_id, f"UPLOAD_2_{ship_id}")
+    if len(proofs) < 2:
+        await uow.update_user(user_id, {"state": f"UPLOAD_2_{ship_id}", "draft": {"proofs_for": ship_id, "proofs": proofs}})
         await update.message.reply_text(f"📥 Received file 1/2. Send the second:")
     else:
-        urls = [f['url'] for f in context.user_data['proofs']]
-        db.update_shipment(ship_id, {"files": urls, "payment_status": "unpaid", "shipment_status": "payment_received"})
-        db.update_user_state(user_id, None)
+        shipment = await uow.get_shipment(ship_id)
+        if not shipment:
+            # Deleted meanwhile, or a stale UPLOAD_2_ state: nothing to attach the proofs to
+            await uow.update_user(user_id, {"state": None, "draft": None})
+            await update.message.reply_text("❌ Error: Shipment not found.", reply_markup=get_main_dashboard(user['role']))
+            return
+        changes = {
+            "files": [f['url'] for f in proofs],
+            "file_ids": [f['file_id'] for f in proofs],
+            "payment_status": "unpaid",
+            "shipment_status": "payment_received"
+        }
+        summary = await generate_summary({**shipment, **changes}, stage="payment_pending")
+
+        # Proofs first (one media group, re-sent by file_id so Telegram does not fetch them
+        # back from Storage), then the decision message whose id is written back to the shipment
+        messages = outbox_media_group(
+            Config.ADMIN_CHANNEL_ID, [{"type": f['type'], "media": f['file_id']} for f in proofs]
+        )
+        messages.append(outbox_message(
+            Config.ADMIN_CHANNEL_ID,
+            f"💰 PAYMENT VERIFICATION REQUIRED\nID: {ship_id}\n\n{summary}",
+            get_payment_decision_keyboard(ship_id),
+            track=True
+        ))
+        # The proof links are written in the same transaction as the status change and outbox rows
+        await uow.apply_shipment_change(ship_id, {**changes, "attachment_ids": [f['attachment_id'] for f in proofs]}, messages)
+        await uow.update_user(user_id, {"state": None, "draft": None})
         await update.message.reply_text("✅ Payment Proof Submitted!", reply_markup=get_main_dashboard(user['role']))
-        
-        for f in context.user_data['proofs']:
-            if f['type'] == "photo": await context.bot.send_photo(chat_id=Config.ADMIN_CHANNEL_ID, photo=f['url'])
-            else: await context.bot.send_document(chat_id=Config.ADMIN_CHANNEL_ID, document=f['url'])
-        
-        summary = await generate_summary(db.get_shipment(ship_id), stage="payment_pending")
-        decision_msg = await context.bot.send_message(chat_id=Config.ADMIN_CHANNEL_ID, text=f"💰 PAYMENT VERIFICATION REQUIRED\nID: {ship_id}\n\n{summary}", reply_markup=get_payment_decision_keyboard(ship_id))
-        db.update_shipment(ship_id, {"admin_message_id": decision_msg.message_id})
-        context.user_data['proofs'] = []
\ No newline at end of file
@@ -1,6 +1,6 @@
 from telegram import Update, constants
 from telegram.ext import ContextTypes, ConversationHandler
-from core.database.supabase_client import db
+from core.database.unit_of_work import get_uow
 from core.utils.keyboards import (
     get_main_menu, 
     get_user_approval_keyboard, 
@@ -14,8 +14,9 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     The entry point for all users.
     Uses Database State Machine and respects Multi-Admin Config.
     """
+    uow = get_uow(context)
     user_id = update.effective_user.id
-    user = db.get_user(user_id)
+    user = await uow.get_user(user_id)
 
     query = update.callback_query
     if query:
@@ -27,7 +28,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         is_system_admin = user_id in Config.ADMIN_IDS
         
         # Create a record. If they are a system admin, they are auto-approved.
-        db.create_user({
+        await uow.create_user({
             "telegram_id": user_id,
             "username": update.effective_user.username or "NoUsername",
             "full_name": "Pending",
@@ -61,8 +62,8 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not user['is_approved']:
         # Final check: if they were added to ADMIN_IDS after their first start, auto-approve them now
         if user_id in Config.ADMIN_IDS:
-            db.approve_user(user_id, "admin")
-            user = db.get_user(user_id) # Refresh user data
+            await uow.approve_user(user_id, "admin")
+            user = await uow.get_user(user_id) # Refresh user data
         else:
             text = (
                 "⏳ Account Pending\n\n"
@@ -92,6 +93,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def handle_registration_name(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Saves Name to DB and moves state to REG_COMPANY. Role is never touched here."""
+    uow = get_uow(context)
     user_id = update.effective_user.id
     name_input = update.message.text
 
@@ -100,15 +102,16 @@ async def handle_registration_name(update: Update, context: ContextTypes.DEFAULT
         return
 
     # Update ONLY full_name and state. Role remains what it was (admin/user).
-    db.supabase.table("profiles").update({
+    await uow.update_user(user_id, {
         "full_name": name_input,
         "state": "REG_COMPANY"
-    }).eq("telegram_id", user_id).execute()
+    })
 
     await update.message.reply_text(f"Thank you, {name_input}.\nNow, please enter your Company Name:")
 
 async def handle_registration_company(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Finalizes registration details and notifies Admin Channel."""
+    uow = get_uow(context)
     user_id = update.effective_user.id
     company_input = update.message.text
     
@@ -117,12 +120,12 @@ async def handle_registration_company(update: Update, context: ContextTypes.DEFA
         return
 
     # Update ONLY company_name and clear state. Role remains untouched.
-    db.supabase.table("profiles").update({
+    await uow.update_user(user_id, {
         "company_name": company_input,
         "state": None
-    }).eq("telegram_id", user_id).execute()
+    })
 
-    user = db.get_user(user_id)
+    user = await uow.get_user(user_id)
 
     # If they are already approved (auto-admin), show dashboard
     if user['is_approved']:
@@ -0,0 +1,60 @@
+import hashlib
+import tempfile
+from core.config import Config
+from core.utils.bot import stream_file
+
+# Files up to this size are hashed in memory; larger ones spill to a temp file
+SPOOL_MEMORY = 1024 * 1024
+CHUNK_SIZE = 256 * 1024
+
+async def _spool(file, max_bytes: int):
+    """Streams a telegram.File once, hashing it while it is buffered (bounded memory)."""
+    digest = hashlib.sha256()
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY)
+    size = 0
+    try:
+        async for chunk in stream_file(file, max_bytes, CHUNK_SIZE):
+            digest.update(chunk)
+            spool.write(chunk)
+            size += len(chunk)
+    except BaseException:
+        spool.close()
+        raise
+    spool.seek(0)
+    return digest.hexdigest(), size, spool
+
+async def _read_chunks(spool):
+    while True:
+        chunk = spool.read(CHUNK_SIZE)
+        if not chunk:
+            return
+        yield chunk
+
+async def store_attachment(uow, attachment, mime: str, ext: str, max_bytes: int = None):
+    """
+    Returns the attachments row for a Telegram PhotoSize/Document, storing its content once.
+    A file Telegram has seen before (same file_unique_id) is not even downloaded; new content
+    is hashed first and only uploaded when no attachment with that SHA-256 exists yet.
+    """
+    known = await uow.get_attachment(file_unique_id=attachment.file_unique_id)
+    if known:
+        return known
+
+    file = await attachment.get_file()
+    sha256, size, spool = await _spool(file, max_bytes or Config.MAX_PROOF_BYTES)
+    with spool:
+        known = await uow.get_attachment(sha256=sha256)
+        if known:
+            return known
+        # Content-addressed key: identical bytes always land on the same object, so upsert is safe
+        key = f"{sha256[:2]}/{sha256}{ext}"
+        url = await uow.upload_file(key, key, _read_chunks(spool), mime, upsert=True)
+
+    return await uow.create_attachment({
+        "sha256": sha256,
+        "size_bytes": size,
+        "mime_type": mime,
+        "storage_key": key,
+        "public_url": url,
+        "file_unique_id": attachment.file_unique_id
+    })
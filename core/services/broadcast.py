@@ -0,0 +1,129 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+from telegram.error import RetryAfter, Forbidden, BadRequest, TelegramError
+from core.database import db
+from core.utils.keyboards import get_broadcast_progress_keyboard
+from core.utils.rate_limit import TokenBucket
+from core.config import Config
+
+# Extra lease time on top of the delivery budget, so a slow final batch is still covered
+LEASE_MARGIN = 30
+
+async def start_broadcast(bot, admin_id: int, chat_id: int, text: str):
+    """Persists a new job and posts the progress message the engine will keep editing."""
+    total = await db.count_broadcast_targets()
+    progress = await bot.send_message(chat_id=chat_id, text=f"📢 Broadcast queued for {total} users...")
+    return await db.create_broadcast_job({
+        "created_by": admin_id,
+        "text": f"📢 ANNOUNCEMENT\n\n{text}",
+        "total": total,
+        "progress_chat_id": chat_id,
+        "progress_message_id": progress.message_id
+    })
+
+async def _deliver(bot, chat_id: int, text: str, bucket: TokenBucket, sem: asyncio.Semaphore, attempts: int = 3,
+                   reply_markup=None):
+    """Sends one message within the global rate. Returns True when Telegram accepted it."""
+    async with sem:
+        for _ in range(attempts):
+            await bucket.acquire()
+            try:
+                await bot.send_message(chat_id=chat_id, text=text, reply_markup=reply_markup)
+                return True
+            except RetryAfter as e:
+                # Flood control applies to the whole bot, so every sender backs off
+                bucket.pause(e.retry_after)
+            except (Forbidden, BadRequest):
+                # User blocked the bot or the chat no longer exists: retrying will not help
+                return False
+            except TelegramError as e:
+                logging.warning(f"Broadcast send to {chat_id} failed: {e}")
+        return False
+
+async def notify_users(bot, telegram_ids: list, text: str, reply_markup=None):
+    """
+    Sends the same message to several users (e.g. a bulk approval) at BROADCAST_RATE, so a
+    full page does not trip flood control. Returns how many were delivered.
+    """
+    bucket = TokenBucket(Config.BROADCAST_RATE)
+    sem = asyncio.Semaphore(Config.BROADCAST_CONCURRENCY)
+    results = await asyncio.gather(
+        *(_deliver(bot, tid, text, bucket, sem, reply_markup=reply_markup) for tid in telegram_ids)
+    )
+    return sum(results)
+
+async def _report(bot, job: dict, done: bool):
+    sent = job['delivered'] + job['failed']
+    text = (
+        f"📢 Broadcast #{job['id']} {'complete' if done else 'in progress'}\n\n"
+        f"Progress: {sent}/{job['total']}\n"
+        f"✅ Delivered: {job['delivered']}\n"
+        f"❌ Failed: {job['failed']}"
+    )
+    try:
+        await bot.edit_message_text(
+            text, chat_id=job['progress_chat_id'], message_id=job['progress_message_id'],
+            reply_markup=None if done else get_broadcast_progress_keyboard(job['id'])
+        )
+    except TelegramError:
+        pass
+
+async def run_broadcast(bot, job_id: int, budget: float = None):
+    """
+    Delivers one job from its persisted cursor until it finishes or `budget` seconds pass.
+    Progress is saved after every batch, so a killed invocation loses at most one batch of
+    bookkeeping and the next call picks up where it stopped. Returns the job row, or None if
+    another invocation currently holds the job.
+    """
+    lease = (budget or 3600) + LEASE_MARGIN
+    job = await db.claim_broadcast_job(job_id, lease)
+    if not job:
+        return None
+
+    deadline = time.monotonic() + budget if budget else None
+    bucket = TokenBucket(Config.BROADCAST_RATE)
+    sem = asyncio.Semaphore(Config.BROADCAST_CONCURRENCY)
+    done = False
+
+    while deadline is None or time.monotonic() < deadline:
+        ids = await db.get_broadcast_batch(job['cursor'] or 0, Config.BROADCAST_BATCH)
+        if not ids:
+            done = True
+            break
+        results = await asyncio.gather(*(_deliver(bot, tid, job['text'], bucket, sem) for tid in ids))
+        job['cursor'] = ids[-1]
+        job['delivered'] += sum(results)
+        job['failed'] += len(results) - sum(results)
+        await db.update_broadcast_job(job_id, {
+            "cursor": job['cursor'], "delivered": job['delivered'], "failed": job['failed'],
+            "lease_until": datetime.fromtimestamp(time.time() + lease, tz=timezone.utc).isoformat()
+        })
+        await _report(bot, job, done=False)
+
+    final = {"lease_until": None}
+    if done:
+        final.update({"status": "done", "finished_at": datetime.now(timezone.utc).isoformat()})
+        job['status'] = "done"
+    await db.update_broadcast_job(job_id, final)
+    await _report(bot, job, done=done)
+    return job
+
+async def resume_broadcasts(bot, budget: float = None):
+    """Advances every unfinished job; used by the cron endpoint and the local worker loop."""
+    deadline = time.monotonic() + budget if budget else None
+    for job in await db.get_active_broadcast_jobs():
+        remaining = deadline - time.monotonic() if deadline else None
+        if remaining is not None and remaining <= 0:
+            break
+        await run_broadcast(bot, job['id'], remaining)
+
+async def broadcast_worker(bot, interval: float = 5):
+    """Long-running resume loop for run_local.py (no time budget)."""
+    while True:
+        try:
+            await resume_broadcasts(bot)
+        except Exception as e:
+            logging.error(f"Broadcast worker error: {str(e)}")
+        await asyncio.sleep(interval)
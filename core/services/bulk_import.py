@@ -0,0 +1,210 @@
+import csv
+import io
+import logging
+import re
+import tempfile
+import uuid
+from typing import NamedTuple
+from core.config import Config
+from core.utils.bot import stream_file
+from core.utils.calculations import bulk_chargeable
+from core.utils.pagination import SHIPMENT_STATUSES, PAYMENT_STATUSES
+from core.utils.validators import is_amount, validate_dims, parse_dim_lines
+
+# Uploads up to this size stay in memory while being parsed; larger ones spill to a temp file
+SPOOL_MEMORY = 1024 * 1024
+CHUNK_SIZE = 256 * 1024
+
+# Header spellings accepted for each shipments column (compared lowercased, spaces as '_')
+COLUMN_ALIASES = {
+    "airline": ("airline", "carrier"),
+    "origin": ("origin", "from"),
+    "destination": ("destination", "dest", "to"),
+    "awb_number": ("awb_number", "awb"),
+    "pieces": ("pieces", "pcs"),
+    "gross_weight": ("gross_weight", "gross", "weight"),
+    "dims": ("dims", "dimensions"),
+    "length_cm": ("length_cm", "length", "l"),
+    "width_cm": ("width_cm", "width", "w"),
+    "height_cm": ("height_cm", "height", "h"),
+    "approved_rate_usd": ("approved_rate_usd", "approved_rate", "rate"),
+    "sale_rate_usd": ("sale_rate_usd", "sale_rate"),
+    "shipper_info": ("shipper_info", "shipper"),
+    "consignee_info": ("consignee_info", "consignee"),
+    "notify_party": ("notify_party", "notify"),
+    "shipment_status": ("shipment_status", "status"),
+    "payment_status": ("payment_status", "payment"),
+}
+REQUIRED_COLUMNS = ("airline", "origin", "destination", "awb_number", "pieces", "gross_weight",
+                    "approved_rate_usd", "sale_rate_usd")
+TEXT_COLUMNS = ("shipper_info", "consignee_info", "notify_party")
+
+class ImportReport(NamedTuple):
+    """Outcome of one upload: rows stored, and (file line, reason) for every row that was not."""
+    imported: int
+    errors: list
+
+class ImportRejected(ValueError):
+    """The file as a whole cannot be imported (no usable header); the message is shown to staff."""
+
+def _header_key(name: str):
+    return re.sub(r"\s+", "_", (name or "").strip().lower())
+
+def _map_header(header: list):
+    """{shipments column: field index} for the recognised headers."""
+    lookup = {alias: column for column, aliases in COLUMN_ALIASES.items() for alias in aliases}
+    mapping = {}
+    for i, name in enumerate(header):
+        column = lookup.get(_header_key(name))
+        if column and column not in mapping:
+            mapping[column] = i
+    missing = [c for c in REQUIRED_COLUMNS if c not in mapping]
+    if "dims" not in mapping and not all(c in mapping for c in ("length_cm", "width_cm", "height_cm")):
+        missing.append("dims (or length/width/height)")
+    if missing:
+        raise ImportRejected(f"Missing column(s): {', '.join(missing)}")
+    return mapping
+
+def _delimiter(line: str):
+    # TSV exports from spreadsheets, ';' from European locales, ',' otherwise
+    return max(("\t", ";", ","), key=line.count) if any(d in line for d in "\t;,") else ","
+
+def parse_row(fields: list, mapping: dict):
+    """
+    One data row -> (shipment columns with its 'dims' lines, None) or (None, reason).
+    Uses the wizard's rules: digits for pieces, is_amount for weights and rates, validate_dims /
+    parse_dim_lines for the sizes. Weights are computed later for the whole batch.
+    """
+    def get(column):
+        i = mapping.get(column)
+        return fields[i].strip() if i is not None and i < len(fields) else ""
+
+    for column in ("airline", "origin", "destination", "awb_number"):
+        if not get(column):
+            return None, f"{column} is empty"
+
+    pieces = get("pieces")
+    if not pieces.isdigit() or int(pieces) <= 0:
+        return None, f"pieces '{pieces}' is not a whole number"
+    gross = get("gross_weight")
+    if not is_amount(gross):
+        return None, f"gross_weight '{gross}' is not a number of zero or more"
+    for column in ("approved_rate_usd", "sale_rate_usd"):
+        if not is_amount(get(column)):
+            return None, f"{column} '{get(column)}' is not a number of zero or more"
+
+    if get("dims"):
+        lines = parse_dim_lines(get("dims"), default_pieces=int(pieces))
+        if not lines:
+            return None, f"dims '{get('dims')}' is not L x W x H x Pcs"
+    else:
+        size = validate_dims(f"{get('length_cm')}x{get('width_cm')}x{get('height_cm')}")
+        if not size or min(size) <= 0:
+            return None, "length/width/height must be positive numbers"
+        lines = [{"length_cm": size[0], "width_cm": size[1], "height_cm": size[2], "pieces": int(pieces)}]
+
+    shipment_status = get("shipment_status") or "quotation_created"
+    if shipment_status not in SHIPMENT_STATUSES:
+        return None, f"unknown shipment_status '{shipment_status}'"
+    payment_status = get("payment_status") or "unpaid"
+    if payment_status not in PAYMENT_STATUSES:
+        return None, f"unknown payment_status '{payment_status}'"
+
+    row = {
+        "airline": get("airline"),
+        "origin": get("origin"),
+        "destination": get("destination"),
+        "awb_number": get("awb_number"),
+        "pieces": sum(d['pieces'] for d in lines),
+        "gross_weight": float(gross),
+        "approved_rate_usd": float(get("approved_rate_usd")),
+        "sale_rate_usd": float(get("sale_rate_usd")),
+        "shipment_status": shipment_status,
+        "payment_status": payment_status,
+        "dims": lines,
+    }
+    for column in TEXT_COLUMNS:
+        row[column] = get(column) or None
+    return row, None
+
+def with_weights(rows: list):
+    """Fills volumetric/chargeable weight for a batch of parsed rows in one bulk_chargeable pass."""
+    owners, lengths, widths, heights, pieces = [], [], [], [], []
+    for i, row in enumerate(rows):
+        for d in row['dims']:
+            owners.append(i)
+            lengths.append(d['length_cm'])
+            widths.append(d['width_cm'])
+            heights.append(d['height_cm'])
+            pieces.append(d['pieces'])
+    volumetric, chargeable = bulk_chargeable(owners, lengths, widths, heights, pieces,
+                                             [row['gross_weight'] for row in rows])
+    for row, vol, charge in zip(rows, volumetric, chargeable):
+        row['volumetric_weight'] = vol
+        row['chargeable_weight'] = charge
+    return rows
+
+async def _spool(file, max_bytes: int):
+    """Downloads a telegram.File in chunks into a spooled temp file (bounded memory)."""
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY)
+    try:
+        async for chunk in stream_file(file, max_bytes, CHUNK_SIZE):
+            spool.write(chunk)
+    except BaseException:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool
+
+async def import_shipments(uow, document, created_by: int):
+    """
+    Imports a CSV/TSV document of shipments owned by `created_by`.
+    The file is read one record at a time from a spooled download; valid rows are stored
+    Config.IMPORT_BATCH at a time through create_shipments (one multi-row insert each), so
+    memory stays at one batch however long the file is. Raises ImportRejected for an unusable
+    header and FileTooLarge past Config.MAX_IMPORT_BYTES.
+    """
+    file = await document.get_file()
+    exchange_rate = await uow.get_setting('exchange_rate')
+    imported, errors, batch, batch_lines = 0, [], [], []
+
+    async def flush():
+        nonlocal imported
+        if not batch:
+            return
+        try:
+            await uow.create_shipments(with_weights(batch))
+            imported += len(batch)
+        except Exception as e:
+            logging.exception(f"Bulk import batch of {len(batch)} rows failed")
+            errors.extend((line, f"not saved ({type(e).__name__})") for line in batch_lines)
+        batch.clear()
+        batch_lines.clear()
+
+    with await _spool(file, Config.MAX_IMPORT_BYTES) as spool:
+        text = io.TextIOWrapper(spool, encoding="utf-8-sig", errors="replace", newline="")
+        first = text.readline()
+        if not first.strip():
+            raise ImportRejected("The file is empty.")
+        delimiter = _delimiter(first)
+        mapping = _map_header(next(csv.reader([first], delimiter=delimiter)))
+
+        reader = csv.reader(text, delimiter=delimiter)
+        for fields in reader:
+            if not any(f.strip() for f in fields):
+                continue
+            # +1: the header was read before the reader started counting
+            line = reader.line_num + 1
+            row, error = parse_row(fields, mapping)
+            if error:
+                errors.append((line, error))
+                continue
+            row.update(id=str(uuid.uuid4()), created_by=created_by, exchange_rate_etb=exchange_rate)
+            batch.append(row)
+            batch_lines.append(line)
+            if len(batch) >= Config.IMPORT_BATCH:
+                await flush()
+        await flush()
+        text.detach()
+
+    return ImportReport(imported, errors)
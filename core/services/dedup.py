@@ -0,0 +1,64 @@
+import logging
+import time
+from collections import OrderedDict
+from telegram import Update
+from telegram.ext import ApplicationHandlerStop, ContextTypes
+from core.config import Config
+from core.database import db
+from core.utils.metrics import DUPLICATE_UPDATES
+
+class SeenUpdates:
+    """
+    Bounded LRU of the update_ids this process accepted, each remembered for `ttl` seconds.
+    Answers a redelivery to the same warm instance without a database round trip.
+    """
+    def __init__(self, size: int, ttl: float):
+        self.size, self.ttl = size, ttl
+        self._seen = OrderedDict()
+
+    def __contains__(self, update_id: int):
+        seen_at = self._seen.get(update_id)
+        if seen_at is None:
+            return False
+        if time.monotonic() - seen_at > self.ttl:
+            del self._seen[update_id]
+            return False
+        self._seen.move_to_end(update_id)
+        return True
+
+    def add(self, update_id: int):
+        self._seen[update_id] = time.monotonic()
+        self._seen.move_to_end(update_id)
+        if len(self._seen) > self.size:
+            self._seen.popitem(last=False)
+
+seen_updates = SeenUpdates(Config.UPDATE_DEDUP_CACHE, Config.UPDATE_DEDUP_TTL)
+
+async def first_delivery(update_id: int, database=db):
+    """
+    True the first time update_id arrives, False for a redelivery.
+    The in-process LRU is checked first, then the processed_updates claim decides across
+    instances. The id is remembered before the claim is awaited, so a copy that arrives at
+    this instance while the claim is still in flight is dropped too. If the claim itself
+    fails the update is processed: a rare duplicate is better than a lost message.
+    """
+    if update_id in seen_updates:
+        DUPLICATE_UPDATES.inc(source="memory")
+        return False
+    seen_updates.add(update_id)
+    try:
+        claimed = await database.claim_update(update_id, Config.UPDATE_DEDUP_TTL)
+    except Exception as e:
+        logging.warning(f"Update {update_id} could not be claimed, processing anyway: {e}")
+        return True
+    if not claimed:
+        DUPLICATE_UPDATES.inc(source="database")
+    return claimed
+
+async def drop_duplicate_updates(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    PTB callback run in group -1, ahead of the routers: a redelivered update stops here,
+    before any routing, profile lookup or handler work.
+    """
+    if not await first_delivery(update.update_id):
+        raise ApplicationHandlerStop
@@ -0,0 +1,132 @@
+import csv
+import io
+import tempfile
+from datetime import date, datetime, time, timedelta, timezone
+from typing import NamedTuple
+from core.config import Config
+from core.utils.pagination import SHIPMENT_STATUSES, PAYMENT_STATUSES
+
+# Exports up to this size stay in memory; larger ones spill to a temp file
+SPOOL_MEMORY = 1024 * 1024
+
+# Exported shipments columns, in file order; owner and the totals are added per row
+EXPORT_COLUMNS = (
+    "id", "created_at", "date", "created_by", "airline", "awb_number", "origin", "destination",
+    "pieces", "gross_weight", "volumetric_weight", "chargeable_weight",
+    "approved_rate_usd", "sale_rate_usd", "exchange_rate_etb",
+    "shipment_status", "payment_status", "shipper_info", "consignee_info", "notify_party",
+)
+EXPORT_HEADER = EXPORT_COLUMNS[:4] + ("owner",) + EXPORT_COLUMNS[4:] + ("total_usd", "total_etb")
+EXPORT_SELECT = ", ".join(EXPORT_COLUMNS) + ", profiles(full_name)"
+
+EXPORT_FILTER_HELP = (
+    "from=YYYY-MM-DD  to=YYYY-MM-DD (inclusive)\n"
+    "status=<shipment status>  payment=unpaid|paid  user=<telegram id>\n"
+    "or 'all' for every shipment."
+)
+
+class ExportFilter(NamedTuple):
+    """get_shipments_page filters for one export; dates are the created_at bounds [from, to)."""
+    created_from: str = None
+    created_to: str = None
+    shipment_status: str = None
+    payment_status: str = None
+    created_by: int = None
+
+    def describe(self):
+        parts = []
+        if self.created_from or self.created_to:
+            last = (datetime.fromisoformat(self.created_to) - timedelta(days=1)).date() if self.created_to else "now"
+            first = datetime.fromisoformat(self.created_from).date() if self.created_from else "start"
+            parts.append(f"{first} → {last}")
+        if self.shipment_status:
+            parts.append(self.shipment_status.replace('_', ' ').title())
+        if self.payment_status:
+            parts.append(self.payment_status.upper())
+        if self.created_by:
+            parts.append(f"user {self.created_by}")
+        return " · ".join(parts) or "All shipments"
+
+def _day_start(text: str, days: int = 0):
+    day = date.fromisoformat(text) + timedelta(days=days)
+    return datetime.combine(day, time(), tzinfo=timezone.utc).isoformat()
+
+def parse_export_filter(text: str):
+    """
+    'from=2026-01-01 to=2026-01-31 status=booked payment=paid user=123' -> ExportFilter.
+    Every term is optional; 'all' or nothing exports everything. Raises ValueError with a
+    message for staff on an unknown term or value.
+    """
+    values = {}
+    for term in (text or "").split():
+        if term.lower() == "all":
+            continue
+        key, sep, value = term.partition("=")
+        key = key.lower()
+        if not sep or not value:
+            raise ValueError(f"'{term}' is not key=value")
+        try:
+            if key == "from":
+                values["created_from"] = _day_start(value)
+            elif key == "to":
+                values["created_to"] = _day_start(value, days=1)
+            elif key == "status" and value in SHIPMENT_STATUSES:
+                values["shipment_status"] = value
+            elif key == "payment" and value in PAYMENT_STATUSES:
+                values["payment_status"] = value
+            elif key == "user" and value.isdigit():
+                values["created_by"] = int(value)
+            else:
+                raise ValueError
+        except ValueError:
+            raise ValueError(f"Unknown filter '{term}'") from None
+    return ExportFilter(**values)
+
+# Spreadsheets run a cell that starts with one of these as a formula
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+def _cell(value):
+    """Free text that a spreadsheet would read as a formula, quoted with a leading apostrophe."""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+def export_row(s: dict):
+    """
+    One shipment as CSV fields in EXPORT_HEADER order (totals as in generate_summary).
+    Text cells are passed through _cell, since names and parties are typed by customers.
+    """
+    total_usd = round(float(s.get('chargeable_weight') or 0) * float(s.get('sale_rate_usd') or 0), 2)
+    total_etb = round(total_usd * float(s.get('exchange_rate_etb') or 1), 2)
+    owner = (s.get('profiles') or {}).get('full_name')
+    values = [_cell(s.get(c)) for c in EXPORT_COLUMNS]
+    return values[:4] + [_cell(owner)] + values[4:] + [total_usd, total_etb]
+
+async def export_shipments(db, export_filter: ExportFilter):
+    """
+    Writes every shipment matching export_filter to a CSV temp file and returns (file, rows).
+    Rows are fetched Config.EXPORT_PAGE at a time by (created_at, id) keyset, newest first,
+    and written as they arrive, so only one page is held in memory while querying. The
+    caller owns the returned binary spooled file, positioned at the start.
+    """
+    out = tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY)
+    text = io.TextIOWrapper(out, encoding="utf-8-sig", newline="")
+    writer = csv.writer(text)
+    writer.writerow(EXPORT_HEADER)
+    count, cursor, has_more = 0, None, True
+    try:
+        while has_more:
+            rows, has_more = await db.get_shipments_page(
+                limit=Config.EXPORT_PAGE, cursor=cursor, columns=EXPORT_SELECT, **export_filter._asdict()
+            )
+            writer.writerows(export_row(s) for s in rows)
+            count += len(rows)
+            if rows:
+                cursor = (rows[-1]['created_at'], rows[-1]['id'])
+        text.flush()
+    except BaseException:
+        text.close()
+        raise
+    text.detach()
+    out.seek(0)
+    return out, count
@@ -0,0 +1,124 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from telegram import InlineKeyboardMarkup, InputMediaPhoto, InputMediaDocument
+from telegram.error import RetryAfter, Forbidden, BadRequest, TelegramError
+from core.database import db
+from core.utils.rate_limit import TokenBucket
+from core.config import Config
+
+# A claimed row is invisible to other drainers for this long
+OUTBOX_LEASE = 60
+OUTBOX_BATCH = 50
+OUTBOX_MAX_ATTEMPTS = 5
+
+def outbox_message(chat_id, text: str = None, reply_markup: InlineKeyboardMarkup = None,
+                   method: str = "send_message", track: bool = False, **media):
+    """
+    Builds one outbox row for Database.apply_shipment_change.
+    `track=True` writes the delivered message_id back to shipments.admin_message_id.
+    Media methods take photo=/document= (URL or file_id).
+    """
+    payload = dict(media)
+    if text is not None:
+        payload["caption" if method != "send_message" else "text"] = text
+    if reply_markup is not None:
+        payload["reply_markup"] = reply_markup.to_dict()
+    return {"chat_id": str(chat_id), "method": method, "payload": payload, "track_message": track}
+
+def outbox_media_group(chat_id, media: list):
+    """
+    Rows that deliver [{"type": "photo"|"document", "media": file_id}, ...] in as few calls as possible.
+    Telegram only groups items of one kind, so each run of same-typed items becomes one
+    send_media_group; a run of one falls back to send_photo/send_document.
+    """
+    runs = []
+    for item in media:
+        if runs and runs[-1][0]['type'] == item['type']:
+            runs[-1].append(item)
+        else:
+            runs.append([item])
+    rows = []
+    for run in runs:
+        if len(run) == 1:
+            kind = run[0]['type']
+            rows.append(outbox_message(chat_id, method=f"send_{kind}", **{kind: run[0]['media']}))
+        else:
+            rows.append(outbox_message(chat_id, method="send_media_group", media=run))
+    return rows
+
+async def _send(bot, row: dict):
+    payload = dict(row['payload'])
+    if row['method'] == "send_media_group":
+        payload["media"] = [
+            InputMediaPhoto(m['media']) if m['type'] == "photo" else InputMediaDocument(m['media'])
+            for m in payload["media"]
+        ]
+    if "reply_markup" in payload:
+        payload["reply_markup"] = InlineKeyboardMarkup.de_json(payload["reply_markup"], bot)
+    return await getattr(bot, row['method'])(chat_id=row['chat_id'], **payload)
+
+async def _deliver_chat(bot, rows: list, bucket: TokenBucket):
+    """
+    Delivers one chat's messages in queue order so proofs still precede their decision message.
+    Each row is marked sent as soon as Telegram accepts it, so a drainer that dies later in
+    the batch does not send it again. Returns the number delivered.
+    """
+    delivered = 0
+    for i, row in enumerate(rows):
+        await bucket.acquire()
+        attempts = row['attempts'] + 1
+        try:
+            msg = await _send(bot, row)
+        except (Forbidden, BadRequest) as e:
+            # Permanent for this message (bot blocked, bad payload): record it and move on
+            await db.mark_outbox_retry(row['id'], attempts, str(e))
+            continue
+        except TelegramError as e:
+            if isinstance(e, RetryAfter):
+                bucket.pause(e.retry_after)
+                attempts, delay = row['attempts'], e.retry_after
+            else:
+                delay = 2 ** attempts * 5
+                logging.warning(f"Outbox #{row['id']} attempt {attempts} failed: {e}")
+            retry_at = datetime.now(timezone.utc) + timedelta(seconds=delay)
+            await db.mark_outbox_retry(row['id'], attempts, str(e), retry_at if attempts < OUTBOX_MAX_ATTEMPTS else None)
+            # Hold back the rest of this chat's queue so it is not delivered out of order
+            for later in rows[i + 1:]:
+                await db.mark_outbox_retry(later['id'], later['attempts'], "held behind earlier message", retry_at)
+            return delivered
+
+        await db.mark_outbox_sent([row['id']])
+        delivered += 1
+        if row.get('track_message') and row.get('shipment_id'):
+            await db.update_shipment(row['shipment_id'], {"admin_message_id": msg.message_id})
+    return delivered
+
+async def drain_outbox(bot, budget: float = None):
+    """
+    Claims and delivers due outbox rows in batches until none are left or `budget` seconds pass.
+    Chats are served concurrently, each chat strictly in order. Returns the number delivered.
+    """
+    deadline = time.monotonic() + budget if budget else None
+    bucket = TokenBucket(Config.BROADCAST_RATE)
+    delivered = 0
+    while deadline is None or time.monotonic() < deadline:
+        rows = await db.claim_outbox(OUTBOX_BATCH, OUTBOX_LEASE)
+        if not rows:
+            break
+        by_chat = {}
+        for row in rows:
+            by_chat.setdefault(row['chat_id'], []).append(row)
+        counts = await asyncio.gather(*(_deliver_chat(bot, chat_rows, bucket) for chat_rows in by_chat.values()))
+        delivered += sum(counts)
+    return delivered
+
+async def outbox_worker(bot, interval: float = 1):
+    """Long-running drain loop for run_local.py."""
+    while True:
+        try:
+            await drain_outbox(bot)
+        except Exception as e:
+            logging.error(f"Outbox worker error: {str(e)}")
+        await asyncio.sleep(interval)
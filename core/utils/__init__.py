@@ -1,5 +1,5 @@
-from .calculations import calculate_metrics
-from .validators import is_float, validate_dims
+from .calculations import calculate_metrics, dims_metrics, bulk_chargeable
+from .validators import is_float, is_size, is_amount, validate_dims, parse_dim_lines
 from .keyboards import *
 
 # This ensures all utility functions are accessible via core.utils
\ No newline at end of file
@@ -0,0 +1,112 @@
+import json
+import logging
+import httpx
+import time
+from telegram import User
+from telegram.error import RetryAfter, TelegramError
+from telegram.ext import ExtBot
+from telegram.request import HTTPXRequest
+from core.config import Config
+from core.utils.metrics import BOT_API_SECONDS, BOT_API_ERRORS, FLOOD_WAITS
+
+_tls = None
+
+def tls_context():
+    """One SSL context per process: loading the CA bundle is most of the cost of a new httpx client."""
+    global _tls
+    if _tls is None:
+        _tls = httpx.create_ssl_context()
+    return _tls
+
+class SharedTLSRequest(HTTPXRequest):
+    """HTTPXRequest whose client reuses the process-wide SSL context."""
+    __slots__ = ()
+
+    def _build_client(self):
+        return httpx.AsyncClient(verify=tls_context(), **self._client_kwargs)
+
+class CachedBot(ExtBot):
+    """
+    ExtBot whose get_me() is answered from TELEGRAM_BOT_INFO or a local cache file.
+    Application.initialize() calls get_me() on every cold start; the bot's identity never
+    changes, so after the first real call it is not worth a round trip to Telegram.
+    Every Bot API request is also timed here for /metrics.
+    """
+    __slots__ = ()
+
+    def _load_cached_me(self):
+        raw = Config.TELEGRAM_BOT_INFO
+        if not raw:
+            try:
+                with open(Config.BOT_INFO_CACHE) as f:
+                    raw = f.read()
+            except OSError:
+                return None
+        try:
+            data = json.loads(raw)
+        except ValueError:
+            return None
+        # A cache written for another token must not be reused
+        if str(data.get("id")) != self.token.split(":", 1)[0]:
+            return None
+        return User.de_json(data, self)
+
+    def _store_me(self, user: User):
+        try:
+            with open(Config.BOT_INFO_CACHE, "w") as f:
+                json.dump(user.to_dict(), f)
+        except OSError as e:
+            logging.warning(f"Could not cache bot info: {e}")
+
+    async def _post(self, endpoint: str, *args, **kwargs):
+        # Single choke point for every Bot API request: timed and counted for /metrics
+        start = time.perf_counter()
+        try:
+            return await super()._post(endpoint, *args, **kwargs)
+        except RetryAfter:
+            FLOOD_WAITS.inc(method=endpoint)
+            BOT_API_ERRORS.inc(method=endpoint, error="RetryAfter")
+            raise
+        except TelegramError as e:
+            BOT_API_ERRORS.inc(method=endpoint, error=type(e).__name__)
+            raise
+        finally:
+            BOT_API_SECONDS.observe(time.perf_counter() - start, method=endpoint)
+
+    async def get_me(self, *args, **kwargs):
+        if self._bot_user is None:
+            cached = self._load_cached_me()
+            if cached is not None:
+                self._bot_user = cached
+                return cached
+        user = await super().get_me(*args, **kwargs)
+        self._store_me(user)
+        return user
+
+def build_bot(token: str = None):
+    """CachedBot with the same connection pool ApplicationBuilder would give a plain token (one shared SSL context)."""
+    return CachedBot(
+        token or Config.TELEGRAM_TOKEN,
+        request=SharedTLSRequest(connection_pool_size=256),
+        get_updates_request=SharedTLSRequest()
+    )
+
+class FileTooLarge(ValueError):
+    """Raised by stream_file once more than the allowed number of bytes has arrived."""
+
+async def stream_file(file, max_bytes: int, chunk_size: int = 256 * 1024):
+    """
+    Yields a telegram.File's content in chunks straight from the Bot API file endpoint,
+    so it can be piped into an upload without ever holding the whole file.
+    Stops with FileTooLarge as soon as `max_bytes` is exceeded.
+    """
+    received = 0
+    # A separate client: the Storage session carries the Supabase key and must not talk to Telegram
+    async with httpx.AsyncClient(timeout=30, verify=tls_context()) as client:
+        async with client.stream("GET", file.file_path) as res:
+            res.raise_for_status()
+            async for chunk in res.aiter_bytes(chunk_size):
+                received += len(chunk)
+                if received > max_bytes:
+                    raise FileTooLarge(received)
+                yield chunk
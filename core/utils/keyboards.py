@@ -1,4 +1,5 @@
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup
+from core.utils.pagination import encode_mask
 
 def get_main_dashboard(role: str):
     """PERSISTENT BOTTOM MENU (Reply Keyboard)"""
@@ -75,6 +76,24 @@ def get_user_shipment_actions(shipment_id: str, status: str):
         
     return InlineKeyboardMarkup(buttons)
 
+def get_tracking_keyboard(shipments: list, status_code: str, status_label: str,
+                          prev_cursor: str = None, next_cursor: str = None):
+    """'Track My Shipments' page: open buttons, status filter toggle and Prev/Next."""
+    buttons = [
+        [InlineKeyboardButton(f"{i}. ✈️ {s['airline']} | {s['awb_number']}", callback_data=f"trk_v_{s['id']}")]
+        for i, s in enumerate(shipments, 1)
+    ]
+    buttons.append([InlineKeyboardButton(f"📝 {status_label}", callback_data=f"trk_f{status_code}")])
+    nav = []
+    if prev_cursor:
+        nav.append(InlineKeyboardButton("⬅️ Prev", callback_data=f"trk_{status_code}_p_{prev_cursor}"))
+    if next_cursor:
+        nav.append(InlineKeyboardButton("Next ➡️", callback_data=f"trk_{status_code}_n_{next_cursor}"))
+    if nav:
+        buttons.append(nav)
+    buttons.append([InlineKeyboardButton("⬅️ Back to Main Menu", callback_data="back_to_main")])
+    return InlineKeyboardMarkup(buttons)
+
 def get_shipment_approval_keyboard(shipment_id: str):
     """PHASE 1: Admin Rate Approval buttons."""
     return InlineKeyboardMarkup([
@@ -103,16 +122,56 @@ def get_staff_shipment_manage_keyboard(shipment_id: str):
         [InlineKeyboardButton("✅ Mark Completed", callback_data=f"st_upd_completed_{shipment_id}")]
     ])
 
+def get_staff_queue_keyboard(shipments: list, filter_code: str, status_label: str, payment_label: str,
+                             prev_cursor: str = None, next_cursor: str = None):
+    """One page of the Staff Panel queue: open buttons, filter toggles and Prev/Next."""
+    buttons = [
+        [InlineKeyboardButton(f"{i}. ✈️ {s['airline']} | {s['awb_number']}", callback_data=f"adm_qv_{s['id']}")]
+        for i, s in enumerate(shipments, 1)
+    ]
+    buttons.append([
+        InlineKeyboardButton(f"📝 {status_label}", callback_data=f"adm_qf_s{filter_code}"),
+        InlineKeyboardButton(f"💰 {payment_label}", callback_data=f"adm_qf_p{filter_code}")
+    ])
+    nav = []
+    if prev_cursor:
+        nav.append(InlineKeyboardButton("⬅️ Prev", callback_data=f"adm_q_{filter_code}_p_{prev_cursor}"))
+    if next_cursor:
+        nav.append(InlineKeyboardButton("Next ➡️", callback_data=f"adm_q_{filter_code}_n_{next_cursor}"))
+    if nav:
+        buttons.append(nav)
+    buttons.append([InlineKeyboardButton("🔎 Search Shipments", callback_data="adm_search")])
+    buttons.append([InlineKeyboardButton("⬅️ Back to Main Menu", callback_data="back_to_main")])
+    return InlineKeyboardMarkup(buttons)
+
+def get_search_results_keyboard(shipments: list):
+    """Search hits in rank order; each opens the Staff Panel management view."""
+    buttons = [
+        [InlineKeyboardButton(f"{i}. ✈️ {s['airline']} | {s['awb_number']}", callback_data=f"adm_qv_{s['id']}")]
+        for i, s in enumerate(shipments, 1)
+    ]
+    buttons.append([InlineKeyboardButton("🔎 New Search", callback_data="adm_search")])
+    buttons.append([InlineKeyboardButton("⬅️ Back to Main Menu", callback_data="back_to_main")])
+    return InlineKeyboardMarkup(buttons)
+
 def get_admin_settings_menu():
     """Master Admin settings keyboard."""
     return InlineKeyboardMarkup([
         [InlineKeyboardButton("📈 Change Exchange Rate", callback_data="set_ex_rate")],
-        [InlineKeyboardButton("👥 Manage All Users", callback_data="adm_users")],
+        [InlineKeyboardButton("👥 Pending User Approvals", callback_data="adm_users")],
         [InlineKeyboardButton("📢 Send Announcement", callback_data="adm_broadcast")],
+        [InlineKeyboardButton("📥 Bulk Import Shipments", callback_data="adm_import")],
+        [InlineKeyboardButton("📤 Export Shipments (CSV)", callback_data="adm_export")],
         [InlineKeyboardButton("📊 View System Stats", callback_data="adm_stats")],
         [InlineKeyboardButton("⬅️ Back to Main", callback_data="back_to_main")]
     ])
 
+def get_broadcast_progress_keyboard(job_id: int):
+    """Lets an admin push a paused broadcast forward by hand (serverless invocations are time-boxed)."""
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton("▶️ Continue Delivery", callback_data=f"adm_bc_{job_id}")]
+    ])
+
 def get_user_approval_keyboard(user_id: int):
     """Inline management for user approval requests."""
     return InlineKeyboardMarkup([
@@ -121,6 +180,38 @@ def get_user_approval_keyboard(user_id: int):
         [InlineKeyboardButton("🚫 Block", callback_data=f"usr_block_{user_id}")]
     ])
 
+def get_pending_users_keyboard(users: list, after: str, until: str, mask: int, has_more: bool):
+    """
+    Pending approvals page: per-row select toggles, bulk actions and paging.
+    after/until are the page's keyset bounds so every action re-reads exactly the rows shown.
+    """
+    buttons = []
+    for i, u in enumerate(users):
+        mark = "☑️" if mask & (1 << i) else "⬜"
+        buttons.append([InlineKeyboardButton(
+            f"{mark} {i + 1}. {u['full_name']}",
+            callback_data=f"adm_ps_{after}_{until}_{encode_mask(mask ^ (1 << i))}"
+        )])
+    if users:
+        buttons.append([
+            InlineKeyboardButton("✅ Approve Page as User", callback_data=f"adm_pa_u_{after}_{until}"),
+            InlineKeyboardButton("👔 Approve Page as Staff", callback_data=f"adm_pa_s_{after}_{until}")
+        ])
+        selected = bin(mask).count("1")
+        buttons.append([InlineKeyboardButton(
+            f"🚫 Block Selected ({selected})",
+            callback_data=f"adm_pb_{after}_{until}_{encode_mask(mask)}_{len(users)}"
+        )])
+    nav = []
+    if after != "-":
+        nav.append(InlineKeyboardButton("⏮ First", callback_data="adm_pl_-"))
+    if has_more:
+        nav.append(InlineKeyboardButton("Next ➡️", callback_data=f"adm_pl_{until}"))
+    if nav:
+        buttons.append(nav)
+    buttons.append([InlineKeyboardButton("⬅️ Back to Main Menu", callback_data="back_to_main")])
+    return InlineKeyboardMarkup(buttons)
+
 def get_back_to_main():
     """Simple navigation button to return to dashboard."""
     return InlineKeyboardMarkup([[InlineKeyboardButton("⬅️ Back to Main Menu", callback_data="back_to_main")]])
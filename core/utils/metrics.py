@@ -0,0 +1,130 @@
+import asyncio
+import functools
+import inspect
+import time
+from contextlib import asynccontextmanager
+
+# Latency buckets in seconds: webhook handlers live between a few ms and the function time limit
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REGISTRY = []
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _labels(names, values, extra=""):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Counter:
+    """Monotonic count per label set, in the Prometheus text format."""
+    def __init__(self, name: str, doc: str, labels: tuple = ()):
+        self.name, self.doc, self.labels = name, doc, labels
+        self.values = {}
+        REGISTRY.append(self)
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels[n] for n in self.labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{_labels(self.labels, key)} {value}")
+        return lines
+
+class Histogram:
+    """Cumulative-bucket latency histogram per label set."""
+    def __init__(self, name: str, doc: str, labels: tuple = (), buckets: tuple = BUCKETS):
+        self.name, self.doc, self.labels, self.buckets = name, doc, labels, buckets
+        self.series = {}  # label values -> [bucket counts..., sum, count]
+        REGISTRY.append(self)
+
+    def observe(self, seconds: float, **labels):
+        key = tuple(labels[n] for n in self.labels)
+        row = self.series.get(key)
+        if row is None:
+            row = self.series[key] = [0] * len(self.buckets) + [0.0, 0]
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                row[i] += 1
+        row[-2] += seconds
+        row[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} histogram"]
+        for key, row in sorted(self.series.items()):
+            for bound, count in zip(self.buckets, row):
+                le = _labels(self.labels, key, 'le="%s"' % bound)
+                lines.append(f"{self.name}_bucket{le} {count}")
+            le = _labels(self.labels, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{le} {row[-1]}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, key)} {row[-2]}")
+            lines.append(f"{self.name}_count{_labels(self.labels, key)} {row[-1]}")
+        return lines
+
+def render():
+    """Every registered metric in the Prometheus exposition format (served on /metrics)."""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+HANDLER_SECONDS = Histogram("aerp_handler_seconds", "Time spent in a routed handler.", ("handler",))
+HANDLER_ERRORS = Counter("aerp_handler_errors_total", "Handlers that raised.", ("handler",))
+ROUTE_HITS = Counter("aerp_route_hits_total", "Updates dispatched per route key.", ("route",))
+DB_SECONDS = Histogram("aerp_db_seconds", "Duration of Database method calls.", ("method",))
+DB_ERRORS = Counter("aerp_db_errors_total", "Database method calls that raised.", ("method",))
+BOT_API_SECONDS = Histogram("aerp_bot_api_seconds", "Duration of outgoing Bot API requests.", ("method",))
+BOT_API_ERRORS = Counter("aerp_bot_api_errors_total", "Bot API requests that failed.", ("method", "error"))
+DUPLICATE_UPDATES = Counter("aerp_duplicate_updates_total", "Redelivered updates dropped before routing.", ("source",))
+FLOOD_WAITS = Counter("aerp_flood_waits_total", "RetryAfter (flood control) responses.", ("method",))
+
+@asynccontextmanager
+async def timed(histogram: Histogram, errors: Counter, **labels):
+    """Observes the block's duration; an exception is counted in `errors` and re-raised."""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        errors.inc(**labels)
+        raise
+    finally:
+        histogram.observe(time.perf_counter() - start, **labels)
+
+def instrument_methods(cls, histogram: Histogram, errors: Counter, label: str = "method"):
+    """Wraps every public coroutine method of `cls` so each call is timed under its name."""
+    for name, fn in list(vars(cls).items()):
+        if name.startswith("_") or not inspect.iscoroutinefunction(fn):
+            continue
+        def wrap(fn, name=name):
+            @functools.wraps(fn)
+            async def wrapper(*args, **kwargs):
+                async with timed(histogram, errors, **{label: name}):
+                    return await fn(*args, **kwargs)
+            return wrapper
+        setattr(cls, name, wrap(fn))
+    return cls
+
+async def serve_metrics(host: str = "127.0.0.1", port: int = 9100):
+    """Bare asyncio HTTP listener answering GET /metrics, for polling mode where there is no web app."""
+    async def handle(reader, writer):
+        try:
+            request_line = await reader.readline()
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass  # headers are not needed
+            parts = request_line.split()
+            if len(parts) > 1 and parts[1] == b"/metrics":
+                status, body = "200 OK", render().encode()
+            else:
+                status, body = "404 Not Found", b""
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+        finally:
+            writer.close()
+    return await asyncio.start_server(handle, host, port)
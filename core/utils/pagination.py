@@ -0,0 +1,73 @@
+from datetime import datetime, timezone
+
+# Lifecycle values, in order. Indexes double as the one-character filter codes in callback data.
+SHIPMENT_STATUSES = ['quotation_created', 'rate_approved', 'payment_received', 'booked', 'uplifted', 'completed']
+PAYMENT_STATUSES = ['unpaid', 'paid']
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_DIGITS = "0123456789abcdefghijklmnopqrstuvwxyz"
+
+def _to_base36(n: int):
+    out = ""
+    while True:
+        n, r = divmod(n, 36)
+        out = _DIGITS[r] + out
+        if not n:
+            return out
+
+def _encode_ts(iso: str):
+    delta = datetime.fromisoformat(iso) - _EPOCH
+    return _to_base36((delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds)
+
+def _decode_ts(token: str):
+    micros = int(token, 36)
+    created = datetime.fromtimestamp(micros // 1_000_000, tz=timezone.utc).replace(microsecond=micros % 1_000_000)
+    return created.isoformat()
+
+def encode_cursor(row: dict):
+    """
+    Compact keyset cursor for a shipment row: '<created_at micros base36>.<uuid hex>'.
+    Fits in Telegram's 64-byte callback_data together with the filter codes.
+    """
+    return f"{_encode_ts(row['created_at'])}.{row['id'].replace('-', '')}"
+
+def decode_cursor(token: str):
+    """Inverse of encode_cursor. Returns (created_at ISO string, shipment UUID)."""
+    ts, hex_id = token.split(".")
+    sid = f"{hex_id[:8]}-{hex_id[8:12]}-{hex_id[12:16]}-{hex_id[16:20]}-{hex_id[20:]}"
+    return _decode_ts(ts), sid
+
+def encode_user_cursor(row: dict):
+    """Keyset cursor for a profile row: '<created_at micros base36>.<telegram_id base36>'."""
+    return f"{_encode_ts(row['created_at'])}.{_to_base36(row['telegram_id'])}"
+
+def decode_user_cursor(token: str):
+    """Inverse of encode_user_cursor. Returns (created_at ISO string, telegram_id)."""
+    ts, tid = token.split(".")
+    return _decode_ts(ts), int(tid, 36)
+
+def encode_mask(mask: int):
+    """Selection bitmask (bit i = row i of the page) as base36."""
+    return _to_base36(mask)
+
+def decode_mask(token: str):
+    return int(token, 36)
+
+def encode_filter(shipment_status: str = None, payment_status: str = None):
+    """Two-character filter code: one slot per status column, '-' meaning 'all'."""
+    s = str(SHIPMENT_STATUSES.index(shipment_status)) if shipment_status else "-"
+    p = str(PAYMENT_STATUSES.index(payment_status)) if payment_status else "-"
+    return s + p
+
+def decode_filter(code: str):
+    """Inverse of encode_filter. Returns (shipment_status, payment_status)."""
+    s = SHIPMENT_STATUSES[int(code[0])] if code[0] != "-" else None
+    p = PAYMENT_STATUSES[int(code[1])] if code[1] != "-" else None
+    return s, p
+
+def next_filter_value(values: list, current: str = None):
+    """Cycles All -> values[0] -> ... -> values[-1] -> All (used by the filter buttons)."""
+    if current is None:
+        return values[0]
+    idx = values.index(current) + 1
+    return values[idx] if idx < len(values) else None
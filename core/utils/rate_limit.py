@@ -0,0 +1,35 @@
+import asyncio
+import time
+
+class TokenBucket:
+    """
+    Async token bucket shared by every sender in a delivery run.
+    `rate` tokens refill per second up to `capacity`; pause() makes all callers
+    wait out a Telegram RetryAfter before the next token is handed out.
+    """
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def pause(self, seconds: float):
+        """Global back-off (e.g. RetryAfter): no token is granted for `seconds`."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0
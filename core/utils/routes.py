@@ -0,0 +1,128 @@
+from typing import NamedTuple
+
+class Route(NamedTuple):
+    """
+    A profile state or callback_data string, parsed once.
+    `key` is the dispatch-table entry that matched ("rate_apprv_", "SHIP_ORIGIN_",
+    "confirm_shipment", ...); the remaining fields depend on that entry's layout.
+    """
+    key: str
+    ship_id: str = None
+    field: str = None
+    args: tuple = ()
+
+    @property
+    def action(self):
+        return self.key.rstrip("_")
+
+# --- PARSERS: the text after the matched key -> Route fields ---
+
+def _plain(rest: str):
+    return {}
+
+def _ship(rest: str):
+    # {shipment id}
+    return {"ship_id": rest}
+
+def _field(rest: str):
+    # {field}
+    return {"field": rest}
+
+def _field_ship(rest: str):
+    # {field}_{shipment id}
+    field, _, ship_id = rest.partition("_")
+    return {"field": field, "ship_id": ship_id}
+
+def _args(rest: str):
+    # any '_'-separated parameters
+    return {"args": tuple(rest.split("_"))}
+
+def _flag_args(rest: str):
+    # {one-character flag}{parameter}, e.g. adm_qf_s{filter}
+    return {"field": rest[:1], "args": (rest[1:],)}
+
+class PrefixTable:
+    """
+    Longest-prefix lookup compiled once: exact keys are a dict hit, prefix keys are tried
+    from the longest length down, so the cost is one dict probe per distinct key length.
+    """
+    def __init__(self, exact: dict, prefixes: dict):
+        self.exact = exact
+        self.prefixes = prefixes
+        self.lengths = sorted({len(p) for p in prefixes}, reverse=True)
+
+    def match(self, text: str):
+        """Returns (key, value, rest) for the best entry, or None."""
+        if text in self.exact:
+            return text, self.exact[text], ""
+        for n in self.lengths:
+            value = self.prefixes.get(text[:n])
+            if value is not None:
+                return text[:n], value, text[n:]
+        return None
+
+    def parse(self, text: str):
+        """Parses text into a Route using the matched entry's parser, or returns None."""
+        hit = self.match(text) if text else None
+        if hit is None:
+            return None
+        key, parser, rest = hit
+        return Route(key, **parser(rest))
+
+# Every state the bot stores in profiles.state
+STATES = PrefixTable(
+    exact={name: _plain for name in (
+        "SHIP_AIRLINE", "REG_NAME", "REG_COMPANY", "SET_EXCHANGE", "ADM_BROADCAST", "ADM_SEARCH",
+        "ADM_IMPORT", "ADM_EXPORT"
+    )},
+    prefixes={
+        **{f"SHIP_{step}_": _ship for step in (
+            "AIRLINE", "ORIGIN", "DEST", "AWB", "PIECES", "GROSS", "CHARGEABLE",
+            "DIMS", "RATES", "SHIPPER", "CONSIGNEE", "NOTIFY", "CONFIRM"
+        )},
+        "EDIT_INPUT_": _field_ship,
+        "UPLOAD_": _field_ship,
+        "REJECT_": _field_ship,
+    }
+)
+
+# Every callback_data the keyboards emit
+CALLBACKS = PrefixTable(
+    exact={name: _plain for name in (
+        "confirm_shipment", "open_edit_menu", "back_to_summary", "back_step", "cancel_wizard",
+        "adm_stats", "adm_users", "adm_broadcast", "adm_search", "adm_import", "adm_export",
+        "set_ex_rate", "admin_settings",
+        "new_shipment", "track_shipment", "view_profile", "staff_panel", "back_to_main"
+    )},
+    prefixes={
+        "edit_field_": _field,
+        "edit_hist_": _ship,
+        "start_upload_": _ship,
+        "rate_apprv_": _ship,
+        "rate_rejct_": _ship,
+        "pay_apprv_": _ship,
+        "pay_rejct_": _ship,
+        "st_upd_": _field_ship,
+        "usr_apprv_": _args,
+        "usr_block_": _args,
+        "adm_pl_": _args,
+        "adm_ps_": _args,
+        "adm_pa_": _args,
+        "adm_pb_": _args,
+        "adm_bc_": _args,
+        "adm_q_": _args,
+        "adm_qf_": _flag_args,
+        "adm_qv_": _ship,
+        "trk_v_": _ship,
+        "trk_f": _args,
+        "trk_": _args,
+    }
+)
+
+def parse_state(state: str):
+    """Route for a profiles.state value (None when empty or unknown)."""
+    return STATES.parse(state)
+
+def parse_callback(data: str):
+    """Route for an inline button's callback_data (None when unknown)."""
+    return CALLBACKS.parse(data)
@@ -0,0 +1,87 @@
+import asyncio
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+from core.config import Config
+
+def update_key(update: object):
+    """The ordering key of an update: its user, else its chat, else None (no ordering needed)."""
+    if not isinstance(update, Update):
+        return None
+    if update.effective_user:
+        return update.effective_user.id
+    if update.effective_chat:
+        return update.effective_chat.id
+    return None
+
+def raw_update_key(data: dict):
+    """update_key on an update's raw JSON, without building PTB objects (serve.py shards on it)."""
+    for value in data.values():
+        if not isinstance(value, dict):
+            continue
+        sender = value.get("from") or value.get("user")
+        if sender:
+            return sender.get("id")
+        chat = value.get("chat") or (value.get("message") or {}).get("chat")
+        if chat:
+            return chat.get("id")
+    return None
+
+class _Lane:
+    """One key's FIFO lock and the number of updates holding or waiting for it."""
+    __slots__ = ("lock", "users")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.users = 0
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """
+    Runs updates from different users concurrently but each user's updates one at a time,
+    in arrival order. Handlers read and write profiles.state, so two quick messages from one
+    user must not overlap.
+
+    `concurrency` is how many handlers run at once (the processor's own slots). `max_pending`
+    is only the size of PTB's outer semaphore, which BaseUpdateProcessor.process_update holds
+    around do_process_update, including while an update waits for its user's lane. It does
+    not slow PTB's fetcher, which starts a task per update; tasks past the limit queue on it.
+    An update takes its user's lane first and a slot only after that, so one user with a
+    backlog holds a single slot and cannot starve the rest. asyncio's Semaphore and Lock both
+    wake waiters first in, first out, and PTB hands updates over in fetch order, so a lane
+    keeps the order in which updates arrived.
+    """
+    __slots__ = ("_slots", "_lanes")
+
+    def __init__(self, concurrency: int, max_pending: int = None):
+        super().__init__(max(max_pending or 0, concurrency))
+        self._slots = asyncio.Semaphore(concurrency)
+        self._lanes = {}
+
+    async def do_process_update(self, update: object, coroutine):
+        key = update_key(update)
+        if key is None:
+            async with self._slots:
+                await coroutine
+            return
+
+        lane = self._lanes.get(key)
+        if lane is None:
+            lane = self._lanes[key] = _Lane()
+        lane.users += 1
+        try:
+            async with lane.lock:
+                async with self._slots:
+                    await coroutine
+        finally:
+            lane.users -= 1
+            if not lane.users:
+                del self._lanes[key]
+
+    async def initialize(self):
+        """Nothing to allocate: lanes are created on demand and dropped when idle."""
+
+    async def shutdown(self):
+        """Nothing to release: PTB waits for running updates before shutting down."""
+
+def build_update_processor():
+    """The processor both entry points use, sized from UPDATE_CONCURRENCY / UPDATE_MAX_PENDING."""
+    return PerUserUpdateProcessor(Config.UPDATE_CONCURRENCY, Config.UPDATE_MAX_PENDING)
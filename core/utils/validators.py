@@ -1,3 +1,4 @@
+import math
 import re
 
 def is_float(value):
@@ -8,6 +9,20 @@ def is_float(value):
     except (ValueError, TypeError):
         return False
 
+def is_size(value):
+    """Checks if a string is a usable dimension: a finite number above zero (not 'nan' or 'inf')."""
+    try:
+        return 0 < float(value) < math.inf
+    except (ValueError, TypeError):
+        return False
+
+def is_amount(value):
+    """Checks if a string is a usable weight or rate: a finite number, zero or above (not 'nan' or 'inf')."""
+    try:
+        return 0 <= float(value) < math.inf
+    except (ValueError, TypeError):
+        return False
+
 def validate_dims(text):
     """
     Flexible Dimension Validator.
@@ -20,7 +35,39 @@ def validate_dims(text):
     # Remove any empty strings (e.g. if user typed '120 * 80 * 100')
     parts = [p for p in parts if p]
 
-    if len(parts) == 3 and all(is_float(p) for p in parts):
+    if len(parts) == 3 and all(is_size(p) for p in parts):
         return [float(p) for p in parts]
     
-    return None
\ No newline at end of file
+    return None
+
+
+# A consignment may list many sizes; more lines than this is a bulk import, not a chat message
+MAX_DIM_LINES = 50
+
+def parse_dim_lines(text, default_pieces=1):
+    """
+    Multi-line dimensions, one size per line (or ';'-separated): 'L x W x H x Pcs'.
+    Separators are the same as validate_dims. A line without a piece count is one piece,
+    except a single 'LxWxH' entry, which covers all `default_pieces` (the old one-size form).
+    Returns a list of {length_cm, width_cm, height_cm, pieces} dicts, or None if any line is invalid.
+    """
+    rows = [row for row in re.split(r'[\n;]', text or "") if row.strip()]
+    if not rows or len(rows) > MAX_DIM_LINES:
+        return None
+
+    lines = []
+    for row in rows:
+        parts = [p for p in re.split(r'[x*X\s/,-]', row.strip()) if p]
+        if len(parts) not in (3, 4) or not all(is_size(p) for p in parts[:3]):
+            return None
+        l, w, h = (float(p) for p in parts[:3])
+        if len(parts) == 4:
+            if not parts[3].isdigit():
+                return None
+            pcs = int(parts[3])
+        else:
+            pcs = int(default_pieces or 1) if len(rows) == 1 else 1
+        if pcs <= 0:
+            return None
+        lines.append({"length_cm": l, "width_cm": w, "height_cm": h, "pieces": pcs})
+    return lines
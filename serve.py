@@ -0,0 +1,197 @@
+"""
+AERP SERVER MODE
+
+A long-running webhook server for one machine with several cores:
+
+    python serve.py --workers 4 --port 8000
+    python serve.py --sqlite --port 8000      (local SQLite file, one worker)
+
+The front process is a small uvicorn/FastAPI app. It accepts Telegram's POSTs on /api/index
+(the same URL as the Vercel deployment) and only reads the sender from the JSON. It then
+puts the raw update on that sender's worker queue and answers at once. Each of the N
+worker processes runs one PTB Application with the routers, one warm database client and
+one pooled Bot API connection, shared by every update it handles. Updates are sharded by
+user id, so a user always lands on the same worker. There PerUserUpdateProcessor keeps
+that user's updates in order while other users run concurrently. On shutdown the front
+stops taking requests and tells each worker to finish what it already accepted.
+"""
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import sys
+
+# `--sqlite` keeps all data in a local SQLite file, as in run_local.py. Set here so that
+# spawned workers inherit it before core.database builds `db`. It runs one worker only.
+if "--sqlite" in sys.argv:
+    os.environ["DATABASE_BACKEND"] = "sqlite"
+
+from fastapi import FastAPI, Request, Response
+from core.config import Config
+from core.utils.scheduler import raw_update_key
+
+logging.basicConfig(
+    format='%(asctime)s - %(processName)s - %(name)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+
+# --- WORKER PROCESS ---
+
+async def run_worker(index: int, updates):
+    """
+    Feeds one shard's updates into a PTB Application until the front sends None, then
+    drains. Updates already taken from the queue are finished before the database and
+    Bot API connections close.
+    """
+    from telegram import Update
+    from telegram.ext import Application
+    from core.database import db
+    from core.utils.bot import build_bot
+    from core.utils.scheduler import build_update_processor
+    from core.handlers.router import register_handlers
+    from core.services.broadcast import broadcast_worker
+    from core.services.outbox import outbox_worker
+    from core.utils.metrics import serve_metrics
+
+    application = Application.builder().bot(build_bot()).concurrent_updates(build_update_processor()).build()
+    register_handlers(application)
+    await application.initialize()
+
+    # Every worker drains the outbox (claims are leased). Only worker 0 delivers broadcasts,
+    # because BROADCAST_RATE is enforced per process.
+    background = [asyncio.create_task(outbox_worker(application.bot))]
+    if index == 0:
+        background.append(asyncio.create_task(broadcast_worker(application.bot)))
+    metrics_server = await serve_metrics(port=Config.METRICS_PORT + index)
+
+    loop = asyncio.get_running_loop()
+    admitted = asyncio.Semaphore(Config.UPDATE_MAX_PENDING)
+    running = set()
+
+    async def process(update):
+        try:
+            await application.update_processor.process_update(update, application.process_update(update))
+        except Exception as e:
+            logging.error(f"Worker {index} update {update.update_id} failed: {e}")
+        finally:
+            admitted.release()
+
+    def next_update():
+        # Wakes up every second so a worker whose front died does not wait forever
+        while True:
+            try:
+                return updates.get(timeout=1)
+            except queue.Empty:
+                parent = multiprocessing.parent_process()
+                if parent is not None and not parent.is_alive():
+                    return None
+
+    logging.info(f"Worker {index} ready (metrics on :{Config.METRICS_PORT + index})")
+    try:
+        while True:
+            raw = await loop.run_in_executor(None, next_update)
+            if raw is None:
+                break
+            try:
+                update = Update.de_json(json.loads(raw), application.bot)
+            except Exception as e:
+                logging.error(f"Worker {index} dropped an unreadable update: {e}")
+                continue
+            # Backpressure: at most UPDATE_MAX_PENDING updates in flight; the shard queue holds the rest
+            await admitted.acquire()
+            task = asyncio.create_task(process(update))
+            running.add(task)
+            task.add_done_callback(running.discard)
+
+        logging.info(f"Worker {index} draining {len(running)} updates")
+        await asyncio.gather(*running)
+    finally:
+        for task in background:
+            task.cancel()
+        metrics_server.close()
+        await application.shutdown()
+        await db.close()
+        logging.info(f"Worker {index} stopped")
+
+def worker_main(index: int, updates):
+    """Process entry point. Signals go to the front, which drains the workers in order."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    asyncio.run(run_worker(index, updates))
+
+# --- FRONT PROCESS ---
+
+app = FastAPI(docs_url=None, redoc_url=None, openapi_url=None)
+shards = []   # one bounded multiprocessing.Queue per worker
+workers = []
+
+@app.on_event("startup")
+async def start_workers():
+    ctx = multiprocessing.get_context("spawn")
+    for index in range(Config.SERVER_WORKERS):
+        updates = ctx.Queue(maxsize=Config.SERVER_QUEUE_SIZE)
+        process = ctx.Process(target=worker_main, args=(index, updates), name=f"aerp-worker-{index}")
+        process.start()
+        shards.append(updates)
+        workers.append(process)
+
+@app.on_event("shutdown")
+async def drain_workers():
+    """Graceful drain: uvicorn has stopped accepting requests; each worker finishes its queue."""
+    loop = asyncio.get_running_loop()
+    for updates in shards:
+        try:
+            await loop.run_in_executor(None, updates.put, None, True, Config.SERVER_DRAIN_TIMEOUT)
+        except queue.Full:
+            pass  # that worker is stuck; it is terminated below
+    for process in workers:
+        await loop.run_in_executor(None, process.join, Config.SERVER_DRAIN_TIMEOUT)
+        if process.is_alive():
+            logging.warning(f"{process.name} did not drain in {Config.SERVER_DRAIN_TIMEOUT}s, terminating")
+            process.terminate()
+
+@app.post("/api/index")
+async def webhook(request: Request):
+    """Hands the update to its user's worker and answers Telegram immediately."""
+    raw = await request.body()
+    try:
+        data = json.loads(raw)
+    except ValueError:
+        return Response(status_code=400)
+    key = raw_update_key(data)
+    shard = shards[(key if key is not None else data.get("update_id", 0)) % len(shards)]
+    try:
+        shard.put_nowait(raw)
+    except queue.Full:
+        # Telegram retries non-2xx responses later; the update_id dedup absorbs any overlap
+        return Response(status_code=503)
+    return {"status": "success"}
+
+@app.get("/")
+async def index():
+    alive = sum(process.is_alive() for process in workers)
+    return {"message": f"AERP server mode: {alive}/{len(workers)} workers alive."}
+
+def main():
+    import uvicorn
+    args = sys.argv[1:]
+
+    def option(name, default):
+        return args[args.index(name) + 1] if name in args else default
+
+    sqlite = Config.DATABASE_BACKEND == "sqlite"
+    Config.SERVER_WORKERS = int(option("--workers", 1 if sqlite else Config.SERVER_WORKERS))
+    if sqlite and Config.SERVER_WORKERS > 1:
+        # Each worker would hold its own blocking connection to one file; concurrent writers
+        # stall the event loop and fail with "database is locked"
+        sys.exit("--sqlite runs a single worker; drop --workers or use the Supabase backend.")
+    print(f"🚀 Starting AERP Server Mode: {Config.SERVER_WORKERS} workers")
+    print(f"🗄 Database backend: {Config.DATABASE_BACKEND}")
+    # One front process: sharding needs a single owner of the worker queues
+    uvicorn.run(app, host=option("--host", "0.0.0.0"), port=int(option("--port", "8000")), workers=1)
+
+if __name__ == "__main__":
+    main()
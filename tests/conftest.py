@@ -0,0 +1,44 @@
+"""
+Shared fixtures. The tests run the real handlers against the embedded SQLite backend and a
+bot whose Bot API calls are answered locally, so no network or Supabase project is needed:
+
+    pip install -r requirements-dev.txt
+    python -m pytest -q
+"""
+import os
+
+# Config and the shared `db` are built at import time, so the environment is set first
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "123456:test")
+os.environ.setdefault("SUPABASE_URL", "https://test.supabase.co")
+os.environ.setdefault("SUPABASE_KEY", "test.key.local")
+os.environ["DATABASE_BACKEND"] = "sqlite"
+
+import pytest_asyncio
+from telegram.ext import ExtBot
+from core.database import db
+
+BOT_USER = {"id": 123456, "is_bot": True, "first_name": "AERP", "username": "aerp_test_bot"}
+
+class StubBot(ExtBot):
+    """ExtBot whose Bot API calls are answered locally; PTB still builds and parses every object."""
+    __slots__ = ()
+
+    async def _post(self, endpoint: str, data: dict = None, *args, **kwargs):
+        if endpoint == "getMe":
+            return BOT_USER
+        if endpoint in ("sendMessage", "editMessageText"):
+            chat_id = (data or {}).get("chat_id", 0)
+            return {"message_id": 1, "date": 0, "chat": {"id": chat_id, "type": "private"},
+                    "from": BOT_USER, "text": (data or {}).get("text", "")}
+        return True
+
+@pytest_asyncio.fixture
+async def sqlite_db(tmp_path):
+    """Points the shared SQLite `db` at a fresh file for one test."""
+    db.path = str(tmp_path / "aerp.sqlite3")
+    db.storage_dir = tmp_path / "storage"
+    db._settings = None
+    try:
+        yield db
+    finally:
+        await db.close()
@@ -0,0 +1,154 @@
+import asyncio
+import itertools
+import random
+from collections import defaultdict
+import pytest
+from telegram import Update
+from telegram.ext import Application, SimpleUpdateProcessor
+from core.handlers import router
+from core.handlers.router import register_handlers
+from core.utils.scheduler import PerUserUpdateProcessor, update_key, raw_update_key
+from tests.conftest import StubBot
+
+# update_ids are never reused: the de-duplication LRU is process-wide
+UPDATE_IDS = itertools.count(1)
+
+def message(user_id: int, text: str):
+    return {"update_id": next(UPDATE_IDS), "message": {
+        "message_id": 1, "date": 0, "chat": {"id": user_id, "type": "private"},
+        "from": {"id": user_id, "is_bot": False, "first_name": "Test"}, "text": text,
+    }}
+
+def interleaved(users: list, steps: list):
+    """Step 1 of every user, then step 2 of every user, ...: (user_id, text) in arrival order."""
+    return [(uid, step(uid)) for step in steps for uid in users]
+
+def test_update_key():
+    bot = StubBot("123456:test")
+    assert update_key(Update.de_json(message(7, "hi"), bot)) == 7
+    post = {"update_id": 1, "channel_post": {"message_id": 1, "date": 0, "chat": {"id": -100, "type": "channel"}}}
+    assert update_key(Update.de_json(post, bot)) == -100
+    assert update_key("not an update") is None
+
+def test_raw_update_key_matches_update_key():
+    bot = StubBot("123456:test")
+    callback = {"update_id": 2, "callback_query": {
+        "id": "1", "chat_instance": "c", "data": "x", "from": {"id": 9, "is_bot": False, "first_name": "T"},
+        "message": {"message_id": 1, "date": 0, "chat": {"id": 5, "type": "private"}},
+    }}
+    post = {"update_id": 3, "channel_post": {"message_id": 1, "date": 0, "chat": {"id": -100, "type": "channel"}}}
+    for raw in (message(7, "hi"), callback, post):
+        assert raw_update_key(raw) == update_key(Update.de_json(raw, bot))
+    assert raw_update_key({"update_id": 4}) is None
+
+@pytest.mark.asyncio
+async def test_lanes_keep_order_and_bound_concurrency():
+    processor = PerUserUpdateProcessor(concurrency=3, max_pending=100)
+    bot = StubBot("123456:test")
+    rng = random.Random(1)
+    seen, active, running = defaultdict(list), set(), {"now": 0, "peak": 0}
+
+    async def handle(uid: int, seq: int):
+        assert uid not in active, "two updates of one user overlapped"
+        active.add(uid)
+        running["now"] += 1
+        running["peak"] = max(running["peak"], running["now"])
+        seen[uid].append(seq)
+        await asyncio.sleep(rng.uniform(0, 0.003))
+        running["now"] -= 1
+        active.discard(uid)
+
+    users = list(range(1, 9))
+    updates = [(uid, seq) for seq in range(10) for uid in users]
+    await asyncio.gather(*(
+        processor.process_update(Update.de_json(message(uid, str(seq)), bot), handle(uid, seq))
+        for uid, seq in updates
+    ))
+
+    assert all(seen[uid] == list(range(10)) for uid in users)
+    assert 1 < running["peak"] <= 3
+    assert not processor._lanes
+
+WIZARD_STEPS = [
+    lambda uid: f"Airline {uid}",
+    lambda uid: f"Origin {uid}",
+    lambda uid: f"Destination {uid}",
+    lambda uid: f"071-{uid:08d}",
+    lambda uid: str(uid % 4 + 2),
+    lambda uid: str(100 + uid),
+    lambda uid: f"120x80x100x1\n60x40x{uid}x{uid % 4 + 1}",
+    lambda uid: "4.5, 5.2",
+    lambda uid: f"Shipper {uid}",
+    lambda uid: f"Consignee {uid}",
+    lambda uid: f"Notify {uid}",
+]
+
+async def feed(application, users: list, concurrent: bool):
+    async with application:
+        updates = [Update.de_json(message(uid, text), application.bot) for uid, text in interleaved(users, WIZARD_STEPS)]
+        if concurrent:
+            # As the webhook does: every update goes through the processor at once
+            await asyncio.gather(*(
+                application.update_processor.process_update(u, application.process_update(u)) for u in updates
+            ))
+        else:
+            for u in updates:
+                await application.process_update(u)
+
+async def run_wizards(database, processor, monkeypatch, concurrent: bool):
+    """
+    Sends every user's wizard answers, interleaved across users, and returns
+    ({user: texts in the order handlers saw them}, {user: (state, draft)}).
+    Draft ids are random per run, so they are replaced by a placeholder.
+    """
+    users = list(range(101, 113))
+    for uid in users:
+        await database.create_user({"telegram_id": uid, "full_name": f"User {uid}", "role": "user",
+                                    "is_approved": True, "state": "SHIP_AIRLINE",
+                                    "created_at": "2026-01-01T00:00:00+00:00"})
+
+    observed = defaultdict(list)
+    dispatch = router.dispatch
+
+    async def recording(handler, update, context):
+        observed[update.effective_user.id].append(update.message.text)
+        await dispatch(handler, update, context)
+
+    application = Application.builder().bot(StubBot("123456:test")).updater(None) \
+        .concurrent_updates(processor).build()
+    register_handlers(application)
+    with monkeypatch.context() as patch:
+        patch.setattr(router, "dispatch", recording)
+        await feed(application, users, concurrent)
+
+    final = {}
+    for uid in users:
+        user = await database.get_user(uid)
+        draft = dict(user['draft'])
+        ship_id = draft.pop('id')
+        final[uid] = (user['state'].replace(ship_id, "<id>"), draft)
+    return observed, final
+
+@pytest.mark.asyncio
+async def test_concurrent_wizards_match_serial_run(sqlite_db, tmp_path, monkeypatch):
+    # Random delays on every profile read and write make the users' updates interleave
+    rng = random.Random(7)
+    for name in ("get_user", "update_user", "update_user_state"):
+        original = getattr(sqlite_db, name)
+
+        async def delayed(*args, _original=original, **kwargs):
+            await asyncio.sleep(rng.uniform(0, 0.004))
+            return await _original(*args, **kwargs)
+        monkeypatch.setattr(sqlite_db, name, delayed)
+
+    observed, concurrent = await run_wizards(sqlite_db, PerUserUpdateProcessor(8, 256), monkeypatch, concurrent=True)
+
+    await sqlite_db.close()
+    sqlite_db.path = str(tmp_path / "serial.sqlite3")
+    _, serial = await run_wizards(sqlite_db, SimpleUpdateProcessor(1), monkeypatch, concurrent=False)
+
+    assert len(observed) == len(serial)
+    for uid, texts in observed.items():
+        assert texts == [step(uid) for step in WIZARD_STEPS]
+    assert concurrent == serial
+    assert all(state == "SHIP_CONFIRM_<id>" for state, _ in serial.values())